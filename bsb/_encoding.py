@@ -3,12 +3,24 @@ import itertools
 from ._util import obj_str_insert
 
 
+# Process-wide table of interned labelsets, so that labelsets can be compared and mapped
+# as integers.
+_interned = {}
+
+
+def _intern(labels):
+    """
+    Return the interned integer of a labelset; equal labelsets intern to the same integer.
+    """
+    return _interned.setdefault(frozenset(labels), len(_interned))
+
+
 class _lset(set):
     def __hash__(self):
-        return int.from_bytes(":|\\!#è".join(sorted(self)).encode(), "little")
+        return _intern(self)
 
     def __eq__(self, other):
-        return hash(self) == hash(_lset(other))
+        return set.__eq__(self, set(other))
 
     def copy(self):
         return self.__class__(self)
@@ -57,47 +69,44 @@ class EncodedLabels(np.ndarray):
     def label(self, labels, points):
         if not len(points):
             return
-        _transitions = {}
+        values = self[points]
+        # Transition each unique value once, in order of appearance.
+        uniques, first, inverse = np.unique(
+            values, return_index=True, return_inverse=True
+        )
+        lookup = self._lookup()
         # A counter that skips existing values.
         counter = (c for c in itertools.count() if c not in self.labels)
-
-        # This local function looks up the new id that a point should transition
-        # to when `labels` are added to the labels it already has.
-        def transition(point):
-            nonlocal _transitions
-            # Check if we already know the transition of this value.
-            if point in _transitions:
-                return _transitions[point]
-            else:
-                # First time making this transition. Join the existing and new labels
-                trans_labels = self.labels[point].copy()
-                trans_labels.update(labels)
-                # Check if this new combination of labels already is assigned an id.
-                for k, v in self.labels.items():
-                    if trans_labels == v:
-                        # Transition labels already exist, store and return it
-                        _transitions[point] = k
-                        return k
-                else:
-                    # Transition labels are a new combination, store them under a new id.
-                    transition = next(counter)
-                    self.labels[transition] = trans_labels
-                    # Cache the result
-                    _transitions[point] = transition
-                    return transition
-
+        transitions = np.empty(len(uniques), dtype=int)
+        for i in np.argsort(first):
+            # Join the existing and new labels, and check if this new combination of
+            # labels already is assigned an id.
+            trans_labels = self.labels[uniques[i]].copy()
+            trans_labels.update(labels)
+            key = _intern(trans_labels)
+            if key not in lookup:
+                # Transition labels are a new combination, store them under a new id.
+                lookup[key] = next(counter)
+                self.labels[lookup[key]] = trans_labels
+            transitions[i] = lookup[key]
         # Replace the label values with the transition values
-        self[points] = np.vectorize(transition)(self[points])
+        self[points] = transitions[inverse.reshape(-1)]
+
+    def _lookup(self):
+        # Map of the interned labelsets to their first value in this array.
+        lookup = {}
+        for k, v in self.labels.items():
+            lookup.setdefault(_intern(v), k)
+        return lookup
 
     def contains(self, labels):
         return np.any(self.get_mask(labels))
 
     def index_of(self, labels):
-        for i, lset in self.labels.items():
-            if lset == labels:
-                return i
-        else:
-            raise IndexError(f"Labelset {labels} does not exist")
+        try:
+            return self._lookup()[_intern(labels)]
+        except KeyError:
+            raise IndexError(f"Labelset {labels} does not exist") from None
 
     def get_mask(self, labels):
         has_any = [k for k, v in self.labels.items() if any(lbl in v for lbl in labels)]
@@ -150,28 +159,31 @@ class EncodedLabels(np.ndarray):
         if not arrs:
             return {0: _lset()}
         merged = {}
-        new_labelsets = set()
+        new_labelsets = {}
         to_map_arrs = {}
         for arr in arrs:
             for k, l in arr.labels.items():
                 if k not in merged:
                     # The label spot is available, so take it
                     merged[k] = l
-                elif merged[k] != l:
+                elif _intern(merged[k]) != _intern(l):
                     # The labelset doesn't match, so this array will have to be mapped,
                     # and a new spot found for the conflicting labelset.
-                    new_labelsets.add(l)
+                    new_labelsets.setdefault(_intern(l), l)
                     # np ndarray unhashable, for good reason, so use `id()` for quick hash
                     to_map_arrs[id(arr)] = arr
                 # else: this labelset matches with the superset's nothing to do
 
-        # Collect new spots for new labelsets
+        # Collect new spots for new labelsets, in order of their sorted labels, mapping
+        # interned labelsets to their spot.
         counter = (c for c in itertools.count() if c not in merged)
         lset_map = {}
-        for labelset in new_labelsets:
+        for interned, labelset in sorted(
+            new_labelsets.items(), key=lambda item: sorted(item[1])
+        ):
             key = next(counter)
             merged[key] = labelset
-            lset_map[labelset] = key
+            lset_map[interned] = key
 
         return merged, to_map_arrs, lset_map
 
@@ -187,6 +199,9 @@ class EncodedLabels(np.ndarray):
             else:
                 # Lookup each labelset, if found, map to new value, otherwise, map to
                 # original value.
-                arrmap = {og: lset_map.get(lset, og) for og, lset in arr.labels.items()}
-                block = np.vectorize(arrmap.get)(arr)
+                keys = np.array(sorted(arr.labels), dtype=int)
+                values = np.array(
+                    [lset_map.get(_intern(arr.labels[og]), og) for og in keys], dtype=int
+                )
+                block = values[np.searchsorted(keys, np.array(arr, copy=False))]
             yield block
@@ -5,6 +5,7 @@ registered using plugin registration. See `setup.py` for the setuptools metadata
 
 from .option import BsbOption
 from .reporting import report
+from .exceptions import OptionError
 
 
 class VerbosityOption(
@@ -116,6 +117,76 @@ class ProfilingOption(
         return False
 
 
+class SchedulerOption(
+    BsbOption,
+    name="scheduler",
+    cli=("scheduler",),
+    project=("scheduler",),
+    env=("BSB_SCHEDULER",),
+    script=("scheduler",),
+):
+    """
+    Set the order in which the job pool runs jobs. ``fifo`` runs jobs in the order they
+    were queued, ``cost`` runs the most expensive jobs first.
+    """
+
+    def setter(self, value):
+        value = str(value).lower()
+        if value not in ("fifo", "cost"):
+            raise OptionError(f"Unknown scheduler '{value}', choose 'fifo' or 'cost'.")
+        return value
+
+    def getter(self, value):
+        return str(value).lower()
+
+    def get_default(self):
+        return "fifo"
+
+
+class ProcessesOption(
+    BsbOption,
+    name="processes",
+    cli=("processes",),
+    project=("processes",),
+    env=("BSB_PROCESSES",),
+    script=("processes",),
+):
+    """
+    Set the number of local worker processes to execute jobs with, when not running under
+    MPI.
+    """
+
+    def setter(self, value):
+        return int(value)
+
+    def getter(self, value):
+        return int(value)
+
+    def get_default(self):
+        return 1
+
+
+class MorphologyCacheOption(
+    BsbOption,
+    name="morphology_cache",
+    cli=("morphology_cache",),
+    project=("morphology_cache",),
+    env=("BSB_MORPHOLOGY_CACHE",),
+    script=("morphology_cache",),
+):
+    """
+    Set a directory in which stored morphologies are cached as memory mapped arrays,
+    shared by all processes on the node. Preferably a node-local or in-memory filesystem
+    such as ``/dev/shm``. Disabled when empty.
+    """
+
+    def setter(self, value):
+        return str(value) if value else None
+
+    def get_default(self):
+        return None
+
+
 def verbosity():
     return VerbosityOption
 
@@ -134,3 +205,15 @@ def config():
 
 def profiling():
     return ProfilingOption
+
+
+def scheduler():
+    return SchedulerOption
+
+
+def processes():
+    return ProcessesOption
+
+
+def morphology_cache():
+    return MorphologyCacheOption
@@ -237,3 +237,35 @@ def rotation_matrix_from_vectors(vec1, vec2):
         return np.eye(3) + kmat + kmat.dot(kmat) * ((1 - c) / (s**2))
     else:
         return np.eye(3)  # cross of all zeros only occurs on identical directions
+
+
+def rotation_matrices_from_vectors(vec1, vecs):
+    """Find the rotation matrices that align vec1 to each of the vecs
+
+    :param vec1: A 3d "source" vector
+    :param vecs: An (N, 3) array of "destination" vectors
+    :return mats: An (N, 3, 3) array of transform matrices, the i-th of which aligns vec1
+      with the i-th destination vector.
+    """
+    vecs = np.asarray(vecs, dtype=float).reshape(-1, 3)
+    norms = np.linalg.norm(vecs, axis=1)
+    if (
+        np.isnan(vec1).any()
+        or np.isnan(vecs).any()
+        or not np.any(vec1)
+        or not np.all(norms)
+    ):
+        raise ValueError("Vectors should not contain nan and their norm should not be 0.")
+    a = (vec1 / np.linalg.norm(vec1)).reshape(3)
+    b = vecs / norms[:, np.newaxis]
+    v = np.cross(a, b)
+    c = b @ a
+    s2 = np.sum(v**2, axis=1)
+    kmat = np.zeros((len(vecs), 3, 3))
+    kmat[:, 0, 1], kmat[:, 0, 2] = -v[:, 2], v[:, 1]
+    kmat[:, 1, 0], kmat[:, 1, 2] = v[:, 2], -v[:, 0]
+    kmat[:, 2, 0], kmat[:, 2, 1] = -v[:, 1], v[:, 0]
+    # Identical directions have a cross of all zeros, and get the identity matrix.
+    aligned = ~v.any(axis=1)
+    scale = np.divide(1 - c, s2, out=np.zeros_like(c), where=~aligned)
+    return np.eye(3) + kmat + (kmat @ kmat) * scale[:, np.newaxis, np.newaxis]
@@ -31,8 +31,17 @@ class Distribution:
                 DistributionCastError, e, prepend=f"Can't cast to '{self.distribution}': "
             )
 
-    def draw(self, n):
-        return self._distr.rvs(size=n)
+    def draw(self, n, random_state=None):
+        """
+        Draw ``n`` values from the distribution.
+
+        :param n: Number of values to draw.
+        :type n: int
+        :param random_state: Random generator or seed to draw with, defaults to the global
+          random state.
+        :type random_state: Union[int, numpy.random.Generator]
+        """
+        return self._distr.rvs(size=n, random_state=random_state)
 
     def __getattr__(self, attr):
         if "_distr" not in self.__dict__:
@@ -44,5 +53,5 @@ class _ConstantDistribution:
     def __init__(self, const):
         self.const = const
 
-    def rvs(self, size):
+    def rvs(self, size, random_state=None):
         return np.full(size, self.const, dtype=type(self.const))
@@ -3,42 +3,72 @@ from functools import cache
 import numpy as np
 from ... import config
 from ...config import types
-from ...storage import Chunk
+from ...storage import Chunk, chunklist
+from ...storage._chunks import chunk_ids, _iinfo
+from ...storage.interfaces import _rotated_boxes
 from ...reporting import warn
-from ...exceptions import ConnectivityWarning
+from ...exceptions import ConnectivityWarning, DatasetNotFoundError
 
 
 class Intersectional:
     affinity = config.attr(type=types.fraction(), default=1)
+    # The region of interest only bounds the candidates that can geometrically intersect,
+    # so a batch of chunks can be intersected with the union of their regions of interest.
+    batchable = True
 
     def get_region_of_interest(self, chunk):
-        post_ps = [ct.get_placement_set() for ct in self.postsynaptic.cell_types]
-        lpre, upre = self._get_rect_ext(tuple(chunk.dimensions), True)
-        lpost, upost = self._get_rect_ext(tuple(chunk.dimensions), False)
-        # Get the `np.arange`s between bounds offset by the chunk position, to be used in
-        # `np.meshgrid` below.
-        bounds = list(
-            np.arange(l1 - u2 + c, u1 - l2 + c + 1)
-            for l1, l2, u1, u2, c in zip(lpre, lpost, upre, upost, chunk)
-        )
-        # Flatten and stack the meshgrid coordinates into a list.
-        clist = np.column_stack(
-            [a.reshape(-1) for a in np.meshgrid(*bounds, indexing="ij")]
-        )
-        if not hasattr(self, "_occ_chunks"):
-            # Filter by chunks where cells were actually placed
-            self._occ_chunks = set(
-                chain.from_iterable(ps.get_all_chunks() for ps in post_ps)
-            )
-        if not self._occ_chunks:
+        occupied = self._get_occupied_ids()
+        if not len(occupied):
+            post_ps = [ct.get_placement_set() for ct in self.postsynaptic.cell_types]
             warn(
                 f"No {', '.join(ps.tag for ps in post_ps)} were placed, skipping {self.name}",
                 ConnectivityWarning,
             )
             return []
-        else:
-            size = next(iter(self._occ_chunks)).dimensions
-            return [t for c in clist if (t := Chunk(c, size)) in self._occ_chunks]
+        # Offset the chunk by all the chunk offsets that its cells can reach, and keep
+        # those candidate chunks where postsynaptic cells were actually placed.
+        candidates = self._get_roi_offsets(tuple(chunk.dimensions)) + np.asarray(
+            chunk, dtype=np.int64
+        )
+        candidates = candidates[
+            np.all((candidates >= _iinfo.min) & (candidates <= _iinfo.max), axis=1)
+        ]
+        ids = chunk_ids(candidates)
+        candidates = candidates[np.isin(ids, occupied)]
+        size = self._occ_chunks[0].dimensions
+        return [Chunk(c, size) for c in candidates]
+
+    def _job_rng(self, chunks):
+        # Seed each job with the strategy's `seed` and the ids of its chunks, so that the
+        # result of a job does not depend on the order in which the jobs run.
+        seed = getattr(self, "seed", None)
+        if seed is None:
+            return np.random.default_rng()
+        return np.random.default_rng([seed, *sorted(chunk_ids(chunks).tolist())])
+
+    def _get_occupied_ids(self):
+        if not hasattr(self, "_occ_chunks"):
+            # Filter by chunks where cells were actually placed
+            post_ps = [ct.get_placement_set() for ct in self.postsynaptic.cell_types]
+            self._occ_chunks = chunklist(
+                chain.from_iterable(ps.get_all_chunks() for ps in post_ps)
+            )
+            self._occ_ids = chunk_ids(self._occ_chunks)
+        return self._occ_ids
+
+    @cache
+    def _get_roi_offsets(self, chunk_size):
+        lpre, upre = self._get_rect_ext(chunk_size, True)
+        lpost, upost = self._get_rect_ext(chunk_size, False)
+        # Get the `np.arange`s of the chunk offsets between the bounds, and stack their
+        # meshgrid coordinates into an (N, 3) array of offsets.
+        bounds = [
+            np.arange(l1 - u2, u1 - l2 + 1, dtype=np.int64)
+            for l1, l2, u1, u2 in zip(lpre, lpost, upre, upost)
+        ]
+        return np.column_stack(
+            [a.reshape(-1) for a in np.meshgrid(*bounds, indexing="ij")]
+        )
 
     @cache
     def _get_rect_ext(self, chunk_size, pre_post_flag):
@@ -46,20 +76,40 @@ class Intersectional:
             types = self.presynaptic.cell_types
         else:
             types = self.postsynaptic.cell_types
-        ps_list = [ct.get_placement_set() for ct in types]
-        ms_list = [ps.load_morphologies() for ps in ps_list]
-        if not sum(map(len, ms_list)):
+        lbounds, ubounds = [], []
+        for ps in (ct.get_placement_set() for ct in types):
+            # Only the metadata of the morphologies is needed, not their points.
+            ms = ps.load_morphologies()
+            indices = ms.get_indices(copy=False)
+            if not len(indices):
+                continue
+            metas = list(ms.iter_meta(unique=True))
+            ldc = np.array([m["ldc"] for m in metas], dtype=float).reshape(-1, 3)
+            mdc = np.array([m["mdc"] for m in metas], dtype=float).reshape(-1, 3)
+            try:
+                rotations = np.asarray(ps.load_rotations(), dtype=float)
+            except DatasetNotFoundError:
+                rotations = np.zeros((len(indices), 3))
+            # Combine the morphology extension with the rotation of the cells, rotating
+            # the box of each unique morphology and rotation pair once.
+            pairs = np.unique(
+                np.column_stack((indices, rotations.reshape(-1, 3))), axis=0
+            )
+            boxes = _rotated_boxes(
+                ldc, mdc, pairs[:, 0].astype(int), np.zeros((len(pairs), 3)), pairs[:, 1:]
+            )
+            lbounds.append(np.min(boxes[:, :3], axis=0))
+            ubounds.append(np.max(boxes[:, 3:], axis=0))
+        if not lbounds:
             # No cells placed, return smallest possible RoI.
             return [np.array([0, 0, 0]), np.array([0, 0, 0])]
-        metas = list(chain.from_iterable(ms.iter_meta(unique=True) for ms in ms_list))
-        # TODO: Combine morphology extension information with PS rotation information.
         # Get the chunk coordinates of the boundaries of this chunk convoluted with the
         # extension of the intersecting morphologies.
-        lbounds = np.min([m["ldc"] for m in metas], axis=0) // chunk_size
-        ubounds = np.max([m["mdc"] for m in metas], axis=0) // chunk_size
-        return lbounds, ubounds
+        lbounds = np.min(lbounds, axis=0) // chunk_size
+        ubounds = np.max(ubounds, axis=0) // chunk_size
+        return lbounds.astype(np.int64), ubounds.astype(np.int64)
 
-    def candidate_intersection(self, target_coll, candidate_coll):
+    def candidate_intersection(self, target_coll, candidate_coll, rng=None):
         target_cache = [
             (ttype, tset, tset.load_boxes())
             for ttype, tset in target_coll.placement.items()
@@ -67,16 +117,17 @@ class Intersectional:
         for ctype, cset in candidate_coll.placement.items():
             box_tree = cset.load_box_tree()
             for ttype, tset, tboxes in target_cache:
-                yield (tset, cset, self._affinity_filter(box_tree.query(tboxes)))
+                yield (tset, cset, self._affinity_filter(box_tree.query(tboxes), rng))
 
-    def _affinity_filter(self, query):
+    def _affinity_filter(self, query, rng=None):
         if self.affinity == 1:
             return query
         else:
             aff = self.affinity
+            rng = np.random if rng is None else rng
 
             def sizemod(q):
                 ln = len(q)
-                return int(np.floor(ln * aff) + (np.random.rand() < ((ln * aff) % 1)))
+                return int(np.floor(ln * aff) + (rng.random() < ((ln * aff) % 1)))
 
-            return (np.random.choice(q, sizemod(q), replace=False) for q in query)
+            return (rng.choice(q, sizemod(q), replace=False) for q in query)
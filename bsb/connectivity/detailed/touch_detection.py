@@ -1,216 +1,152 @@
 import numpy as np
+from scipy.spatial import cKDTree
+from scipy.spatial.transform import Rotation
 from ..strategy import ConnectionStrategy
 from .shared import Intersectional
-from ...reporting import report, warn
-from random import sample as sample_elements
+from ...reporting import report
 from ... import config
 from ...config import types
 
 
-class TouchInformation:
-    def __init__(
-        self, from_cell_type, from_cell_compartments, to_cell_type, to_cell_compartments
-    ):
-        self.from_cell_type = from_cell_type
-        self.from_cell_compartments = from_cell_compartments
-        self.to_cell_type = to_cell_type
-        self.to_cell_compartments = to_cell_compartments
-
-
 @config.node
 class TouchDetector(Intersectional, ConnectionStrategy):
     """
-    Connectivity based on intersection of detailed morphologies
+    Connectivity based on the proximity of detailed morphologies. Cells touch wherever
+    their points are within ``compartment_intersection_radius`` of each other.
     """
 
-    _planes = ["xyz", "xy", "xz", "yz", "x", "y", "z"]
     compartment_intersection_radius = config.attr(type=float, default=5.0)
-    cell_intersection_radius = config.attr(type=float)
-    cell_intersection_plane = config.attr(type=types.in_(_planes), default="xyz")
-    compartment_intersection_plane = config.attr(type=types.in_(_planes), default="xyz")
     contacts = config.attr(type=types.distribution(), default=1)
     allow_zero_contacts = config.attr(type=bool, default=False)
+    batch_size = config.attr(type=int, default=1000)
+    seed = config.attr(type=int, required=False)
+    """
+    Seed of the random affinity filter, contact numbers and contact picking. Each job is
+    seeded with this seed and the ids of its chunks, so that the result does not depend on
+    the order of the jobs.
+    """
 
     def connect(self, pre, post):
-        labels_pre = None if self.label_pre is None else [self.label_pre]
-        labels_post = None if self.label_post is None else [self.label_post]
-        self.morphology_cache = {}
-        for from_cell_type_index in range(len(self.from_cell_types)):
-            from_cell_type = self.from_cell_types[from_cell_type_index]
-            from_cell_compartments = self.from_cell_compartments[from_cell_type_index]
-            for to_cell_type_index in range(len(self.to_cell_types)):
-                to_cell_type = self.to_cell_types[to_cell_type_index]
-                to_cell_compartments = self.to_cell_compartments[to_cell_type_index]
-                touch_info = TouchInformation(
-                    from_cell_type,
-                    from_cell_compartments,
-                    to_cell_type,
-                    to_cell_compartments,
-                )
-                touch_info.from_placement = self.scaffold.get_placement_set(
-                    from_cell_type, labels=labels_pre
-                )
-                touch_info.from_positions = list(touch_info.from_placement.positions)
-                touch_info.from_identifiers = list(touch_info.from_placement.identifiers)
-                touch_info.to_placement = self.scaffold.get_placement_set(
-                    to_cell_type, labels=labels_post
-                )
-                touch_info.to_identifiers = list(touch_info.to_placement.identifiers)
-                touch_info.to_positions = list(touch_info.to_placement.positions)
-                # Intersect cells on the widest possible search radius.
-                candidates = self.intersect_cells(touch_info)
-                # Intersect cell compartments between matched cells.
-                connections, morphology_names, compartments = self.intersect_compartments(
-                    touch_info, candidates
-                )
-                # Connect the cells and store the morphologies and selected compartments that connect them.
-                self.scaffold.connect_cells(
-                    self,
-                    connections,
-                    morphologies=morphology_names,
-                    compartments=compartments,
-                )
-        # Remove the morphology cache
-        self.morphology_cache = None
+        self._rng = self._job_rng(pre.roi)
+        for pre_set in pre.placement.values():
+            pre_ms = pre_set.load_morphologies()
+            for post_set in post.placement.values():
+                post_ms = post_set.load_morphologies()
+                self._detect_touches(pre_set, post_set, pre_ms, post_ms)
 
-    def intersect_cells(self, touch_info):
-        from_cell_type = touch_info.from_cell_type
-        to_cell_type = touch_info.to_cell_type
-        cell_plane = self.cell_intersection_plane
-        from_cell_tree = self.scaffold.trees.cells.get_planar_tree(
-            from_cell_type.name, plane=cell_plane
-        )
-        to_cell_tree = self.scaffold.trees.cells.get_planar_tree(
-            to_cell_type.name, plane=cell_plane
+    def _detect_touches(self, pre_set, post_set, pre_ms, post_ms):
+        r = self.compartment_intersection_radius
+        # Find the candidate pairs of cells whose boxes, padded by the radius, overlap.
+        boxes = pre_set.load_boxes(morpho_cache=pre_ms)
+        boxes[:, :3] -= r
+        boxes[:, 3:] += r
+        offsets, candidates = post_set.load_box_tree(morpho_cache=post_ms).query_csr(
+            boxes
         )
-        if from_cell_tree is None or to_cell_tree is None:
-            return []
-        from_count = self.scaffold.get_placed_count(from_cell_type.name)
-        to_count = self.scaffold.get_placed_count(to_cell_type.name)
-        if hasattr(self, "cell_intersection_radius"):
-            radius = self.cell_intersection_radius
-        else:
-            radius = self.get_search_radius(from_cell_type) + self.get_search_radius(
-                to_cell_type
+        targets = np.repeat(np.arange(len(boxes)), np.diff(offsets))
+        if self.affinity < 1 and len(candidates):
+            split = np.split(candidates, offsets[1:-1])
+            kept = self._affinity_filter(split, self._rng)
+            kept = [np.asarray(q, dtype=int) for q in kept]
+            targets = np.repeat(np.arange(len(boxes)), [len(q) for q in kept])
+            candidates = np.concatenate(kept)
+        if not len(candidates):
+            return
+        n_post = len(post_set)
+        allowed = np.unique(targets * n_post + candidates)
+        # Put all the points of the candidate cells in a single tree, then query it with
+        # the points of the target cells, in batches of target cells.
+        post_cloud = _PointCloud(post_set, post_ms, np.unique(candidates))
+        post_tree = cKDTree(post_cloud.points)
+        pre_cells = np.unique(targets)
+        pre_cache = {}
+        n_pairs = n_contacts = 0
+        for start in range(0, len(pre_cells), self.batch_size):
+            batch = pre_cells[start : start + self.batch_size]
+            pre_cloud = _PointCloud(pre_set, pre_ms, batch, pre_cache)
+            hits = cKDTree(pre_cloud.points).sparse_distance_matrix(
+                post_tree, r, output_type="ndarray"
             )
-        # TODO: Profile whether the reverse lookup with the smaller tree and then reversing the matches array
-        # gains us any speed.
-        if from_count < to_count:
-            return to_cell_tree.query_radius(from_cell_tree.get_arrays()[0], radius)
-        else:
-            reversed_matches = from_cell_tree.query_radius(
-                to_cell_tree.get_arrays()[0], radius
-            )
-            matches = [[] for _ in range(len(from_cell_tree.get_arrays()[0]))]
-            for i in range(len(reversed_matches)):
-                for match in reversed_matches[i]:
-                    matches[match].append(i)
-            return matches
-
-    def intersect_compartments(self, touch_info, candidate_map):
-        connected_cells = []
-        morphology_names = []
-        connected_compartments = []
-        c_check = 0
-        touching_cells = 0
-        for i in range(len(candidate_map)):
-            if i % 100 == 0:
-                percentage = 100 * float(i) / float(len(candidate_map))
-                report(
-                    f"Connection progress: {percentage:.2f}%...",
-                    level=2,
-                    ongoing=True,
+            pre_pts, post_pts = hits["i"], hits["j"]
+            keys = pre_cloud.cells[pre_pts] * n_post + post_cloud.cells[post_pts]
+            inside = np.isin(keys, allowed)
+            pre_pts, post_pts, keys = pre_pts[inside], post_pts[inside], keys[inside]
+            picked, pairs = self._pick_contacts(keys)
+            n_pairs += pairs
+            n_contacts += len(picked)
+            if len(picked):
+                self.connect_cells(
+                    pre_set,
+                    post_set,
+                    pre_cloud.locations(pre_pts[picked]),
+                    post_cloud.locations(post_pts[picked]),
                 )
-            from_id = touch_info.from_identifiers[i]
-            touch_info.from_morphology = self.get_random_morphology(
-                touch_info.from_cell_type
-            )
-            for j in candidate_map[i]:
-                c_check += 1
-                to_id = touch_info.to_identifiers[j]
-                touch_info.to_morphology = self.get_random_morphology(
-                    touch_info.to_cell_type
-                )
-                intersections = self.get_compartment_intersections(
-                    touch_info, touch_info.from_positions[i], touch_info.to_positions[j]
-                )
-                if len(intersections) > 0:
-                    touching_cells += 1
-                    number_of_synapses = max(
-                        min(int(self.synapses.sample()), len(intersections)),
-                        int(not self.allow_zero_synapses),
-                    )
-                    cell_connections = [
-                        [from_id, to_id] for _ in range(number_of_synapses)
-                    ]
-                    compartment_connections = sample_elements(
-                        intersections, k=number_of_synapses
-                    )
-                    connected_cells.extend(cell_connections)
-                    connected_compartments.extend(compartment_connections)
-                    # Pad the morphology names with the right names for the amount of compartment connections made
-                    morphology_names.extend(
-                        [
-                            [
-                                touch_info.from_morphology.morphology_name,
-                                touch_info.to_morphology.morphology_name,
-                            ]
-                            for _ in range(len(compartment_connections))
-                        ]
-                    )
-        report(
-            "Checked {} candidate cell pairs from {} to {}".format(
-                c_check, touch_info.from_cell_type.name, touch_info.to_cell_type.name
-            ),
-            level=2,
-        )
         report(
-            "Touch connection results: \n* Touching pairs: {} \n* Synapses: {}".format(
-                touching_cells, len(connected_compartments)
-            ),
+            f"Touch detection between {pre_set.tag} and {post_set.tag}: "
+            f"{n_pairs} touching pairs, {n_contacts} contacts.",
             level=2,
         )
 
-        return (
-            np.array(connected_cells, dtype=int),
-            np.array(morphology_names, dtype=np.string_),
-            np.array(connected_compartments, dtype=int),
+    def _pick_contacts(self, keys):
+        # Group the touching points by cell pair, and pick a random number of contacts
+        # per pair, without replacement.
+        pairs, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        if not len(pairs):
+            return np.empty(0, dtype=int), 0
+        drawn = self.contacts.draw(len(pairs), random_state=self._rng)
+        drawn = np.asarray(drawn, dtype=int).reshape(-1)
+        n = np.maximum(np.minimum(drawn, counts), int(not self.allow_zero_contacts))
+        order = np.lexsort((self._rng.random(len(keys)), inverse))
+        starts = np.cumsum(counts) - counts
+        rank = np.arange(len(keys)) - starts[inverse[order]]
+        return order[rank < n[inverse[order]]], len(pairs)
+
+
+class _PointCloud:
+    """
+    The points of the morphologies of a selection of cells, rotated and translated to
+    their position. Each unique morphology is only loaded and flattened once.
+    """
+
+    def __init__(self, ps, ms, cells, cache=None):
+        # The positions, rotations and flattened morphologies are kept in the cache, to
+        # reuse them for other selections of the same cells.
+        cache = {} if cache is None else cache
+        if "positions" not in cache:
+            cache["positions"] = ps.load_positions()
+            cache["rotations"] = np.asarray(ps.load_rotations(), dtype=float)
+        positions = cache["positions"]
+        rotations = cache["rotations"].reshape(-1, 3)
+        morpho_ids = ms.get_indices(copy=False)[cells]
+        points, self.cells, self._branches, self._points = [], [], [], []
+        for morpho_id in np.unique(morpho_ids):
+            group = cells[morpho_ids == morpho_id]
+            if morpho_id not in cache:
+                cache[morpho_id] = _flatten(ms.get(group[0]))
+            base, branch_ids, point_ids = cache[morpho_id]
+            rotation = Rotation.from_euler("xyz", rotations[group]).as_matrix()
+            moved = np.einsum("kij,nj->kni", rotation, base)
+            points.append((moved + positions[group, np.newaxis]).reshape(-1, 3))
+            self.cells.append(np.repeat(group, len(base)))
+            self._branches.append(np.tile(branch_ids, len(group)))
+            self._points.append(np.tile(point_ids, len(group)))
+        self.points = np.concatenate(points) if points else np.empty((0, 3))
+        self.cells, self._branches, self._points = (
+            np.concatenate(a) if a else np.empty(0, dtype=int)
+            for a in (self.cells, self._branches, self._points)
         )
 
-    def get_compartment_intersections(self, touch_info, from_pos, to_pos):
-        from_morpho = touch_info.from_morphology
-        to_morpho = touch_info.to_morphology
-        to_comps = to_morpho.get_compartment_positions(touch_info.to_cell_compartments)
-        from_tree = from_morpho.get_compartment_tree(touch_info.from_cell_compartments)
-        if from_tree is None or not len(to_comps):
-            return []
-        query_points = to_comps + to_pos - from_pos
-        compartment_hits = from_tree.query_radius(
-            query_points, self.compartment_intersection_radius
+    def locations(self, points):
+        """
+        The cell, branch and point ids of the given points of the cloud.
+        """
+        return np.column_stack(
+            (self.cells[points], self._branches[points], self._points[points])
         )
-        from_map = from_morpho.get_compartment_submask(touch_info.from_cell_compartments)
-        to_map = to_morpho.get_compartment_submask(touch_info.to_cell_compartments)
-        intersections = []
-        for i in range(len(compartment_hits)):
-            hits = compartment_hits[i]
-            if len(hits) > 0:
-                for j in range(len(hits)):
-                    intersections.append([from_map[hits[j]], to_map[i]])
-        return intersections
 
-    def get_search_radius(self, cell_type):
-        morphologies = self.get_all_morphologies(cell_type)
-        max_radius = 0.0
-        for morphology in morphologies:
-            max_radius = max(
-                max_radius,
-                np.max(
-                    np.sqrt(
-                        np.sum(
-                            np.power(morphology.compartment_tree.get_arrays()[0], 2),
-                            axis=1,
-                        )
-                    )
-                ),
-            )
-        return max_radius
+
+def _flatten(morpho):
+    lens = np.array([len(b) for b in morpho.branches], dtype=int)
+    branch_ids = np.repeat(np.arange(len(lens)), lens)
+    point_ids = np.arange(np.sum(lens)) - np.repeat(np.cumsum(lens) - lens, lens)
+    return morpho.flatten().reshape(-1, 3), branch_ids, point_ids
@@ -1,14 +1,10 @@
 import numpy as np
-from numpy.random import default_rng
+from scipy.spatial.transform import Rotation
 import itertools
-import random
 from ..strategy import ConnectionStrategy
 from .shared import Intersectional
 from ... import config
 from ...config import types
-from ..._util import ichain
-
-_rng = default_rng()
 
 
 @config.node
@@ -22,8 +18,16 @@ class VoxelIntersection(Intersectional, ConnectionStrategy):
     voxels_post = config.attr(type=int, default=50)
     cache = config.attr(type=bool, default=True)
     favor_cache = config.attr(type=types.in_(["pre", "post"]), default="pre")
+    transform_voxels = config.attr(type=bool, default=False)
+    seed = config.attr(type=int, required=False)
+    """
+    Seed of the random affinity filter, contact numbers and contact picking. Each job is
+    seeded with this seed and the ids of its chunks, so that the result does not depend on
+    the order of the jobs.
+    """
 
     def connect(self, pre, post):
+        self._rng = self._job_rng(pre.roi)
         # Note on the caching terms: `targets` are the population that will be cached the
         # strongest; their voxelized tree will remain in place, while the candidates are
         # rotated and translated to overlap the target tree.
@@ -40,7 +44,7 @@ class VoxelIntersection(Intersectional, ConnectionStrategy):
             candidates = pre
             self._n_tvoxels = self.voxels_post
             self._n_cvoxels = self.voxels_pre
-        combo_itr = self.candidate_intersection(targets, candidates)
+        combo_itr = self.candidate_intersection(targets, candidates, self._rng)
         mset_cache = {}
         for target_set, cand_set, match_itr in combo_itr:
             if self.cache:
@@ -64,6 +68,7 @@ class VoxelIntersection(Intersectional, ConnectionStrategy):
         target_itrs = zip(tset.load_positions(), tset.load_rotations().iter(), tm_iter)
         rotations = cset.load_rotations()
         positions = cset.load_positions()
+        cvoxel_cache = {}
         data_acc = []
         for target, candidates in enumerate(matches):
             tpos, trot, tmor = next(target_itrs)
@@ -76,6 +81,23 @@ class VoxelIntersection(Intersectional, ConnectionStrategy):
             else:
                 tvoxels = tmor.voxelize(N=self._n_tvoxels)
             tree = tvoxels.as_boxtree(cache=self.cache)
+            if self.transform_voxels:
+                data_acc.extend(
+                    self._match_transformed_voxels(
+                        target,
+                        tpos,
+                        trot,
+                        tvoxels,
+                        tree,
+                        candidates,
+                        positions,
+                        rotations,
+                        cmset,
+                        cvoxel_cache,
+                    )
+                )
+                continue
+            overlaps = []
             for cand in candidates:
                 cpos = positions[cand]
                 crot = rotations[cand]
@@ -93,13 +115,13 @@ class VoxelIntersection(Intersectional, ConnectionStrategy):
                 morpho.rotate(trot.inv())
                 cvoxels = morpho.voxelize(N=self._n_cvoxels)
                 boxes = cvoxels.as_boxes()
-                # Filter out the candidate voxels that overlap with target voxels.
-                overlap = [(i, v) for i, v in enumerate(tree.query(boxes)) if v]
-                if overlap:
-                    locations = self._pick_locations(
-                        target, cand, tvoxels, cvoxels, overlap
-                    )
-                    data_acc.append(locations)
+                # Find the pairs of candidate and target voxels that overlap.
+                offsets, tvoxel_ids = tree.query_csr(boxes)
+                cvoxel_ids = np.repeat(np.arange(len(boxes)), np.diff(offsets))
+                if len(tvoxel_ids):
+                    overlaps.append((cand, cvoxels, (cvoxel_ids, tvoxel_ids)))
+            if overlaps:
+                data_acc.append(self._pick_locations(target, tvoxels, overlaps))
 
         # Preallocating and filling is faster than `np.concatenate` :shrugs:
         acc_idx = np.cumsum(
@@ -121,25 +143,129 @@ class VoxelIntersection(Intersectional, ConnectionStrategy):
 
         self.connect_cells(src_set, dest_set, src_locs, dest_locs)
 
-    def _pick_locations(self, tid, cid, tvoxels, cvoxels, overlap):
-        n = int(self.contacts.draw(1))
-        if n <= 0:
-            return np.empty((0, 3), dtype=int), np.empty((0, 3), dtype=int)
-        cpool = cvoxels.get_data([c for c, _ in overlap])
-        tpool = [tvoxels.get_data(t) for _, t in overlap]
-        pool = np.column_stack(
-            (
-                np.repeat(cpool, [len(t) for t in tpool]),
-                np.array([*ichain(tpool)], dtype=object),
+    def _match_transformed_voxels(
+        self,
+        target,
+        tpos,
+        trot,
+        tvoxels,
+        tree,
+        candidates,
+        positions,
+        rotations,
+        cmset,
+        cvoxel_cache,
+    ):
+        # Instead of transforming and voxelizing the morphology of each candidate, voxelize
+        # each candidate morphology once, and transform the corners of its voxels into the
+        # frame of the target. The outer boxes of the transformed voxels are matched
+        # against the target tree for all candidates at once.
+        candidates = np.asarray(candidates, dtype=int)
+        morpho_ids = cmset.get_indices(copy=False)[candidates]
+        inv_trot = trot.inv()
+        boxes, box_cands, box_voxels, cand_voxels = [], [], [], {}
+        for morpho_id in np.unique(morpho_ids):
+            group = candidates[morpho_ids == morpho_id]
+            if morpho_id not in cvoxel_cache:
+                morpho = cmset.get(group[0], cache=self.cache, hard_cache=False)
+                cvoxel_cache[morpho_id] = morpho.voxelize(N=self._n_cvoxels)
+            cvoxels = cvoxel_cache[morpho_id]
+            if not len(cvoxels):
+                continue
+            # Compose the rotation of each candidate with the inverse target rotation.
+            rot = inv_trot * Rotation.from_euler(
+                "xyz", np.asarray(rotations)[group].reshape(-1, 3)
             )
+            shift = inv_trot.apply(positions[group] - tpos).reshape(-1, 1, 3)
+            corners = _box_corners(cvoxels.as_boxes(cache=True))
+            moved = np.einsum("kij,nj->kni", rot.as_matrix(), corners) + shift
+            moved = moved.reshape(len(group), len(cvoxels), 8, 3)
+            boxes.append(np.concatenate((moved.min(axis=2), moved.max(axis=2)), axis=2))
+            box_cands.append(np.repeat(group, len(cvoxels)))
+            box_voxels.append(np.tile(np.arange(len(cvoxels)), len(group)))
+            cand_voxels.update((cand, cvoxels) for cand in group)
+        if not boxes:
+            return
+        offsets, tvoxel_ids = tree.query_csr(np.concatenate(boxes).reshape(-1, 6))
+        box_ids = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+        hit_cands = np.concatenate(box_cands)[box_ids]
+        hit_voxels = np.concatenate(box_voxels)[box_ids]
+        # Group the hits per candidate, in order of the candidates.
+        order = np.argsort(hit_cands, kind="stable")
+        cands, starts = np.unique(hit_cands[order], return_index=True)
+        overlaps = [
+            (cand, cand_voxels[cand], (hit_voxels[sel], tvoxel_ids[sel]))
+            for cand, sel in zip(cands, np.split(order, starts[1:]))
+        ]
+        yield self._pick_locations(target, tvoxels, overlaps)
+
+    def _pick_locations(self, tid, tvoxels, overlaps):
+        """
+        Pick the contacts between a target and each of its overlapping candidates, for all
+        candidates at once.
+
+        :param tid: Index of the target cell.
+        :param tvoxels: Voxels of the target cell.
+        :param overlaps: Candidate index, candidate voxels, and the pair of candidate and
+          target voxel ids that overlap, for each overlapping candidate.
+        :returns: The target and candidate locations of the contacts.
+        :rtype: Tuple[numpy.ndarray, numpy.ndarray]
+        """
+        toffsets, tmembers = tvoxels.get_members()
+        # Flatten the overlapping voxel pairs of all candidates into arrays, with the
+        # members of all candidates concatenated.
+        sizes, cids, cstarts, ccounts, tvoxel_ids, cmembers = [], [], [], [], [], []
+        base = 0
+        for cid, cvoxels, (cvoxel_ids, tvoxel_ids_) in overlaps:
+            coffsets, members = cvoxels.get_members()
+            sizes.append(len(cvoxel_ids))
+            cids.append(cid)
+            cstarts.append(coffsets[cvoxel_ids] + base)
+            ccounts.append(np.diff(coffsets)[cvoxel_ids])
+            tvoxel_ids.append(tvoxel_ids_)
+            cmembers.append(members)
+            base += len(members)
+        cstarts, ccounts, tvoxel_ids, cmembers = (
+            np.concatenate(a) for a in (cstarts, ccounts, tvoxel_ids, cmembers)
         )
-        weights = [len(c) * len(t) for c, t in pool]
-        tlocs = []
-        clocs = []
-        for cpick, tpick in random.choices(pool, weights, k=n):
-            clocs.append((cid, *random.choice(cpick)))
-            tlocs.append((tid, *random.choice(tpick)))
-        return tlocs, clocs
+        tcounts = np.diff(toffsets)[tvoxel_ids]
+        n = self.contacts.draw(len(sizes), random_state=self._rng)
+        n = np.asarray(n).reshape(-1).astype(int)
+        n = np.maximum(n, 0)
+        # Pick overlapping voxel pairs weighted by the number of point pairs they have, so
+        # that each pair of points is equally likely to be picked.
+        picks = _grouped_choice(self._rng, sizes, ccounts * tcounts, n)
+        cpicks = cstarts[picks] + self._rng.integers(ccounts[picks])
+        tpicks = toffsets[tvoxel_ids[picks]] + self._rng.integers(tcounts[picks])
+        pair_ids = np.repeat(np.arange(len(sizes)), n)
+        clocs = np.column_stack((np.asarray(cids, dtype=int)[pair_ids], cmembers[cpicks]))
+        tlocs = np.column_stack((np.full(len(picks), tid), tmembers[tpicks]))
+        return tlocs.astype(int), clocs.astype(int)
+
+
+def _grouped_choice(rng, sizes, weights, n):
+    """
+    Draw ``n[i]`` rows with replacement from each group ``i`` of consecutive rows, with a
+    probability proportional to the row weights, for all groups at once.
+
+    :param rng: Random number generator.
+    :type rng: numpy.random.Generator
+    :param sizes: Number of rows in each group.
+    :param weights: Weight of each row.
+    :param n: Number of rows to draw from each group.
+    :returns: The indices of the drawn rows, grouped per group.
+    :rtype: numpy.ndarray
+    """
+    sizes = np.asarray(sizes, dtype=int)
+    n = np.asarray(n, dtype=int)
+    ends = np.cumsum(sizes)
+    starts = ends - sizes
+    cum = np.cumsum(weights, dtype=float)
+    base = np.concatenate(([0], cum))[starts]
+    groups = np.repeat(np.arange(len(sizes)), n)
+    draws = base[groups] + rng.random(len(groups)) * (cum[ends - 1] - base)[groups]
+    picks = np.searchsorted(cum, draws, side="right")
+    return np.clip(picks, starts[groups], ends[groups] - 1)
 
 
 def _pairs_with_zero(iterable):
@@ -150,3 +276,13 @@ def _pairs_with_zero(iterable):
         pass
     else:
         yield from zip(a, b)
+
+
+def _box_corners(boxes):
+    # The 8 corners of each box, as a flat (N * 8, 3) array.
+    expansion = np.array(
+        [[x, y, z] for x in (0, 1) for y in (0, 1) for z in (0, 1)], dtype=bool
+    )
+    return np.where(
+        expansion, boxes[:, np.newaxis, 3:], boxes[:, np.newaxis, :3]
+    ).reshape(-1, 3)
@@ -21,14 +21,19 @@ class Convergence(ConnectionStrategy):
         raise NotImplementedError("Needs to be restored, please open an issue.")
 
 
+@config.node
 class AllToAll(ConnectionStrategy):
     """
     All to all connectivity between two neural populations
     """
 
+    block_size = config.attr(type=int, default=2**20)
+    """
+    Maximum number of connections to generate and store at once.
+    """
+
     def get_region_of_interest(self, chunk):
         # All to all needs all pre chunks per post chunk.
-        # Fingers crossed for out of memory errors.
         return self._get_all_post_chunks()
 
     @functools.cache
@@ -42,12 +47,26 @@ class AllToAll(ConnectionStrategy):
             fl = len(from_ps)
             for to_ps in post.placement.values():
                 len_ = len(to_ps)
-                ml = fl * len_
-                src_locs = np.full((ml, 3), -1)
-                dest_locs = np.full((ml, 3), -1)
-                src_locs[:, 0] = np.repeat(np.arange(fl), len_)
-                dest_locs[:, 0] = np.tile(np.arange(len_), fl)
-                self.connect_cells(from_ps, to_ps, src_locs, dest_locs)
+                # Stream the connections in blocks, instead of materializing all
+                # `fl * len_` of them at once.
+                for src_locs, dest_locs in _all_to_all_blocks(fl, len_, self.block_size):
+                    self.connect_cells(from_ps, to_ps, src_locs, dest_locs)
+
+
+def _all_to_all_blocks(n_pre, n_post, block_size):
+    """
+    Generate the cell locations of all pairs of ``n_pre`` presynaptic and ``n_post``
+    postsynaptic cells, in blocks of at most ``block_size`` pairs.
+    """
+    total = n_pre * n_post
+    dtype = np.int32 if max(n_pre, n_post) <= np.iinfo(np.int32).max else np.int64
+    block_size = max(block_size, 1)
+    for start in range(0, total, block_size):
+        flat = np.arange(start, min(start + block_size, total), dtype=np.int64)
+        src_locs = np.full((len(flat), 3), -1, dtype=dtype)
+        dest_locs = np.full((len(flat), 3), -1, dtype=dtype)
+        src_locs[:, 0], dest_locs[:, 0] = np.divmod(flat, n_post)
+        yield src_locs, dest_locs
 
 
 class ExternalConnections(ConnectionStrategy):
@@ -2,6 +2,7 @@ from .. import config
 from ..config import refs, types
 from ..profiling import node_meter
 from ..reporting import report, warn
+from ..storage import chunklist, chunk_batches
 from .._util import SortableByAfter, obj_str_insert
 import abc
 from itertools import chain
@@ -49,6 +50,13 @@ class ConnectionStrategy(abc.ABC, SortableByAfter):
     presynaptic = config.attr(type=Hemitype, required=True)
     postsynaptic = config.attr(type=Hemitype, required=True)
     after = config.reflist(refs.connectivity_ref)
+    chunks_per_job = config.attr(type=int, default=1)
+    batchable = False
+    """
+    Whether the presynaptic chunks of a batch may be connected together, to the union of
+    their regions of interest. Only strategies that connect a presynaptic chunk to the
+    same cells no matter what other chunks are in its region of interest may set this.
+    """
 
     def __init_subclass__(cls, **kwargs):
         super(cls, cls).__init_subclass__(**kwargs)
@@ -103,7 +111,10 @@ class ConnectionStrategy(abc.ABC, SortableByAfter):
         """
         Specifies how to queue this connectivity strategy into a job pool. Can
         be overridden, the default implementation asks each partition to chunk
-        itself and creates 1 placement job per chunk.
+        itself and creates 1 connectivity job per ``chunks_per_job`` presynaptic
+        chunks. The chunks of a batch are connected one by one to their own region of
+        interest, or, for ``batchable`` strategies, together to the union of their
+        regions of interest.
         """
         # Reset jobs that we own
         self._queued_jobs = []
@@ -127,9 +138,23 @@ class ConnectionStrategy(abc.ABC, SortableByAfter):
                 f"{[post.name for post in self.postsynaptic.cell_types]} "
                 f"in '{self.name}'."
             )
-        for chunk, roi in rois.items():
-            job = pool.queue_connectivity(self, [chunk], roi, deps=deps)
-            self._queued_jobs.append(job)
+        if self.chunks_per_job > 1:
+            # Group spatially adjacent chunks into a single job. Batchable strategies
+            # load the data of their overlapping regions of interest only once.
+            for batch in chunk_batches(list(rois.keys()), self.chunks_per_job):
+                if self.batchable:
+                    roi = chunklist(chain.from_iterable(rois[c] for c in batch))
+                    job = pool.queue_connectivity(self, batch, roi, deps=deps)
+                else:
+                    batch_rois = [rois[c] for c in batch]
+                    job = pool.queue_connectivity_batch(
+                        self, batch, batch_rois, deps=deps
+                    )
+                self._queued_jobs.append(job)
+        else:
+            for chunk, roi in rois.items():
+                job = pool.queue_connectivity(self, [chunk], roi, deps=deps)
+                self._queued_jobs.append(job)
         report(f"Queued {len(self._queued_jobs)} jobs for {self.name}", level=2)
 
     def get_cell_types(self):
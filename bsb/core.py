@@ -13,7 +13,7 @@ from .exceptions import (
     RedoError,
     ScaffoldError,
 )
-from .reporting import report, warn
+from .reporting import report
 from .config._config import Configuration
 from .services.pool import create_job_pool
 from .services import MPI
@@ -267,6 +267,8 @@ class Scaffold:
                 self._stop_progress_loop(loop, debug=DEBUG)
         else:
             pool.execute()
+        # The placement data changed, so the boxes cached for it are stale.
+        self.storage.clear_cached_boxes()
 
     @meter()
     def run_connectivity(self, strategies=None, DEBUG=True):
@@ -299,26 +301,47 @@ class Scaffold:
         self.run_placement([strategy])
 
     @meter()
-    def run_after_placement(self):
+    def run_after_placement(self, hooks=None, DEBUG=True):
         """
         Run after placement hooks.
         """
-        if self.after_placement:
-            warn("After placement disabled")
-        # pool = create_job_pool(self)
-        # for hook in self.configuration.after_placement.values():
-        #     pool.queue(hook.after_placement)
-        # pool.execute(self._pool_event_loop)
+        if hooks is None:
+            hooks = list(self.after_placement.values())
+        self._run_hooks("after_placement", hooks, DEBUG)
+        # The hooks may have changed the placement data.
+        if hooks:
+            self.storage.clear_cached_boxes()
 
     @meter()
-    def run_after_connectivity(self):
+    def run_after_connectivity(self, hooks=None, DEBUG=True):
         """
-        Run after placement hooks.
+        Run after connectivity hooks.
         """
-        if self.after_connectivity:
-            warn("After connectivity disabled")
-        # for hook in self.configuration.after_connectivity.values():
-        #     hook.after_connectivity()
+        if hooks is None:
+            hooks = list(self.after_connectivity.values())
+        self._run_hooks("after_connectivity", hooks, DEBUG)
+
+    def _run_hooks(self, stage, hooks, DEBUG):
+        if not hooks:
+            return
+        pool = create_job_pool(self)
+        if pool.is_master():
+            # The hooks run in the order they are configured: the jobs of each hook wait
+            # for those of the previous hook, but the chunks of a hook run in parallel.
+            deps = set()
+            for hook in hooks:
+                jobs = hook.queue(pool, stage, deps=deps)
+                deps = set(jobs) or deps
+            loop = self._progress_terminal_loop(pool, debug=DEBUG)
+            try:
+                pool.execute(loop)
+            except Exception:
+                self._stop_progress_loop(loop, debug=DEBUG)
+                raise
+            finally:
+                self._stop_progress_loop(loop, debug=DEBUG)
+        else:
+            pool.execute()
 
     @meter()
     def compile(
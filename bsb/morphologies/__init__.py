@@ -16,7 +16,9 @@ Morphology module
 # to the cell model instantiators.
 
 import inspect
+import io
 import itertools
+import warnings
 import functools
 import morphio
 import numpy as np
@@ -95,6 +97,8 @@ class MorphologySet:
             if hard_cache:
                 return self._loaders[idx].cached_load(self._labels)
 
+            if self._mapped():
+                return self._loaders[idx].mapped_load()
             if idx not in self._cached:
                 self._cached[idx] = (
                     self._loaders[idx].load().set_label_filter(self._labels).as_filtered()
@@ -106,6 +110,8 @@ class MorphologySet:
     def _get_many(self, data, cache, hard_cache):
         if hard_cache:
             return np.array([self._loaders[idx].cached_load() for idx in data])
+        elif cache and self._mapped():
+            res = [self._loaders[idx].mapped_load() for idx in data]
         elif cache:
             res = []
             for idx in data:
@@ -119,6 +125,13 @@ class MorphologySet:
     def clear_soft_cache(self):
         self._cached = {}
 
+    def _mapped(self):
+        # Soft caching maps the morphologies from the mapped morphology cache instead of
+        # copying them, if it is enabled and no labels are filtered.
+        from ..storage._mapped import get_cache_dir
+
+        return self._labels is None and get_cache_dir() is not None
+
     def iter_morphologies(self, cache=True, unique=False, hard_cache=False):
         """
         Iterate over the morphologies in a MorphologySet with full control over caching.
@@ -148,6 +161,9 @@ class MorphologySet:
             yield from map(_load, self._loaders)
         elif not cache or hard_cache:
             yield from map(_load, (self._loaders[idx] for idx in self._m_indices))
+        elif self._mapped():
+            # Remapping is zero-copy, and each morphology is still private to the caller.
+            yield from (self._loaders[idx].mapped_load() for idx in self._m_indices)
         else:
             _cached = {}
             for idx in self._m_indices:
@@ -894,7 +910,7 @@ class Morphology(SubTree):
         """
         if isinstance(file, str) or isinstance(file, Path):
             with open(str(file), "r") as f:
-                return cls.from_swc(f, branch_class, meta=meta)
+                return cls.from_swc(f, branch_class, tags=tags, meta=meta)
         if branch_class is None:
             branch_class = Branch
         return _swc_to_morpho(cls, branch_class, file.read(), tags=tags, meta=meta)
@@ -1588,101 +1604,125 @@ class Branch:
         return SubTree([self]).voxelize(*args, **kwargs)
 
 
-def _swc_branch_dfs(adjacency, branches, node):
-    branch = []
-    branch_id = len(branches)
-    branches.append((None, branch))
-    node_stack = deque()
-    while True:
-        if node is not None:
-            branch.append(node)
-            child_nodes = adjacency[node]
-        if not child_nodes:
-            try:
-                parent_bid, parent, node = node_stack.pop()
-            except IndexError:
-                break
-            else:
-                branch = [parent]
-                branch_id = len(branches)
-                branches.append((parent_bid, branch))
-        elif len(child_nodes) == 1:
-            node = child_nodes[0]
-        else:
-            node_stack.extend((branch_id, node, child) for child in reversed(child_nodes))
-            child_nodes = []
-            node = None
+def _swc_data(content):
+    # Parse the SWC text in bulk, skipping the comment lines.
+    with warnings.catch_warnings():
+        # Empty files are handled below, so silence numpy's empty input warning.
+        warnings.simplefilter("ignore", UserWarning)
+        try:
+            data = np.loadtxt(io.StringIO(content), comments="#", ndmin=2)
+        except ValueError as e:
+            raise ValueError(f"SWC incorrect: {e}") from None
+    if not data.size:
+        return np.empty((0, 7))
+    if data.shape[1] != 7:
+        raise ValueError(f"SWC incorrect: expected 7 columns, found {data.shape[1]}.")
+    return data
+
+
+def _swc_layout(data):
+    # `data` is the raw SWC data, `samples` and `parents` are the graph nodes and edges.
+    samples = data[:, 0].astype(int)
+    parent_samples = data[:, 6].astype(int)
+    n = len(samples)
+    # Map possibly irregular sample IDs (SWC spec allows this) to row numbers.
+    order = np.argsort(samples, kind="stable")
+    found = np.minimum(np.searchsorted(samples[order], parent_samples), max(n - 1, 0))
+    is_root = parent_samples < 0
+    unknown = ~is_root & (samples[order][found] != parent_samples)
+    if np.any(unknown):
+        raise ValueError(
+            f"SWC incorrect: unknown parent samples {parent_samples[unknown].tolist()}"
+        )
+    parents = np.where(is_root, -1, order[found])
+    # Every root node, and every child of a branching node, is the head of an unbranched
+    # stretch of the graph.
+    n_children = np.bincount(parents[~is_root], minlength=n)
+    is_head = is_root.copy()
+    is_head[~is_root] = n_children[parents[~is_root]] != 1
+    # Find the head of the stretch of each node, and its depth in the stretch, by
+    # jumping to the head of the parent's head until all heads are found.
+    head = np.where(is_head, np.arange(n), parents)
+    depth = (~is_head).astype(int)
+    for _ in range(64):
+        jump = ~is_head[head]
+        if not np.any(jump):
+            break
+        depth[jump] += depth[head[jump]]
+        head[jump] = head[head[jump]]
+    else:
+        raise ValueError("SWC incorrect: the samples contain a cycle.")
+    heads = np.nonzero(is_head)[0]
+    stretch = np.searchsorted(heads, head)
+    # Group the nodes per stretch, in order along the stretch.
+    nodes = np.lexsort((depth, stretch))
+    offsets = np.zeros(len(heads) + 1, dtype=int)
+    np.cumsum(np.bincount(stretch, minlength=len(heads)), out=offsets[1:])
+    head_parents = parents[heads]
+    stretch_parents = np.where(head_parents < 0, -1, stretch[head_parents])
+    # Order the stretches depth first, with children in the order of their samples.
+    children = [[] for _ in heads]
+    roots = []
+    for s, parent in enumerate(stretch_parents):
+        (children[parent] if parent >= 0 else roots).append(s)
+    stack = roots[::-1]
+    branch_order = []
+    while stack:
+        s = stack.pop()
+        branch_order.append(s)
+        stack.extend(reversed(children[s]))
+    # Child branches start with a copy of the parent point.
+    rows = []
+    for s in branch_order:
+        if head_parents[s] >= 0:
+            rows.append(head_parents[s : s + 1])
+        rows.append(nodes[offsets[s] : offsets[s + 1]])
+    branch_offsets = np.zeros(len(branch_order) + 1, dtype=int)
+    branch_lens = np.diff(offsets)[branch_order] + (head_parents[branch_order] >= 0)
+    np.cumsum(branch_lens, out=branch_offsets[1:])
+    branch_ids = np.empty(len(heads), dtype=int)
+    branch_ids[branch_order] = np.arange(len(branch_order))
+    branch_parents = np.where(
+        stretch_parents[branch_order] < 0, -1, branch_ids[stretch_parents[branch_order]]
+    )
+    rows = np.concatenate(rows) if rows else np.empty(0, dtype=int)
+    return rows, branch_offsets, branch_parents
 
 
-def _swc_to_morpho(cls, branch_cls, content, tags=None, meta=None):
+def _parse_swc_file(path):
+    with open(str(path), "r") as f:
+        data = _swc_data(f.read())
+    return data, _swc_layout(data)
+
+
+def _swc_to_morpho(cls, branch_cls, content, tags=None, meta=None, parsed=None):
     tag_map = {1: "soma", 2: "axon", 3: "dendrites"}
     if tags is not None:
         tag_map.update(tags)
-    data = np.array(
-        [
-            swc_data
-            for line in content.split("\n")
-            if not line.strip().startswith("#")
-            and (swc_data := [float(x) for x in line.split() if x != ""])
-        ]
-    )
-    if data.dtype.name == "object":
-        err_lines = ", ".join(i for i, d in enumerate(data) if len(d) != 7)
-        raise ValueError(f"SWC incorrect on lines: {err_lines}")
-    # `data` is the raw SWC data, `samples` and `parents` are the graph nodes and edges.
-    samples = data[:, 0].astype(int)
-    # Map possibly irregular sample IDs (SWC spec allows this) to an ordered 0 to N map.
-    id_map = dict(zip(samples, itertools.count()))
-    id_map[-1] = -1
-    # Create an adjacency list of the graph described in the SWC data
-    adjacency = {n: [] for n in range(len(samples))}
-    adjacency[-1] = []
-    map_ids = np.vectorize(id_map.get)
-    parents = map_ids(data[:, 6])
-    for s, p in enumerate(parents):
-        adjacency[p].append(s)
-    # Now turn the adjacency list into a list of unbranching stretches of the graph.
-    # Call these `node_branches` because they only contain the sample/node ids.
-    node_branches = []
-    for root_node in adjacency[-1]:
-        _swc_branch_dfs(adjacency, node_branches, root_node)
+    if parsed is None:
+        data = _swc_data(content)
+        parsed = data, _swc_layout(data)
+    data, (rows, branch_offsets, branch_parents) = parsed
+    # Copy the node data of all branches into the contiguous matrices that will form the
+    # basis of the Morphology data structure.
+    points = data[rows, 2:5]
+    radii = data[rows, 5]
+    tags = data[rows, 1].astype(int)
+    starts = branch_offsets[:-1]
+    # Since we add an extra point to child branches, we copy its tag from the next point.
+    multi = np.diff(branch_offsets) > 1
+    tags[starts[multi]] = tags[starts[multi] + 1]
+    labels = EncodedLabels.none(len(rows))
+    for v in np.unique(tags):
+        labels.label([tag_map.get(v, f"tag_{v}")], tags == v)
     branches = []
     roots = []
-    _len = sum(len(s[1]) for s in node_branches)
-    points = np.empty((_len, 3))
-    radii = np.empty(_len)
-    tags = np.empty(_len, dtype=int)
-    labels = EncodedLabels.none(_len)
-    # Now turn each "node branch" into an actual branch by looking up the node data in the
-    # samples array. We copy over the node data into several contiguous matrices that will
-    # form the basis of the Morphology data structure.
-    ptr = 0
-    for parent, branch_nodes in node_branches:
-        nptr = ptr + len(branch_nodes)
-        node_data = data[branch_nodes]
-        # Example with the points data matrix: copy over the swc data into contiguous arr
-        points[ptr:nptr] = node_data[:, 2:5]
-        # Then create a partial view into that data matrix for the branch
-        branch_points = points[ptr:nptr]
-        # Same here for radius,
-        radii[ptr:nptr] = node_data[:, 5]
-        branch_radii = radii[ptr:nptr]
-        # the SWC tags
-        tags[ptr:nptr] = node_data[:, 1]
-        if len(branch_nodes) > 1:
-            # Since we add an extra point we have to copy its tag from the next point.
-            tags[ptr] = tags[ptr + 1]
-        branch_tags = tags[ptr:nptr]
-        # And the labels
-        branch_labels = labels[ptr:nptr]
-        for v in np.unique(branch_tags):
-            branch_labels.label([tag_map.get(v, f"tag_{v}")], branch_tags == v)
-        ptr = nptr
-        # Use the views to construct the branch
-        branch = branch_cls(branch_points, branch_radii, branch_labels)
-        branch.set_properties(tags=branch_tags)
+    for parent, ptr, nptr in zip(branch_parents, starts, branch_offsets[1:]):
+        # Use views into the matrices to construct the branch
+        branch = branch_cls(points[ptr:nptr], radii[ptr:nptr], labels[ptr:nptr])
+        branch.set_properties(tags=tags[ptr:nptr])
         branches.append(branch)
-        if parent is not None:
+        if parent >= 0:
             branches[parent].attach_child(branch)
         else:
             roots.append(branch)
@@ -1,5 +1,5 @@
 from .. import config
-from .._util import rotation_matrix_from_vectors
+from .._util import rotation_matrices_from_vectors
 from ..config.types import ndarray
 from ..storage import NrrdDependencyNode
 from ..topology.partition import Partition
@@ -215,7 +215,7 @@ class VolumetricRotations(RotationDistributor, classmap_entry="orientation_field
         :rtype: RotationSet
         """
 
-        orientation_field = self.orientation_path.load_object()
+        orientation_field = self.orientation_path.load_object(cache=True)
         voxel_pos = np.asarray(
             np.floor((positions - self.space_origin) / self.orientation_resolution),
             dtype=int,
@@ -246,9 +246,8 @@ class VolumetricRotations(RotationDistributor, classmap_entry="orientation_field
 
         return RotationSet(
             Rotation.from_matrix(
-                rotation_matrix_from_vectors(self.default_vector, v)
+                rotation_matrices_from_vectors(self.default_vector, orientations)
             ).as_euler("xyz", degrees=True)
-            for v in orientations
         )
 
 
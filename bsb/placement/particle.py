@@ -3,10 +3,8 @@ from ..voxels import VoxelSet
 from ..exceptions import *
 from ..reporting import report, warn
 from .. import config
-import itertools
 import numpy as np
-from sklearn.neighbors import KDTree
-from rtree import index
+from scipy.spatial import cKDTree
 
 
 class _VoxelBasedParticleSystem:
@@ -36,17 +34,15 @@ class _VoxelBasedParticleSystem:
         return system
 
     def _extract_system(self, system, chunk, indicators):
-        if len(system.particles) == 0:
+        if len(system) == 0:
             return
 
-        for pt in system.particle_types:
+        for type_id, pt in enumerate(system.particle_types):
             cell_type = self.scaffold.cell_types[pt["name"]]
             indicator = indicators[pt["name"]]
-            particle_positions = [p.position for p in system.particles if p.type is pt]
-            if len(particle_positions) == 0:
+            positions = system.positions[system.types == type_id]
+            if len(positions) == 0:
                 continue
-            positions = np.empty((len(particle_positions), 3))
-            positions[:] = particle_positions
             report(f"Placing {len(positions)} {cell_type.name} in {chunk}", level=3)
             self.place_cells(indicator, positions, chunk)
 
@@ -75,7 +71,7 @@ class ParticlePlacement(PlacementStrategy, _VoxelBasedParticleSystem):
 
     def place(self, chunk, indicators):
         system = self._fill_system(chunk, indicators)
-        if len(system.particles) == 0:
+        if len(system) == 0:
             return
         # Find the set of colliding particles
         colliding = system.find_colliding_particles()
@@ -100,92 +96,29 @@ class ParticlePlacement(PlacementStrategy, _VoxelBasedParticleSystem):
         self._extract_system(system, chunk, indicators)
 
 
-class Particle:
-    def __init__(self, radius, position):
-        self.radius = radius
-        self.position = position
-        self.colliding = False
-        self.locked = False
-        self.volume = sphere_volume(radius)
-        self.reset_displacement()
-
-    def displace_by(self, other):
-        A = self.position - other.position
-        d = np.sqrt(np.sum(A**2))
-        collision_radius = self.radius + other.radius
-        f = Particle.get_displacement_force(collision_radius, d)
-        f_inert = f * other.volume / (other.volume + self.volume)
-        A_norm = A / d
-        self.displacement = self.displacement + A_norm * f_inert * collision_radius
-
-    def displace(self):
-        # TODO: STAY INSIDE OF PARTNER RADIUS
-        self.position = self.position + self.displacement
-        self.reset_displacement()
-
-    def reset_displacement(self):
-        self.displacement = np.zeros((len(self.position)))
-
-    @staticmethod
-    def get_displacement_force(radius, distance):
-        if distance == 0.0:
-            return 0.9
-        return min(0.9, 0.3 / ((distance / radius) ** 2))
-
-
-class Neighbourhood:
-    def __init__(self, epicenter, neighbours, neighbour_radius, partners, partner_radius):
-        self.epicenter = epicenter
-        self.neighbours = neighbours
-        self.neighbour_radius = neighbour_radius
-        self.partners = partners
-        self.partner_radius = partner_radius
-
-    def get_overlap(self):
-        overlap = 0
-        neighbours = self.neighbours
-        n_neighbours = len(neighbours)
-        for partner in self.partners:
-            for neighbour in self.neighbours:
-                if partner.id == neighbour.id:
-                    continue
-                overlap -= min(
-                    0,
-                    distance(partner.position, neighbour.position)
-                    - partner.radius
-                    - neighbour.radius,
-                )
-        return overlap
-
-    def colliding(self):
-        neighbours = self.neighbours
-        for partner in self.partners:
-            for neighbour in self.neighbours:
-                if partner.id == neighbour.id:
-                    continue
-                if (
-                    distance(partner.position, neighbour.position)
-                    - partner.radius
-                    - neighbour.radius
-                    < 0
-                ):
-                    return True
-        return False
-
-
-class ParticleVoxel:
-    def __init__(self, origin, dimensions):
-        self.origin = np.array(origin)
-        self.size = np.array(dimensions)
-
-
 class ParticleSystem:
+    """
+    System of spherical particles inside of a set of voxels. The positions, radii and
+    types of the particles are stored in contiguous arrays, and collisions are resolved
+    by displacing all colliding particles at once, until none overlap.
+    """
+
     def __init__(self, track_displaced=False, scaffold=None, strat=None):
         self.particle_types = []
-        self.voxels = []
         self.track_displaced = track_displaced
         self.scaffold = scaffold
         self.strat = strat
+        self.dimensions = 3
+        self.positions = np.empty((0, 3))
+        self.radii = np.empty(0)
+        self.types = np.empty(0, dtype=int)
+        self.colliding = np.zeros(0, dtype=bool)
+        self.displaced = np.zeros(0, dtype=bool)
+        self.voxel_origins = np.empty((0, 3))
+        self.voxel_sizes = np.empty((0, 3))
+
+    def __len__(self):
+        return len(self.positions)
 
     def fill(self, voxels, particles):
         # Amount of spatial dimensions
@@ -197,13 +130,13 @@ class ParticleSystem:
         self.min_radius = min([pt["radius"] for pt in self.particle_types])
         # Set initial radius for collision/rearrangement to 2 times the largest particle type radius
         self.search_radius = self.max_radius * 2
-        # Create a list of voxels where the particles can be placed.
-        self.voxels.extend(
-            ParticleVoxel(ldc, size)
-            for ldc, size in zip(
-                voxels.as_spatial_coords(copy=False), voxels.get_size_matrix(copy=False)
-            )
-        )
+        # Store the voxels where the particles can be placed.
+        self.voxel_origins = np.concatenate(
+            (self.voxel_origins, voxels.as_spatial_coords(copy=False))
+        ).reshape(-1, self.dimensions)
+        self.voxel_sizes = np.concatenate(
+            (self.voxel_sizes, voxels.get_size_matrix(copy=False))
+        ).reshape(-1, self.dimensions)
         pf = self.get_packing_factor()
         if self.strat is not None:
             strat_name = type(self.strat).__name__
@@ -227,28 +160,33 @@ class ParticleSystem:
                 PackingWarning,
             )
         # Reset particles
-        self.particles = []
+        self.positions = np.empty((0, self.dimensions))
+        self.radii = np.empty(0)
+        self.types = np.empty(0, dtype=int)
         for particle_type in self.particle_types:
-            radius = particle_type["radius"]
             count = particle_type["count"]
             if count.size == 1:
                 self._fill_global(particle_type)
             else:
                 self._fill_per_voxel(particle_type)
+        self.colliding = np.zeros(len(self), dtype=bool)
+        self.displaced = np.zeros(len(self), dtype=bool)
 
     def _fill_per_voxel(self, particle_type):
         voxel_counts = particle_type["count"]
         radius = particle_type["radius"]
-        if len(voxel_counts) != len(self.voxels):
+        if len(voxel_counts) != len(self.voxel_origins):
             raise Exception(
-                f"Particle system voxel mismatch. Given {len(voxel_counts)} expected {len(self.voxels)}"
+                f"Particle system voxel mismatch. Given {len(voxel_counts)} expected {len(self.voxel_origins)}"
             )
-        for voxel, count in zip(self.voxels, voxel_counts):
-            particle_type["placed"] = particle_type.get("placed", 0) + count
-            placement_matrix = np.random.rand(count, self.dimensions)
-            for in_voxel_pos in placement_matrix:
-                particle_position = voxel.origin + in_voxel_pos * voxel.size
-                self.add_particle(radius, particle_position, type=particle_type)
+        particle_type["placed"] = particle_type.get("placed", 0) + np.sum(voxel_counts)
+        # Place the particles randomly inside of the voxels they belong to.
+        voxel_ids = np.repeat(np.arange(len(voxel_counts)), voxel_counts)
+        placement_matrix = np.random.rand(len(voxel_ids), self.dimensions)
+        positions = (
+            self.voxel_origins[voxel_ids] + placement_matrix * self.voxel_sizes[voxel_ids]
+        )
+        self.add_particles(radius, positions, type=particle_type)
 
     def _fill_global(self, particle_type):
         particle_count = int(particle_type["count"])
@@ -257,267 +195,207 @@ class ParticleSystem:
         # Generate a matrix with random positions for the particles
         # Add an extra dimension to determine in which voxels to place the particles
         placement_matrix = np.random.rand(particle_count, self.dimensions + 1)
-        # Generate each particle
-        for row in placement_matrix:
-            # Determine the voxel to be placed in.
-            voxel_id = int(row[0] * len(self.voxels))
-            voxel = self.voxels[voxel_id]
-            # Translate the particle into the voxel based on the remaining dimensions
-            particle_position = voxel.origin + row[1:] * voxel.size
-            # Store the particle object
-            self.add_particle(radius, particle_position, type=particle_type)
-
-    def freeze(self):
-        self.__frozen_positions = np.array([p.position for p in self.particles])
-        self.radii = [p.radius for p in self.particles]
-        self.tree = KDTree(self.__frozen_positions)
-
-    @property
-    def positions(self):
-        x = np.array([p.position for p in self.particles])
-        return x
-
-    def find_colliding_particles(self, freeze=False):
-        if not hasattr(self, "tree") or freeze:
-            self.freeze()
-        # Do an O(n * log(n)) search of all particles by the maximum radius
-        neighbours = self.tree.query_radius(
-            self.__frozen_positions, r=self.search_radius, return_distance=True
+        # Determine the voxel to be placed in.
+        voxel_ids = (placement_matrix[:, 0] * len(self.voxel_origins)).astype(int)
+        # Translate the particle into the voxel based on the remaining dimensions
+        positions = (
+            self.voxel_origins[voxel_ids]
+            + placement_matrix[:, 1:] * self.voxel_sizes[voxel_ids]
         )
-        # An array of arrays representing a list of neighbour ids per cell
-        neighbour_ids = neighbours[0]
-        # Analog for the distances
-        neighbour_distances = neighbours[1]
-        for i in range(len(neighbour_ids)):
-            distances = neighbour_distances[i]
-            if len(distances) == 1:  # No neighbours
-                continue
-            # This cell's neighbours' ids
-            ids = neighbour_ids[i]
-            particle = self.particles[i]
-            for j in range(len(ids)):
-                neighbour_id = ids[j]
-                if neighbour_id == i:
-                    continue
-                neighbour = self.particles[neighbour_id]
-                min_radius = particle.radius + neighbour.radius
-                if distances[j] <= min_radius:
-                    particle.colliding = True
-                    neighbour.colliding = True
-        self.colliding_particles = list(filter(lambda p: p.colliding, self.particles))
+        self.add_particles(radius, positions, type=particle_type)
+
+    def find_colliding_particles(self):
+        """
+        Find all the particles that overlap with another particle.
+
+        :returns: The ids of the colliding particles.
+        :rtype: numpy.ndarray
+        """
+        pairs = self._find_colliding_pairs()
+        self.colliding = np.zeros(len(self), dtype=bool)
+        self.colliding[pairs.reshape(-1)] = True
+        self.colliding_particles = np.nonzero(self.colliding)[0]
         self.colliding_count = len(self.colliding_particles)
         return self.colliding_particles
 
-    def solve_collisions(self):
-        self.find_colliding_particles()
-        self.displaced_particles = set()
-        while self.colliding_count > 0:
-            report("Untangling {} collisions".format(self.colliding_count), level=3)
-            t = self.colliding_count
-            for i, epicenter_particle in enumerate(self.colliding_particles):
-                neighbourhood = self.find_neighbourhood(epicenter_particle)
-                if self.track_displaced:
-                    self.displaced_particles.update(neighbourhood.partners)
-                self.resolve_neighbourhood(neighbourhood)
-                if not i % 100:
-                    report(str(i) + " / " + str(t), level=3, ongoing=True)
-            # Double check that there's no collisions left
-            self.freeze()
-            self.find_colliding_particles()
-        self.displaced_particles = list(self.displaced_particles)
-
-    def resolve_neighbourhood(self, neighbourhood):
-        # for neighbour in neighbourhood.neighbours:
-        #     neighbour.locked = True
-        # for partner in neighbourhood.partners:
-        #     partner.locked = False
-        i = 0
-        stuck = False
-        overlap = 0.0
-        while neighbourhood.colliding():
-            i += 1
-            overlap = neighbourhood.get_overlap()
-            for partner in neighbourhood.partners:
-                for neighbour in neighbourhood.neighbours:
-                    if partner.id == neighbour.id:
-                        continue
-                    partner.displace_by(neighbour)
-            for partner in neighbourhood.partners:
-                partner.displace()
-            overlap = neighbourhood.get_overlap()
-            if i > 100:
-                stuck = True
-                print("STUCK")
-                break
-        if not stuck:
-            self.colliding_count -= len(neighbourhood.partners)
-            for partner in neighbourhood.partners:
-                partner.colliding = False
-
-    def find_neighbourhood(self, particle):
-        epicenter = particle.position
-        neighbourhood_radius = self.max_radius * 2
-        neighbourhood_ok = False
-        expansions = 0
-        while not neighbourhood_ok:
-            expansions += 1
-            neighbourhood_radius += self.max_radius / min(expansions, 6)
-            neighbour_ids = self.tree.query_radius([epicenter], r=neighbourhood_radius)[0]
-            neighbours = [self.particles[id] for id in neighbour_ids]
-            neighbourhood_packing_factor = self.get_packing_factor(
-                neighbours, sphere_volume(neighbourhood_radius)
-            )
-            partner_radius = neighbourhood_radius - self.max_radius
-            partner_ids = self.tree.query_radius([epicenter], r=partner_radius)[0]
-            partners = [self.particles[id] for id in partner_ids]
-            partner_packing_factor = self.get_packing_factor(
-                partners, sphere_volume(partner_radius)
-            )
-            partners = list(filter(lambda p: not p.locked and p.colliding, partners))
-            neighbourhood_ok = (
-                neighbourhood_packing_factor < 0.5 and partner_packing_factor < 0.5
-            )
-            if expansions > 100:
-                raise Exception(
-                    f"ERROR! Unable to find suited neighbourhood around {epicenter}"
+    def _find_colliding_pairs(self):
+        if len(self) < 2:
+            return np.empty((0, 2), dtype=int)
+        # Do an O(n * log(n)) search of all pairs of particles closer than the largest
+        # possible collision distance, then keep only the overlapping pairs.
+        tree = cKDTree(self.positions)
+        pairs = tree.query_pairs(r=self.search_radius, output_type="ndarray")
+        distances = np.linalg.norm(
+            self.positions[pairs[:, 0]] - self.positions[pairs[:, 1]], axis=1
+        )
+        return pairs[distances <= self.radii[pairs].sum(axis=1)]
+
+    def solve_collisions(self, max_iterations=1000):
+        """
+        Displace colliding particles away from each other until no particles overlap.
+
+        :param max_iterations: Maximum number of displacement rounds.
+        :type max_iterations: int
+        """
+        self.displaced = np.zeros(len(self), dtype=bool)
+        pairs = self._find_colliding_pairs()
+        volumes = sphere_volume(self.radii)
+        iterations = 0
+        while len(pairs):
+            report(f"Untangling {len(pairs)} collisions", level=3)
+            if iterations == max_iterations:
+                warn(
+                    f"Could not untangle {len(pairs)} collisions"
+                    + f" after {max_iterations} iterations.",
+                    PackingWarning,
                 )
-        return Neighbourhood(
-            epicenter, neighbours, neighbourhood_radius, partners, partner_radius
+                break
+            iterations += 1
+            self.positions += self._get_displacement(pairs, volumes)
+            if self.track_displaced:
+                self.displaced[pairs.reshape(-1)] = True
+            pairs = self._find_colliding_pairs()
+        self.colliding = np.zeros(len(self), dtype=bool)
+        self.colliding_count = 0
+        self.displaced_particles = np.nonzero(self.displaced)[0]
+
+    def _get_displacement(self, pairs, volumes):
+        i, j = pairs.T
+        vector = self.positions[i] - self.positions[j]
+        distance = np.linalg.norm(vector, axis=1)
+        collision_radius = self.radii[i] + self.radii[j]
+        # Particles on top of each other are pushed apart in a random direction.
+        coincide = distance == 0
+        vector[coincide] = np.random.normal(
+            size=(np.count_nonzero(coincide), self.dimensions)
+        )
+        norm = vector / np.linalg.norm(vector, axis=1)[:, np.newaxis]
+        force = np.full(len(pairs), 0.9)
+        force[~coincide] = np.minimum(
+            0.9, 0.3 / (distance[~coincide] / collision_radius[~coincide]) ** 2
         )
+        # Heavier particles are displaced less.
+        inertia = volumes[i] + volumes[j]
+        push = (norm * (force * collision_radius)[:, np.newaxis]).T
+        displacement = np.zeros_like(self.positions)
+        for dim in range(self.dimensions):
+            np.add.at(displacement[:, dim], i, push[dim] * volumes[j] / inertia)
+            np.add.at(displacement[:, dim], j, -push[dim] * volumes[i] / inertia)
+        return displacement
 
     def add_particle(self, radius, position, type=None):
-        particle = Particle(radius, position)
-        particle.id = len(self.particles)
-        particle.type = type
-        self.particles.append(particle)
+        self.add_particles(radius, [position], type=type)
 
     def add_particles(self, radius, positions, type=None):
-        for position in positions:
-            self.add_particle(radius, position, type=type)
+        positions = np.array(positions, dtype=float).reshape(-1, self.dimensions)
+        type_id = -1 if type is None else self.particle_types.index(type)
+        self.positions = np.concatenate((self.positions, positions))
+        self.radii = np.concatenate((self.radii, np.full(len(positions), radius)))
+        self.types = np.concatenate((self.types, np.full(len(positions), type_id)))
+        self.colliding = np.concatenate(
+            (self.colliding, np.zeros(len(positions), dtype=bool))
+        )
+        self.displaced = np.concatenate(
+            (self.displaced, np.zeros(len(positions), dtype=bool))
+        )
 
     def remove_particles(self, particles_id):
         # Remove particles with a certain id
-        for index in sorted(particles_id, reverse=True):
-            del self.particles[index]
-
-    def deintersect(self, nearest_neighbours=None):
-        if nearest_neighbours is None:
-            nearest_neighbours = self.estimate_nearest_neighbours()
+        keep = np.ones(len(self), dtype=bool)
+        keep[np.asarray(particles_id, dtype=int)] = False
+        self.positions = self.positions[keep]
+        self.radii = self.radii[keep]
+        self.types = self.types[keep]
+        self.colliding = self.colliding[keep]
+        self.displaced = self.displaced[keep]
 
     def get_packing_factor(self, particles=None, volume=None):
-        if particles is None:
-            particles_volume = np.sum(
-                [p["count"] * sphere_volume(p["radius"]) for p in self.particle_types]
-            )
-        else:
-            particles_volume = np.sum([sphere_volume(p.radius) for p in particles])
-        if volume is None:
-            volume = np.sum([np.product(v.size) for v in self.voxels])
-        return particles_volume / volume
+        return np.divide(*self._get_packing_factors(particles, volume)[1:])
 
     def _get_packing_factors(self, particles=None, volume=None):
         if particles is None:
-            particles_volume = np.sum(
-                [p["count"] * sphere_volume(p["radius"]) for p in self.particle_types]
+            particles_volume = sum(
+                np.sum(p["count"]) * sphere_volume(p["radius"])
+                for p in self.particle_types
             )
-            particles_count = np.sum([p["count"] for p in self.particle_types])
+            particles_count = sum(np.sum(p["count"]) for p in self.particle_types)
         else:
-            particles_volume = np.sum([sphere_volume(p.radius) for p in particles])
+            particles_volume = np.sum(sphere_volume(self.radii[particles]))
             particles_count = len(particles)
         if volume is None:
-            volume = np.sum([np.product(v.size) for v in self.voxels])
+            volume = np.sum(np.prod(self.voxel_sizes, axis=1))
         return particles_count, particles_volume, volume
 
+    def inside(self, positions):
+        """
+        Check which positions lie inside of the voxels of the system.
+
+        :returns: Mask of the positions inside of the voxels.
+        :rtype: numpy.ndarray[bool]
+        """
+        sizes = self.voxel_sizes
+        if not len(sizes):
+            return np.zeros(len(positions), dtype=bool)
+        size = sizes[0]
+        if np.all(size > 0) and np.allclose(sizes, size):
+            # When all voxels are of the same size, a position lies inside of a voxel if
+            # its scaled Chebyshev distance to the voxel center is at most a half.
+            centers = (self.voxel_origins + size / 2) / size
+            dist, _ = cKDTree(centers).query(positions / size, p=np.inf)
+            return dist <= 0.5 + 1e-9
+        inside = np.zeros(len(positions), dtype=bool)
+        for origin, size in zip(self.voxel_origins, sizes):
+            inside |= np.all((positions >= origin) & (positions <= origin + size), axis=1)
+        return inside
+
     def prune(self, at_risk_particles=None, voxels=None):
         """
         Remove particles that have been moved outside of the bounds of the voxels.
 
-        :param at_risk_particles: Subset of particles that might've been moved and might need to be moved, if omitted check all particles.
+        :param at_risk_particles: Ids of the particles that might've been moved and might
+          need to be moved, if omitted check all particles.
         :type at_risk_particles: :class:`numpy.ndarray`
-        :param voxels: A subset of the voxels that the particles have to be in bounds of, if omitted all voxels are used.
+        :param voxels: Unused, the particles have to be in bounds of the voxels of the
+          system.
         """
-        # Define affected particles and voxels
         if at_risk_particles is None:
-            at_risk_particles = self.particles
-        if voxels is None:
-            voxels = self.voxels
-        # Initialize Rtree index.
-        property = index.Property(dimension=3)
-        idx = index.Index(properties=property, interleaved=True)
-        # Insert voxel bounds in index.
-        for i, voxel in enumerate(self.voxels):
-            idx.insert(
-                i,
-                (*voxel.origin, *(voxel.origin + voxel.size)),
-            )
-        # Query index, filter whether the intersection returns any hits, map to id and cell type.
-        out_of_bounds_ids = list(
-            map(
-                lambda p: p.id,
-                filter(
-                    lambda p: not (list(idx.intersection((*p.position, *p.position)))),
-                    at_risk_particles,
-                ),
-            )
+            at_risk_particles = np.arange(len(self))
+        at_risk_particles = np.asarray(at_risk_particles, dtype=int)
+        outside = ~self.inside(self.positions[at_risk_particles])
+        out_of_bounds_ids = at_risk_particles[outside]
+        type_counts = np.bincount(
+            self.types[out_of_bounds_ids], minlength=len(self.particle_types)
         )
-
-        out_of_bounds_types = list(
-            map(
-                lambda p: p.type["name"],
-                filter(
-                    lambda p: not (list(idx.intersection((*p.position, *p.position)))),
-                    at_risk_particles,
-                ),
-            )
-        )
-
-        types = set(out_of_bounds_types)
-        unique_types = list(types)
-
-        # Remove out of bounds particles and return number of affected particles.
-        pruned = self.remove_particles(out_of_bounds_ids)
-        number_pruned = len(out_of_bounds_ids)
-        tot_number_pruned = len(out_of_bounds_ids)
         number_pruned_per_type = {t["name"]: 0 for t in self.particle_types}
-        if tot_number_pruned > 0:
-            for t in unique_types:
-                number_pruned_per_type[t] = out_of_bounds_types.count(t)
-        return tot_number_pruned, number_pruned_per_type
-
-
-class LargeParticleSystem(ParticleSystem):
-    def __init__(self):
-        ParticleSystem.__init__()
-
-    def placing(self):
-        pass
-
-    def fill(self):
-        super().fill()
-
-    def solve_collisions(self):
-        # todo: take smaller particle systems
-
-        super().solve_collisions()
+        for t, count in zip(self.particle_types, type_counts):
+            number_pruned_per_type[t["name"]] += int(count)
+        # Remove out of bounds particles and return number of affected particles.
+        self.remove_particles(out_of_bounds_ids)
+        return len(out_of_bounds_ids), number_pruned_per_type
 
 
 def plot_particle_system(system):
-    nc_particles = list(filter(lambda p: not p.colliding, system.particles))
-    c_particles = list(filter(lambda p: p.colliding, system.particles))
-    nc_trace = get_particles_trace(nc_particles)
+    import plotly.graph_objects as go
+
+    nc_trace = get_particles_trace(system.positions[~system.colliding])
     c_trace = get_particles_trace(
-        c_particles, marker=dict(color="rgba(200, 100, 0, 1)", size=2)
+        system.positions[system.colliding],
+        marker=dict(color="rgba(200, 100, 0, 1)", size=2),
     )
     fig = go.Figure(data=[c_trace, nc_trace])
     if system.dimensions == 3:
         fig.update_layout(scene_aspectmode="cube")
-        fig.layout.scene.xaxis.range = [0.0, system.size[0]]
-        fig.layout.scene.yaxis.range = [0.0, system.size[1]]
-        fig.layout.scene.zaxis.range = [0.0, system.size[2]]
+        ldc = np.min(system.voxel_origins, axis=0)
+        mdc = np.max(system.voxel_origins + system.voxel_sizes, axis=0)
+        fig.layout.scene.xaxis.range = [ldc[0], mdc[0]]
+        fig.layout.scene.yaxis.range = [ldc[1], mdc[1]]
+        fig.layout.scene.zaxis.range = [ldc[2], mdc[2]]
     fig.show()
 
 
-def get_particles_trace(particles, dimensions=3, axes={"x": 0, "y": 1, "z": 2}, **kwargs):
+def get_particles_trace(positions, dimensions=3, axes={"x": 0, "y": 1, "z": 2}, **kwargs):
+    import plotly.graph_objects as go
+
     trace_kwargs = {
         "mode": "markers",
         "marker": {"color": "rgba(100, 100, 100, 0.7)", "size": 1},
@@ -527,43 +405,43 @@ def get_particles_trace(particles, dimensions=3, axes={"x": 0, "y": 1, "z": 2},
         raise ValueError("Maximum 3 dimensional plots. Unless you have mutant eyes.")
     elif dimensions == 3:
         return go.Scatter3d(
-            x=list(map(lambda p: p.position[axes["x"]], particles)),
-            y=list(map(lambda p: p.position[axes["y"]], particles)),
-            z=list(map(lambda p: p.position[axes["z"]], particles)),
+            x=positions[:, axes["x"]],
+            y=positions[:, axes["y"]],
+            z=positions[:, axes["z"]],
             **trace_kwargs,
         )
     elif dimensions == 2:
         return go.Scatter(
-            x=list(map(lambda p: p.position[axes["x"]], particles)),
-            y=list(map(lambda p: p.position[axes["y"]], particles)),
-            **trace_kwargs,
+            x=positions[:, axes["x"]], y=positions[:, axes["y"]], **trace_kwargs
         )
     elif dimensions == 1:
-        return go.Scatter(
-            x=list(map(lambda p: p.position[axes["x"]], particles)), **trace_kwargs
-        )
+        return go.Scatter(x=positions[:, axes["x"]], **trace_kwargs)
 
 
 def plot_detailed_system(system):
+    import plotly.graph_objects as go
+
     fig = go.Figure()
     fig.update_layout(showlegend=False)
-    for particle in system.particles:
-        trace = get_particle_trace(particle)
+    for position, radius, colliding in zip(
+        system.positions, system.radii, system.colliding
+    ):
+        trace = get_particle_trace(position, radius, colliding)
         fig.add_trace(trace)
     fig.update_layout(scene_aspectmode="data")
     fig.update_layout(
         scene=dict(
             xaxis=dict(
                 tick0=0,
-                dtick=system.voxels[0].size[0],
+                dtick=system.voxel_sizes[0][0],
             ),  # Use the size of the first voxel to set ticks of axes
             yaxis=dict(
                 tick0=650,
-                dtick=system.voxels[0].size[1],
+                dtick=system.voxel_sizes[0][1],
             ),
             zaxis=dict(
                 tick0=800,
-                dtick=system.voxels[0].size[2],
+                dtick=system.voxel_sizes[0][2],
             ),
         )
     )
@@ -571,120 +449,24 @@ def plot_detailed_system(system):
     return fig
 
 
-def get_particle_trace(particle):
+def get_particle_trace(position, radius, colliding=False):
+    import plotly.graph_objects as go
+
     theta = np.linspace(0, 2 * np.pi, 10)
     phi = np.linspace(0, np.pi, 10)
-    x = np.outer(np.cos(theta), np.sin(phi)) * particle.radius + particle.position[0]
-    y = np.outer(np.sin(theta), np.sin(phi)) * particle.radius + particle.position[1]
-    z = np.outer(np.ones(10), np.cos(phi)) * particle.radius + particle.position[2]
+    x = np.outer(np.cos(theta), np.sin(phi)) * radius + position[0]
+    y = np.outer(np.sin(theta), np.sin(phi)) * radius + position[1]
+    z = np.outer(np.ones(10), np.cos(phi)) * radius + position[2]
     return go.Surface(
         x=x,
         y=y,
         z=z,
-        surfacecolor=np.zeros(10) + int(particle.colliding),
+        surfacecolor=np.zeros(10) + int(colliding),
         colorscale=[[0, "rgb(100, 100, 100)"], [1, "rgb(200, 100, 0)"]],
-        opacity=0.5 + 0.5 * int(particle.colliding),
+        opacity=0.5 + 0.5 * int(colliding),
         showscale=False,
     )
 
 
 def sphere_volume(radius):
     return 4 / 3 * np.pi * radius**3
-
-
-def distance(a, b):
-    return np.sqrt(np.sum((b - a) ** 2))
-
-
-class AdaptiveNeighbourhood(ParticleSystem):
-    def find_neighbourhood(self, particle):
-        epicenter = particle.position
-        precautious_radius = particle.radius + self.max_radius
-        partner_ids = self.tree.query_radius([epicenter], r=precautious_radius)[0]
-        if len(partner_ids) == 0:
-            return Neighbourhood(
-                epicenter, [], precautious_radius, [], precautious_radius
-            )
-        # partner_radius = rA + rB where B is the largest particle around.
-        partner_radius = np.max(
-            [
-                self.particles[id].radius if id != particle.id else 0.0
-                for id in partner_ids
-            ]
-        )
-        neighbourhood_ok = False
-        expansions = 0
-        while not neighbourhood_ok:
-            expansions += 1
-            partner_radius += particle.radius / min(expansions, 6)
-            partner_ids = self.tree.query_radius([epicenter], r=partner_radius)[0]
-            partners = [self.particles[id] for id in partner_ids]
-            partner_packing_factor = self.get_packing_factor(
-                partners, sphere_volume(partner_radius)
-            )
-            if partner_packing_factor > 0.5:
-                continue
-
-            neighbourhood_radius = partner_radius + self.max_radius
-            neighbour_ids = self.tree.query_radius([epicenter], r=neighbourhood_radius)[0]
-            neighbours = [self.particles[id] for id in neighbour_ids]
-            strictly_neighbours = list(
-                filter(lambda n: n.id not in partner_ids, neighbours)
-            )
-            if len(strictly_neighbours) > 0:
-                max_neighbour_radius = np.max([n.radius for n in strictly_neighbours])
-                if max_neighbour_radius != self.max_radius:
-                    neighbourhood_radius = partner_radius + max_neighbour_radius
-                    neighbour_ids = self.tree.query_radius(
-                        [epicenter], r=neighbourhood_radius
-                    )[0]
-                    neighbours = [self.particles[id] for id in neighbour_ids]
-            neighbourhood_packing_factor = self.get_packing_factor(
-                neighbours, sphere_volume(neighbourhood_radius)
-            )
-            neighbourhood_ok = neighbourhood_packing_factor < 0.5
-            if expansions > 100:
-                raise Exception(
-                    f"ERROR! Unable to find suited neighbourhood around {epicenter}"
-                )
-
-        return Neighbourhood(
-            epicenter, neighbours, neighbourhood_radius, partners, partner_radius
-        )
-
-
-class SmallestNeighbourhood(ParticleSystem):
-    def find_neighbourhood(self, particle):
-        epicenter = particle.position
-        # print("Finding collision neighbourhood for particle", particle.id)
-        neighbourhood_radius = particle.radius + self.min_radius
-        neighbourhood_ok = False
-        expansions = 0
-        while not neighbourhood_ok:
-            expansions += 1
-            neighbourhood_radius += self.min_radius
-            neighbour_ids = self.tree.query_radius([epicenter], r=neighbourhood_radius)[0]
-            if len(neighbour_ids) == 0:
-                return Neighbourhood(epicenter, [], 0, [], 0)
-            neighbours = [self.particles[id] for id in neighbour_ids]
-            max_neighbour_radius = np.max([n.radius for n in neighbours])
-            neighbourhood_packing_factor = self.get_packing_factor(
-                neighbours, sphere_volume(neighbourhood_radius)
-            )
-            partner_radius = neighbourhood_radius - max_neighbour_radius
-            partner_ids = self.tree.query_radius([epicenter], r=partner_radius)[0]
-            partners = [self.particles[id] for id in partner_ids]
-            partner_packing_factor = self.get_packing_factor(
-                partners, sphere_volume(partner_radius)
-            )
-            partners = list(filter(lambda p: not p.locked and p.colliding, partners))
-            neighbourhood_ok = (
-                neighbourhood_packing_factor < 0.5 and partner_packing_factor < 0.5
-            )
-            if expansions > 100:
-                raise Exception(
-                    f"ERROR! Unable to find suited neighbourhood around {epicenter}"
-                )
-        return Neighbourhood(
-            epicenter, neighbours, neighbourhood_radius, partners, partner_radius
-        )
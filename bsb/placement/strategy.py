@@ -10,7 +10,7 @@ from ..reporting import report
 from ..config import refs, types
 from .._util import SortableByAfter, obj_str_insert
 from ..voxels import VoxelSet
-from ..storage import Chunk
+from ..storage import Chunk, chunk_batches
 from .indicator import PlacementIndications, PlacementIndicator
 from .distributor import DistributorsNode
 import numpy as np
@@ -31,6 +31,7 @@ class PlacementStrategy(abc.ABC, SortableByAfter):
     overrides = config.dict(type=PlacementIndications)
     after = config.reflist(refs.placement_ref)
     distribute = config.attr(type=DistributorsNode, default=dict, call_default=True)
+    chunks_per_job = config.attr(type=int, default=1)
     indicator_class = PlacementIndicator
 
     def __init_subclass__(cls, **kwargs):
@@ -103,18 +104,27 @@ class PlacementStrategy(abc.ABC, SortableByAfter):
         """
         Specifies how to queue this placement strategy into a job pool. Can be overridden,
         the default implementation asks each partition to chunk itself and creates 1
-        placement job per chunk.
+        placement job per ``chunks_per_job`` chunks.
         """
         # Reset jobs that we own
         self._queued_jobs = []
         # Get the queued jobs of all the strategies we depend on.
         deps = set(itertools.chain(*(strat._queued_jobs for strat in self.get_after())))
         for p in self.partitions:
-            chunks = p.to_chunks(chunk_size)
+            chunks = [Chunk(chunk, chunk_size) for chunk in p.to_chunks(chunk_size)]
+            self._queue_chunks(pool, chunks, deps)
+        report(f"Queued {len(self._queued_jobs)} jobs for {self.name}", level=2)
+
+    def _queue_chunks(self, pool, chunks, deps):
+        if self.chunks_per_job > 1:
+            # Group spatially adjacent chunks into a single job.
+            for batch in chunk_batches(chunks, self.chunks_per_job):
+                job = pool.queue_placement_batch(self, batch, deps=deps)
+                self._queued_jobs.append(job)
+        else:
             for chunk in chunks:
-                job = pool.queue_placement(self, Chunk(chunk, chunk_size), deps=deps)
+                job = pool.queue_placement(self, chunk, deps=deps)
                 self._queued_jobs.append(job)
-        report(f"Queued {len(self._queued_jobs)} jobs for {self.name}", level=2)
 
     def is_entities(self):
         return "entities" in self.__class__.__dict__ and self.__class__.entities
@@ -173,9 +183,11 @@ class FixedPositions(PlacementStrategy):
         self._queued_jobs = []
         # Get the queued jobs of all the strategies we depend on.
         deps = set(itertools.chain(*(strat._queued_jobs for strat in self.get_after())))
-        for chunk in VoxelSet.fill(self.positions, chunk_size):
-            job = pool.queue_placement(self, Chunk(chunk, chunk_size), deps=deps)
-            self._queued_jobs.append(job)
+        chunks = [
+            Chunk(chunk, chunk_size)
+            for chunk in VoxelSet.fill(self.positions, chunk_size)
+        ]
+        self._queue_chunks(pool, chunks, deps)
         report(f"Queued {len(self._queued_jobs)} jobs for {self.name}", level=2)
 
 
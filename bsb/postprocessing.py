@@ -4,10 +4,29 @@ import numpy as np
 from .exceptions import MorphologyError, MorphologyDataError, ConnectivityWarning
 from . import config
 from .config import types
+from .storage import chunklist
+import itertools
 
 
 @config.dynamic(attr_name="strategy")
 class PostProcessingHook:
+    name = config.attr(key=True)
+
+    def queue(self, pool, stage, deps=None):
+        """
+        Specifies how to queue this hook into a job pool. Can be overridden, the default
+        implementation queues the hook of the given stage as a single job.
+
+        :param pool: The job pool.
+        :type pool: ~bsb.services.pool.JobPool
+        :param stage: ``"after_placement"`` or ``"after_connectivity"``.
+        :type stage: str
+        :param deps: Jobs that have to complete before this hook can run.
+        :returns: The queued jobs.
+        :rtype: list[~bsb.services.pool.Job]
+        """
+        return [pool.queue_postprocessing(self, stage, deps=deps)]
+
     def after_placement(self):
         raise NotImplementedError(
             "`after_placement` hook not defined on " + self.__class__.__name__
@@ -19,19 +38,54 @@ class PostProcessingHook:
         )
 
 
+class ChunkedPostProcessingHook(PostProcessingHook):
+    """
+    Hook that only touches the cells of one chunk at a time. The hook of each chunk is
+    queued as a separate job, ``after_placement(chunk)`` or ``after_connectivity(chunk)``,
+    so that the chunks are distributed over the workers.
+    """
+
+    def get_chunks(self, stage):
+        """
+        Return the chunks to run the hook for. The default implementation returns all
+        the chunks that contain cells.
+        """
+        return chunklist(
+            itertools.chain.from_iterable(
+                ps.get_all_chunks() for ps in self.scaffold.get_placement_sets()
+            )
+        )
+
+    def queue(self, pool, stage, deps=None):
+        return [
+            pool.queue_postprocessing(self, stage, chunk, deps=deps)
+            for chunk in self.get_chunks(stage)
+        ]
+
+    def after_placement(self, chunk):
+        raise NotImplementedError(
+            "`after_placement` hook not defined on " + self.__class__.__name__
+        )
+
+    def after_connectivity(self, chunk):
+        raise NotImplementedError(
+            "`after_connectivity` hook not defined on " + self.__class__.__name__
+        )
+
+
 @config.node
 class LabelMicrozones(PostProcessingHook):
     targets = config.attr(type=types.list(), required=True)
 
     def after_placement(self):
-        # Divide the volume into two sub-parts (one positive and one negative)
+        # Divide the volume into two sub-parts (one positive and one negative). The
+        # median is taken over the whole population, so this hook can't run per chunk.
         for neurons_2b_labeled in self.targets:
             ps = self.scaffold.get_placement_set(neurons_2b_labeled)
-            ids = ps.load_identifiers()
             zeds = ps.load_positions()[:, 2]
             z_sep = np.median(zeds)
-            index_pos = np.where(zeds >= z_sep)[0]
-            index_neg = np.where(zeds < z_sep)[0]
+            index_pos = np.nonzero(zeds >= z_sep)[0]
+            index_neg = np.nonzero(zeds < z_sep)[0]
             report(
                 neurons_2b_labeled
                 + " divided into microzones: {} positive, {} negative".format(
@@ -41,112 +95,108 @@ class LabelMicrozones(PostProcessingHook):
             )
 
             labels = {
-                "microzone-positive": ids[index_pos],
-                "microzone-negative": ids[index_neg],
+                "microzone-positive": index_pos,
+                "microzone-negative": index_neg,
             }
-
-            self.scaffold.label_cells(
-                ids[index_pos],
-                label="microzone-positive",
-            )
-            self.scaffold.label_cells(
-                ids[index_neg],
-                label="microzone-negative",
-            )
+            for label, cells in labels.items():
+                if len(cells):
+                    ps.label([label], cells)
 
             self.label_satellites(neurons_2b_labeled, labels)
 
     def label_satellites(self, planet_type, labels):
-        for possible_satellites in self.scaffold.get_cell_types():
-            # Find all cell types that specify this type as their planet type
-            if (
-                hasattr(possible_satellites.placement, "planet_types")
-                and planet_type in possible_satellites.placement.planet_types
-            ):
-                # Get the IDs of this sattelite cell type.
-                ps = self.scaffold.get_placement_set(possible_satellites.name)
-                satellites = ps.identifiers
-                # Retrieve the planet map for this satellite type. A planet map is an
-                # array that lists the planet for each satellite. `sattelite_map[n]`` will
-                # hold the planet ID for sattelite `n`, where `n` the index of the
-                # satellites in their cell type, not their scaffold ID.
-                satellite_map = self.scaffold._planets[possible_satellites.name].copy()
-                # Create counters for each label for the report below
-                satellite_label_count = {l: 0 for l in labels.keys()}
-                # Iterate each label to check for any planets with that label, and label
-                # their sattelite with the same label. After iterating all labels, each
-                # satellite should have the same labels as their planet.
-                for label, labelled_cells in labels.items():
-                    for i, satellite in enumerate(satellites):
-                        planet = satellite_map[i]
-                        if planet in labelled_cells:
-                            self.scaffold.label_cells([satellite], label=label)
-                            # Increase the counter of this label
-                            satellite_label_count[label] += 1
-                if sum(satellite_label_count.values()) > 0:
-                    # Report how many labels have been applied to which cell type.
-                    report(
-                        "{} are satellites of {} and have been labelled as: {}".format(
-                            possible_satellites.name,
-                            planet_type,
-                            ", ".join(
-                                map(
-                                    lambda label, count: str(count) + " " + label,
-                                    satellite_label_count.keys(),
-                                    satellite_label_count.values(),
-                                )
-                            ),
+        # Find all cell types placed by strategies that specify this type as their
+        # planet type
+        satellite_types = {
+            ct.name: ct
+            for strat in self.scaffold.placement.values()
+            if planet_type in (pt.name for pt in getattr(strat, "planet_types", []))
+            for ct in strat.cell_types
+        }
+        for possible_satellites in satellite_types.values():
+            ps = self.scaffold.get_placement_set(possible_satellites.name)
+            # Retrieve the planet map for this satellite type. A planet map is an
+            # array that lists the planet for each satellite. `sattelite_map[n]`` will
+            # hold the planet ID for sattelite `n`, where `n` the index of the
+            # satellites in their cell type, not their scaffold ID.
+            planets = getattr(self.scaffold, "_planets", {})
+            satellite_map = np.array(planets.get(possible_satellites.name, []))
+            # Label each satellite with the same labels as their planet.
+            satellite_label_count = {}
+            for label, labelled_cells in labels.items():
+                satellites = np.nonzero(np.isin(satellite_map, labelled_cells))[0]
+                if len(satellites):
+                    ps.label([label], satellites)
+                satellite_label_count[label] = len(satellites)
+            if sum(satellite_label_count.values()) > 0:
+                # Report how many labels have been applied to which cell type.
+                report(
+                    "{} are satellites of {} and have been labelled as: {}".format(
+                        possible_satellites.name,
+                        planet_type,
+                        ", ".join(
+                            f"{count} {label}"
+                            for label, count in satellite_label_count.items()
                         ),
-                        level=3,
-                    )
+                    ),
+                    level=3,
+                )
 
 
-class AscendingAxonLengths(PostProcessingHook):
-    def after_placement(self):
+@config.node
+class AscendingAxonLengths(ChunkedPostProcessingHook):
+    def get_chunks(self, stage):
+        return self.scaffold.get_placement_set("granule_cell").get_all_chunks()
+
+    def after_placement(self, chunk):
         granule_type = self.scaffold.cell_types.granule_cell
-        granules = self.scaffold.get_placement_set(granule_type.name)
+        granules = self.scaffold.get_placement_set(granule_type, chunks=[chunk])
         granule_geometry = granule_type.spatial.geometry
-        parallel_fibers = np.zeros((len(granules)))
         pf_height = granule_geometry.pf_height
         pf_height_sd = granule_geometry.pf_height_sd
         molecular_layer = self.scaffold.partitions.molecular_layer
         floor_ml = molecular_layer.boundaries.y
         roof_ml = floor_ml + molecular_layer.boundaries.height
 
-        for idx, granule in enumerate(granules.load_cells()):
-            granule_y = granule.position[1]
-            # Determine min and max height so that the parallel fiber is inside of the molecular layer
-            pf_height_min = floor_ml - granule_y
-            pf_height_max = roof_ml - granule_y
-            # Determine the shape parameters a and b of the truncated normal distribution.
-            # See https://docs.scipy.org/doc/scipy/reference/generated/scipy.stats.truncnorm.html
-            a, b = (
-                (pf_height_min - pf_height) / pf_height_sd,
-                (pf_height_max - pf_height) / pf_height_sd,
-            )
-            # Draw a sample for the parallel fiber height from a truncated normal distribution
-            # with sd `pf_height_sd` and mean `pf_height`, truncated by the molecular layer bounds.
-            parallel_fibers[idx] = truncnorm.rvs(a, b, size=1) * pf_height_sd + pf_height
-        granules.append_additional(chunk, "ascending_axon_lengths", data=parallel_fibers)
+        granule_y = granules.load_positions()[:, 1]
+        # Determine min and max height so that the parallel fiber is inside of the
+        # molecular layer
+        pf_height_min = floor_ml - granule_y
+        pf_height_max = roof_ml - granule_y
+        # Determine the shape parameters a and b of the truncated normal distribution.
+        # See https://docs.scipy.org/doc/scipy/reference/generated/scipy.stats.truncnorm.html
+        a, b = (
+            (pf_height_min - pf_height) / pf_height_sd,
+            (pf_height_max - pf_height) / pf_height_sd,
+        )
+        # Draw a sample for the parallel fiber height of each granule cell from a
+        # truncated normal distribution with sd `pf_height_sd` and mean `pf_height`,
+        # truncated by the molecular layer bounds.
+        parallel_fibers = (
+            truncnorm.rvs(a, b, size=len(granule_y)) * pf_height_sd + pf_height
+        )
+        granules.append_additional("ascending_axon_lengths", chunk, parallel_fibers)
 
 
-class DCNRotations(PostProcessingHook):
+@config.node
+class DCNRotations(ChunkedPostProcessingHook):
     """
     Create a matrix of planes tilted between -45° and 45°,
     storing id and the planar coefficients a, b, c and d for each DCN cell
     """
 
-    def after_placement(self):
-        ps = self.scaffold.get_placement_set("dcn_cell")
-        dend_tree_coeff = np.zeros((len(ps), 4))
-        positions = ps.positions
-        for i in range(len(ps)):
-            # Make the planar coefficients a, b and c.
-            dend_tree_coeff[i] = np.random.rand(4) * 2.0 - 1.0
-            # Calculate the last planar coefficient d from ax + by + cz - d = 0
-            # => d = - (ax + by + cz)
-            dend_tree_coeff[i, 3] = -np.sum(dend_tree_coeff[i, 0:3] * positions[i, 0:3])
-        ps.create_additional("dcn_orientations", data=dend_tree_coeff)
+    def get_chunks(self, stage):
+        return self.scaffold.get_placement_set("dcn_cell").get_all_chunks()
+
+    def after_placement(self, chunk):
+        ps = self.scaffold.get_placement_set("dcn_cell", chunks=[chunk])
+        positions = ps.load_positions()
+        # Make the planar coefficients a, b and c.
+        dend_tree_coeff = np.random.rand(len(positions), 4) * 2.0 - 1.0
+        # Calculate the last planar coefficient d from ax + by + cz - d = 0
+        # => d = - (ax + by + cz)
+        dend_tree_coeff[:, 3] = -np.sum(dend_tree_coeff[:, :3] * positions, axis=1)
+        ps.append_additional("dcn_orientations", chunk, dend_tree_coeff)
 
 
 class SpoofDetails(PostProcessingHook):
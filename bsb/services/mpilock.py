@@ -2,6 +2,64 @@
 from ._util import MockModule
 import numpy as np
 
+_process_lock = None
+
+
+def set_process_lock(lock):
+    """
+    Set the lock that the mocked window controllers use to synchronize the processes of
+    a local process pool. ``None`` unsets it.
+    """
+    global _process_lock
+    _process_lock = lock
+
+
+class ProcessLock:
+    """
+    Readers-writer lock shared between the processes of a local process pool, without
+    MPI. Has to be created before the processes are started.
+    """
+
+    def __init__(self, context):
+        self._readers = context.Value("i", 0, lock=False)
+        self._cond = context.Condition()
+
+    def read(self):
+        return _ProcessReadLock(self)
+
+    def write(self):
+        return _ProcessWriteLock(self)
+
+
+class _ProcessReadLock:
+    def __init__(self, lock):
+        self._lock = lock
+
+    def __enter__(self):
+        with self._lock._cond:
+            self._lock._readers.value += 1
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        with self._lock._cond:
+            self._lock._readers.value -= 1
+            if not self._lock._readers.value:
+                self._lock._cond.notify_all()
+
+
+class _ProcessWriteLock:
+    def __init__(self, lock):
+        self._lock = lock
+
+    def __enter__(self):
+        # Hold on to the condition for the entire write, so that no new readers can
+        # enter, and wait for the current readers to leave.
+        self._lock._cond.acquire()
+        while self._lock._readers.value:
+            self._lock._cond.wait()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._lock._cond.release()
+
 
 class MockedWindowController:
     def __init__(self, comm=None, master=0):
@@ -38,9 +96,13 @@ class MockedWindowController:
         self.close()
 
     def read(self):
+        if _process_lock is not None:
+            return _process_lock.read()
         return _NoopLock()
 
     def write(self):
+        if _process_lock is not None:
+            return _process_lock.write()
         return _NoopLock()
 
     def single_write(self, handle=None, rank=None):
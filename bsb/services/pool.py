@@ -34,13 +34,31 @@ class name, ``_name`` for the job name and ``_c`` for the chunk. These are used
 to display what the workers are doing during parallel execution. This is an experimental
 API and subject to sudden change in the future.
 
+Jobs are run as soon as all of their dependencies have completed. The order in which ready
+jobs are handed out is determined by the ``scheduler`` option:
+
+* ``fifo``: Ready jobs are run in the order they were queued.
+* ``cost``: Ready jobs are run most expensive first, based on :meth:`.Job.estimate_cost`
+  and the runtimes recorded by the :class:`.JobCostModel` in previous runs. Only as many
+  jobs as there are workers are handed out at a time, so that idle workers always pick up
+  the most expensive remaining job.
+
+Under MPI the jobs are executed by an MPIPool. Without MPI, the ``processes`` option can be
+set to execute the jobs in a pool of forked local worker processes instead. The workers
+inherit the scaffold of the main process, and share a lock to access the storage.
+
 """
 
 from ._util import MockModule, ErrorModule
 from . import MPI
+from .mpilock import ProcessLock, set_process_lock
 import time
+import json
+import heapq
 import concurrent.futures
 import threading
+import multiprocessing
+import numpy as np
 
 
 class _MissingMPIPoolExecutor(ErrorModule):
@@ -63,14 +81,98 @@ def dispatcher(pool_id, job_args):
     # Get the static job execution handler from this module
     handler = globals()[job_type].execute
     owner = JobPool.get_owner(pool_id)
-    # Execute it.
+    # Execute it, and report back how long it took.
+    start = time.perf_counter()
     handler(owner, f, args, kwargs)
+    return time.perf_counter() - start
+
+
+def _get_fork_context():
+    try:
+        return multiprocessing.get_context("fork")
+    except ValueError:
+        raise RuntimeError(
+            "Local process pools require the 'fork' start method,"
+            + " use MPI on this platform instead."
+        ) from None
+
+
+def _init_worker(lock):
+    # Forked workers already own a copy of the scaffold registered to the pool, they
+    # only have to synchronize their storage access with the other processes.
+    set_process_lock(lock)
 
 
 class FakeFuture(concurrent.futures.Future):
     pass
 
 
+class JobCostModel:
+    """
+    Predicts the runtime of jobs. Runtimes of finished jobs are recorded per job, and per
+    kind of job (e.g. all the jobs of a placement strategy) the ratio of runtime to
+    estimated cost is tracked, so that the cost of jobs that haven't run before can be
+    predicted in seconds as well.
+    """
+
+    file_id = "bsb_job_costs"
+
+    def __init__(self, runtimes=None, rates=None):
+        self._runtimes = runtimes or {}
+        self._rates = rates or {}
+
+    @classmethod
+    def load(cls, file_store):
+        """
+        Load the cost model stored in a file store, or an empty cost model if none is
+        present.
+        """
+        stored = file_store.find_id(cls.file_id)
+        if stored is None:
+            return cls()
+        content, _ = stored.load()
+        data = json.loads(content)
+        return cls(data.get("runtimes"), data.get("rates"))
+
+    def store(self, file_store):
+        """
+        Store the cost model in a file store, so that later runs can reuse it.
+        """
+        content = json.dumps({"runtimes": self._runtimes, "rates": self._rates})
+        file_store.store(content, id=self.file_id, encoding="utf-8", overwrite=True)
+
+    def predict(self, job):
+        """
+        Predict the cost of a job. Returns the recorded runtime of the job if it ran
+        before, otherwise the estimated cost of the job scaled by the runtime per unit of
+        cost of its kind, or of all kinds if its kind hasn't run before.
+        """
+        key = job.get_cost_key()
+        if key in self._runtimes:
+            return self._runtimes[key]
+        job._estimate = cost = job.estimate_cost()
+        rate = self._rates.get(job.get_kind())
+        if rate is None and self._rates:
+            rate = np.sum(list(self._rates.values()), axis=0)
+        if rate is None or not rate[0]:
+            return cost
+        return cost * rate[1] / rate[0]
+
+    def record(self, job):
+        """
+        Record the runtime of a finished job.
+        """
+        if job._runtime is None:
+            return
+        key = job.get_cost_key()
+        if key is not None:
+            self._runtimes[key] = job._runtime
+        if job._estimate is not None:
+            rate = self._rates.setdefault(job.get_kind(), [0.0, 0.0])
+            rate[0] += float(job._estimate)
+            rate[1] += job._runtime
+
+
 class Job:
     """
     Dispatches the execution of a function through a JobPool
@@ -79,6 +181,7 @@ class Job:
     def __init__(self, pool, f, args, kwargs, deps=None):
         self.pool_id = pool.id
         self.f = f
+        self._pool = pool
         self._cname = None
         self._name = None
         self._c = None
@@ -86,6 +189,8 @@ class Job:
         self._kwargs = kwargs
         self._deps = set(deps or [])
         self._completion_cbs = []
+        self._estimate = None
+        self._runtime = None
         for j in self._deps:
             j.on_completion(self._dep_completed)
         self._future = FakeFuture()
@@ -105,43 +210,69 @@ class Job:
         """
         return f(job_owner, *args, **kwargs)
 
+    def estimate_cost(self):
+        """
+        Estimate the cost of this job, in arbitrary units that should scale with its
+        runtime. Jobs of the same kind should use the same units. The default
+        implementation considers all jobs equally costly.
+        """
+        return 1
+
+    def get_kind(self):
+        """
+        Return the key under which the runtimes of jobs of the same kind are grouped.
+        """
+        name = self._name
+        if name is None:
+            name = getattr(self.f, "__qualname__", type(self.f).__name__)
+        return f"{self.__class__.__name__}:{name}"
+
+    def get_cost_key(self):
+        """
+        Return the key under which the runtime of this job is recorded, or ``None`` if
+        the job can't be told apart from other jobs of its kind.
+        """
+        if self._c is None:
+            return None
+        return f"{self.get_kind()}:{self._c.id}"
+
     def on_completion(self, cb):
         self._completion_cbs.append(cb)
 
-    def _completion(self, _):
+    def _completion(self, future):
+        if future is not None and not future.cancelled() and not future.exception():
+            self._runtime = future.result()
         for cb in self._completion_cbs:
             cb(self)
+        # Notify the pool last, so that the jobs that depended on us are already ready
+        # when the pool hands out the next job.
+        self._pool._job_done(self)
 
     def _dep_completed(self, dep):
         # Earlier we registered this callback on the completion of our dependencies.
         # When a dep completes we end up here and we discard it as a dependency as it has
         # finished.
         self._deps.discard(dep)
-        # When all our dependencies have been discarded we can queue ourselves. Unless the
-        # pool is serial, then the pool itself just runs all jobs in order.
-        if not self._deps and MPI.get_size() > 1:
-            self._enqueue(self._pool)
-
-    def _enqueue(self, pool):
+        # When all our dependencies have been discarded we tell the pool we're ready.
         if not self._deps:
-            # Notify anyone waiting on the spaceholder `FakeFuture` that we're
-            # now actually queueing ourselves
-            self._future.set_result("ENQUEUED")
-            # Go ahead and submit ourselves to the pool, no dependencies to wait for
-            # The dispatcher is run on the remote worker and unpacks the data required
-            # to execute the job contents.
-            self._future = pool.submit(dispatcher, self.pool_id, self.serialize())
-            # Invoke our completion callbacks when the future completes.
-            self._future.add_done_callback(self._completion)
-        else:
-            # We have unfinished dependencies and should wait until we can enqueue
-            # ourselves when our dependencies haved all notified us of their completion.
-            self._pool = pool
+            self._pool._job_ready(self)
+
+    def _submit(self, executor):
+        # Go ahead and submit ourselves to the pool, the dispatcher is run on the remote
+        # worker and unpacks the data required to execute the job contents.
+        placeholder = self._future
+        self._future = executor.submit(dispatcher, self.pool_id, self.serialize())
+        # Only then notify anyone waiting on the spaceholder `FakeFuture` that we're
+        # queued, so that they wait on the submitted future when they check us again.
+        placeholder.set_result("ENQUEUED")
+        # Invoke our completion callbacks when the future completes.
+        self._future.add_done_callback(self._completion)
 
 
 class ChunkedJob(Job):
     def __init__(self, pool, f, chunk, deps=None):
         super().__init__(pool, f, (chunk,), {}, deps=deps)
+        self._c = chunk
 
 
 class PlacementJob(ChunkedJob):
@@ -163,6 +294,61 @@ class PlacementJob(ChunkedJob):
         indicators = placement.get_indicators()
         return f(placement, *args[1:], indicators, **kwargs)
 
+    def estimate_cost(self):
+        """
+        Estimate the cost as the number of cells the indicators expect in the chunk.
+        """
+        placement = self._pool.owner.placement[self._name]
+        try:
+            return sum(
+                np.sum(indicator.guess(self._c))
+                for indicator in placement.get_indicators().values()
+            )
+        except Exception:
+            # Not every strategy can guess its cell count up front (e.g. voxel
+            # densities, or fixed positions), assume an average job.
+            return super().estimate_cost()
+
+
+class PlacementBatchJob(ChunkedJob):
+    """
+    Dispatches the execution of a batch of chunks of a placement strategy through a
+    JobPool. The chunks are placed one after the other by the same worker, sharing the
+    indicators.
+    """
+
+    def __init__(self, pool, strategy, chunks, deps=None):
+        args = (strategy.name, chunks)
+        Job.__init__(self, pool, strategy.place.__func__, args, {}, deps=deps)
+        self._cname = strategy.__class__.__name__
+        self._name = strategy.name
+        self._c = chunks[0]
+
+    @staticmethod
+    def execute(job_owner, f, args, kwargs):
+        name, chunks = args
+        placement = job_owner.placement[name]
+        indicators = placement.get_indicators()
+        for chunk in chunks:
+            f(placement, chunk, indicators, **kwargs)
+
+    def get_cost_key(self):
+        return f"{self.get_kind()}:{_chunk_ids(self._args[1])}"
+
+    def estimate_cost(self):
+        """
+        Estimate the cost as the number of cells the indicators expect in the chunks.
+        """
+        placement = self._pool.owner.placement[self._name]
+        try:
+            return sum(
+                np.sum(indicator.guess(chunk))
+                for indicator in placement.get_indicators().values()
+                for chunk in self._args[1]
+            )
+        except Exception:
+            return len(self._args[1])
+
 
 class ConnectivityJob(ChunkedJob):
     """
@@ -174,6 +360,8 @@ class ConnectivityJob(ChunkedJob):
         Job.__init__(self, pool, strategy.connect.__func__, args, {}, deps=deps)
         self._cname = strategy.__class__.__name__
         self._name = strategy.name
+        if len(pre_roi):
+            self._c = pre_roi[0]
 
     @staticmethod
     def execute(job_owner, f, args, kwargs):
@@ -182,15 +370,106 @@ class ConnectivityJob(ChunkedJob):
         collections = connectivity._get_connect_args_from_job(*args[1:])
         return f(connectivity, *collections, **kwargs)
 
+    def estimate_cost(self):
+        """
+        Estimate the cost as the number of cell pairs between the pre and post regions of
+        interest, based on the placement chunk statistics.
+        """
+        connectivity = self._pool.owner.connectivity[self._name]
+        _, pre_roi, post_roi = self._args
+        pre = self._pool._count_cells(connectivity.presynaptic.cell_types, pre_roi)
+        post = self._pool._count_cells(connectivity.postsynaptic.cell_types, post_roi)
+        return pre * post
+
+    def get_cost_key(self):
+        return f"{self.get_kind()}:{_chunk_ids(self._args[1])}"
+
+
+class ConnectivityBatchJob(ChunkedJob):
+    """
+    Dispatches the execution of a batch of chunks of a connectivity strategy through a
+    JobPool. Each presynaptic chunk is connected to its own region of interest, one after
+    the other by the same worker.
+    """
+
+    def __init__(self, pool, strategy, chunks, rois, deps=None):
+        args = (strategy.name, chunks, rois)
+        Job.__init__(self, pool, strategy.connect.__func__, args, {}, deps=deps)
+        self._cname = strategy.__class__.__name__
+        self._name = strategy.name
+        self._c = chunks[0]
+
+    @staticmethod
+    def execute(job_owner, f, args, kwargs):
+        name, chunks, rois = args
+        connectivity = job_owner.connectivity[name]
+        for chunk, roi in zip(chunks, rois):
+            collections = connectivity._get_connect_args_from_job([chunk], roi)
+            f(connectivity, *collections, **kwargs)
+
+    def estimate_cost(self):
+        """
+        Estimate the cost as the number of cell pairs between each presynaptic chunk and
+        its region of interest, based on the placement chunk statistics.
+        """
+        connectivity = self._pool.owner.connectivity[self._name]
+        _, chunks, rois = self._args
+        pre_types = connectivity.presynaptic.cell_types
+        post_types = connectivity.postsynaptic.cell_types
+        return sum(
+            self._pool._count_cells(pre_types, [chunk])
+            * self._pool._count_cells(post_types, roi)
+            for chunk, roi in zip(chunks, rois)
+        )
+
+    def get_cost_key(self):
+        return f"{self.get_kind()}:{_chunk_ids(self._args[1])}"
+
+
+class PostProcessingJob(ChunkedJob):
+    """
+    Dispatches the execution of a post processing hook through a JobPool, for the whole
+    network, or for a single chunk of a hook that processes chunk by chunk.
+    """
+
+    def __init__(self, pool, hook, stage, chunk=None, deps=None):
+        args = (stage, hook.name, chunk)
+        Job.__init__(self, pool, getattr(hook, stage).__func__, args, {}, deps=deps)
+        self._cname = hook.__class__.__name__
+        self._name = hook.name
+        self._c = chunk
+
+    @staticmethod
+    def execute(job_owner, f, args, kwargs):
+        stage, name, chunk = args
+        hook = getattr(job_owner, stage)[name]
+        if chunk is None:
+            return f(hook, **kwargs)
+        return f(hook, chunk, **kwargs)
+
+
+def _chunk_ids(chunks):
+    return ",".join(str(chunk.id) for chunk in chunks)
+
 
 class JobPool:
     _next_pool_id = 0
     _pool_owners = {}
 
-    def __init__(self, scaffold, listeners=None):
+    def __init__(self, scaffold, listeners=None, scheduler=None, processes=None):
         self._queue = []
         self.id = JobPool._next_pool_id
         self._listeners = listeners or []
+        self._scheduler = scheduler
+        self._processes = processes
+        self._executor = None
+        self._lock = threading.RLock()
+        self._ready = []
+        self._order = {}
+        self._running = 0
+        self._max_running = None
+        self._cost_model = None
+        self._chunk_stats = {}
         JobPool._next_pool_id += 1
         JobPool._pool_owners[self.id] = scaffold
 
@@ -198,6 +477,30 @@ class JobPool:
     def parallel(self):
         return MPI.get_size() > 1
 
+    @property
+    def processes(self):
+        """
+        Number of local worker processes to use when not running under MPI. Defaults to
+        the ``processes`` option.
+        """
+        if self._processes is None:
+            import bsb.options
+
+            return bsb.options.processes
+        return self._processes
+
+    @property
+    def scheduler(self):
+        """
+        Scheduling mode of the pool, either ``"fifo"`` or ``"cost"``. Defaults to the
+        ``scheduler`` option.
+        """
+        if self._scheduler is None:
+            import bsb.options
+
+            return bsb.options.scheduler
+        return self._scheduler
+
     @classmethod
     def get_owner(cls, id):
         return cls._pool_owners[id]
@@ -236,18 +539,35 @@ class JobPool:
         self._put(job)
         return job
 
+    def queue_placement_batch(self, strategy, chunks, deps=None):
+        job = PlacementBatchJob(self, strategy, chunks, deps)
+        self._put(job)
+        return job
+
     def queue_connectivity(self, strategy, pre_roi, post_roi, deps=None):
         job = ConnectivityJob(self, strategy, pre_roi, post_roi, deps)
         self._put(job)
         return job
 
+    def queue_connectivity_batch(self, strategy, chunks, rois, deps=None):
+        job = ConnectivityBatchJob(self, strategy, chunks, rois, deps)
+        self._put(job)
+        return job
+
+    def queue_postprocessing(self, hook, stage, chunk=None, deps=None):
+        job = PostProcessingJob(self, hook, stage, chunk, deps)
+        self._put(job)
+        return job
+
     def execute(self, master_event_loop=None):
         """
         Execute the jobs in the queue
 
-        In serial execution this runs all of the jobs in the queue in First In First Out
-        order. In parallel execution this enqueues all jobs into the MPIPool unless they
-        have dependencies that need to complete first.
+        In serial execution this runs all of the jobs in the queue, in the order
+        determined by the scheduler, as soon as their dependencies have run. In parallel
+        execution this hands out the jobs to the workers of the MPIPool, or of a local
+        process pool if the ``processes`` option is set, also in scheduler order and as
+        soon as their dependencies have completed.
 
         :param master_event_loop: A function that is continuously called while waiting for
           the jobs to finish in parallel execution
@@ -262,34 +582,120 @@ class JobPool:
                 # the shutdown signal from the master, they return here skipping the
                 # master logic.
                 return
-            # Tell each job in our queue that they have to put themselves in the pool
-            # queue; each job will store their own future and will use the futures of
-            # their previously enqueued dependencies to determine when they can put
-            # themselves on the pool queue.
-            for job in self._queue:
-                job._enqueue(pool)
-
-            q = self._queue.copy()
-            # As long as any of the jobs aren't done yet we repeat the master_event_loop
-            while open_jobs := [j._future for j in self._queue if not j._future.done()]:
-                if master_event_loop:
-                    # If there is an event loop, run it and hand it a copy of the jobqueue
-                    master_event_loop(q)
-                else:
-                    # If there is no event loop just let the master idle until execution
-                    # has completed.
-                    concurrent.futures.wait(open_jobs)
-            pool.shutdown()
+            self._execute_async(pool, MPI.get_size() - 1, master_event_loop)
+        elif self.processes > 1:
+            context = _get_fork_context()
+            lock = ProcessLock(context)
+            # Workers are forked, so they inherit the scaffold that owns the jobs.
+            pool = concurrent.futures.ProcessPoolExecutor(
+                self.processes,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(lock,),
+            )
+            # The main process also has to respect the storage locks of the workers.
+            set_process_lock(lock)
+            try:
+                self._execute_async(pool, self.processes, master_event_loop)
+            finally:
+                set_process_lock(None)
         else:
-            # Just run each job serially
-            for job in self._queue:
+            self._start()
+            q = self._queue
+            # Run each job serially, in scheduler order
+            while self._ready:
+                job = heapq.heappop(self._ready)[-1]
                 # Execute the static handler
+                start = time.perf_counter()
                 job.execute(self.owner, job.f, job._args, job._kwargs)
+                job._runtime = time.perf_counter() - start
                 # Trigger job completion manually as there is no async future object
                 # like in parallel execution.
                 job._completion(None)
             # Clear the queue after all jobs have been done
             self._queue = []
+            self._store_costs(q)
+
+    def _execute_async(self, pool, workers, master_event_loop):
+        self._executor = pool
+        if self.scheduler == "cost":
+            # Hold back the jobs that no worker can pick up yet, so that the master can
+            # still hand out more expensive jobs that become ready in the meantime
+            self._max_running = workers
+        # Hand out all jobs without dependencies to the workers. Each job will notify the
+        # pool when its dependencies have completed, and it can be handed out too.
+        self._start()
+
+        q = self._queue.copy()
+        # As long as any of the jobs aren't done yet we repeat the master_event_loop
+        while open_jobs := [j._future for j in self._queue if not j._future.done()]:
+            if master_event_loop:
+                # If there is an event loop, run it and hand it a copy of the jobqueue
+                master_event_loop(q)
+            else:
+                # If there is no event loop just let the master idle until execution
+                # has completed.
+                concurrent.futures.wait(open_jobs)
+        pool.shutdown()
+        self._executor = None
+        self._store_costs(q)
+
+    def _start(self):
+        self._order = {job: i for i, job in enumerate(self._queue)}
+        if self.scheduler == "cost":
+            self._cost_model = JobCostModel.load(self.owner.files)
+        for job in self._queue:
+            # Dependencies outside of this pool can't be waited for.
+            job._deps.intersection_update(self._order)
+            if not job._deps:
+                self._job_ready(job, dispatch=False)
+        # Only hand out jobs once all of the initially ready jobs are known, so that the
+        # most expensive ones go first.
+        self._dispatch()
+
+    def _job_ready(self, job, dispatch=True):
+        if self._cost_model is not None:
+            priority = -self._cost_model.predict(job)
+        else:
+            priority = 0
+        with self._lock:
+            heapq.heappush(self._ready, (priority, self._order[job], job))
+        if dispatch:
+            self._dispatch()
+
+    def _job_done(self, job):
+        if self._executor is not None:
+            with self._lock:
+                self._running -= 1
+            self._dispatch()
+
+    def _dispatch(self):
+        if self._executor is None:
+            return
+        with self._lock:
+            while self._ready and (
+                self._max_running is None or self._running < self._max_running
+            ):
+                job = heapq.heappop(self._ready)[-1]
+                self._running += 1
+                job._submit(self._executor)
+
+    def _store_costs(self, jobs):
+        if self._cost_model is None:
+            return
+        for job in jobs:
+            self._cost_model.record(job)
+        self._cost_model.store(self.owner.files)
+        self._cost_model = None
+
+    def _count_cells(self, cell_types, chunks):
+        count = 0
+        for ct in cell_types:
+            if ct not in self._chunk_stats:
+                self._chunk_stats[ct] = ct.get_placement_set().get_chunk_stats()
+            stats = self._chunk_stats[ct]
+            count += sum(stats.get(str(chunk.id), 0) for chunk in chunks)
+        return count
 
 
 def create_job_pool(scaffold):
@@ -1,5 +1,8 @@
 from ..reporting import warn
+from ..services import MPI
+import numpy as np
 import traceback
+import os
 
 
 class SimulationResult:
@@ -13,6 +16,9 @@ class SimulationResult:
             pass
         self.block = Block(name=simulation.name, config=tree)
         self.recorders = []
+        self.path = None
+        self.writer = None
+        self.tail = None
 
     def add(self, recorder):
         self.recorders.append(recorder)
@@ -23,24 +29,261 @@ class SimulationResult:
         self.add(recorder)
         return recorder
 
+    @property
+    def draining(self):
+        """
+        Whether the recorders are drained into a result file at each flush.
+        """
+        return self.writer is not None
+
+    def stream(self, path, tail=0, attrs=None):
+        """
+        Drain the data of each flush into a result file, so that the recorders only hold
+        the data recorded since the last flush.
+
+        :param path: Path of the result file.
+        :type path: str
+        :param tail: Number of flushed segments to keep in memory. Older segments are
+          dropped from :attr:`block` once written. Defaults to 0, set it to ``None`` to
+          keep all segments, which does not bound the memory use of the simulation.
+        :type tail: int
+        :param attrs: Attributes of the result file.
+        :type attrs: dict
+        """
+        self.path = path
+        self.writer = ResultWriter(path, attrs=attrs)
+        self.tail = tail
+
     def flush(self):
         from neo import Segment
 
         segment = Segment()
         self.block.segments.append(segment)
-        for recorder in self.recorders:
+        # Track which recorder flushed each signal, so that it is drained into the
+        # datasets of that recorder, even if other recorders error out.
+        owners = {kind: [] for kind in _signal_kinds}
+        for i, recorder in enumerate(self.recorders):
+            counts = {kind: len(getattr(segment, kind)) for kind in _signal_kinds}
             try:
                 recorder.flush(segment)
             except Exception as e:
                 traceback.print_exc()
                 warn("Recorder errored out!")
+            for kind in _signal_kinds:
+                owners[kind].extend([i] * (len(getattr(segment, kind)) - counts[kind]))
+        if self.draining:
+            self._drain(segment, owners)
+            if self.tail is not None:
+                del self.block.segments[: max(len(self.block.segments) - self.tail, 0)]
+
+    def close(self):
+        """
+        Close the result file that is being streamed to, if any.
+        """
+        if self.draining:
+            self.writer.close()
+            self.writer = None
+
+    def _drain(self, segment, owners):
+        # The signals of each recorder are appended to datasets named after the index of
+        # the recorder, and the index of the signal among those of the recorder after the
+        # first. Ranks record different cells, so each rank appends to its own group.
+        rank = MPI.get_rank()
+        for kind in _signal_kinds:
+            seen = {}
+            for owner, signal in zip(owners[kind], getattr(segment, kind)):
+                j = seen[owner] = seen.get(owner, -1) + 1
+                path = f"rank_{rank}/{kind}/{owner}" + (f"_{j}" if j else "")
+                try:
+                    self.writer.append(path, signal.magnitude, _signal_meta(signal))
+                except Exception:
+                    warn(
+                        f"Signal {path} could not be written."
+                        + f"\n\n{traceback.format_exc()}"
+                    )
+        self.writer.flush()
 
     def write(self, filename, mode):
         from neo import io
 
         io.NixIO(filename, mode=mode).write(self.block)
 
+    def safe_collect(self):
+        """
+        Collect the path, data and metadata of each recorder that implements
+        :meth:`~.SimulationRecorder.get_data`, skipping recorders that error out.
+        """
+        for recorder in self.recorders:
+            if not hasattr(recorder, "get_data"):
+                continue
+            try:
+                yield recorder.get_path(), recorder.get_data(), recorder.get_meta()
+            except Exception:
+                traceback.print_exc()
+                warn(f"Recorder {recorder} errored out!")
+
+
+_signal_kinds = ("analogsignals", "spiketrains")
+
 
 class SimulationRecorder:
     def flush(self):
         raise NotImplementedError("Recorders need to implement the `flush` function.")
+
+
+class ResultWriter:
+    """
+    Writes recorded data into an HDF5 result file. Each dataset is chunked and resizable
+    along its first axis, so that data can be appended at every flush without rewriting
+    what was written before. Under MPI, each rank appends to its own shard file, and the
+    shards are merged into the result file when the writer is closed.
+
+    .. code-block:: python
+
+      with ResultWriter("results.hdf5") as writer:
+          for i in range(flushes):
+              writer.write(result)
+    """
+
+    def __init__(self, path, attrs=None, block_rows=2**16):
+        """
+        :param path: Path of the result file.
+        :type path: str
+        :param attrs: Attributes of the result file.
+        :type attrs: dict
+        :param block_rows: Number of rows per chunk of the datasets, also the number of
+          rows that are copied at once when the shards are merged.
+        :type block_rows: int
+        """
+        import h5py
+
+        self.path = path
+        self.attrs = attrs or {}
+        self.block_rows = block_rows
+        self._sharded = MPI.get_size() > 1
+        self.shard_path = _shard_path(path, MPI.get_rank()) if self._sharded else path
+        self._file = h5py.File(self.shard_path, "a")
+        self._file.attrs.update(self.attrs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, path, data, meta=None):
+        """
+        Append data to a dataset, creating it if it doesn't exist yet.
+
+        :param path: Path of the dataset in the result file.
+        :type path: str
+        :param data: Data to append along the first axis.
+        :type data: numpy.ndarray
+        :param meta: Attributes to update on the dataset.
+        :type meta: dict
+        """
+        data = np.atleast_1d(np.asarray(data))
+        _append(self._file, path, data, meta or {}, self.block_rows)
+
+    def write(self, result):
+        """
+        Append the data of all recorders of a simulation result.
+
+        :param result: Simulation result with recorders to collect.
+        :type result: ~bsb.simulation.results.SimulationResult
+        """
+        for path, data, meta in result.safe_collect():
+            if not isinstance(path, str):
+                path = "/".join(f"{p}" for p in path)
+            if not isinstance(data, np.ndarray):
+                warn(f"Recorder `{path}` expected numpy.ndarray data, got {type(data)}")
+                continue
+            try:
+                self.append(path, data, meta)
+            except Exception:
+                warn(
+                    f"Recorder {path} processing errored out."
+                    + f" - Data: {data.dtype} {data.shape}"
+                    + f"\n\n{traceback.format_exc()}"
+                )
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        """
+        Close the writer. Under MPI, this is a collective call, after which rank 0 has
+        merged the shards of all ranks into the result file.
+        """
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        if self._sharded:
+            MPI.barrier()
+            if not MPI.get_rank():
+                shards = [_shard_path(self.path, r) for r in range(MPI.get_size())]
+                _merge_shards(self.path, shards, self.attrs, self.block_rows)
+            MPI.barrier()
+
+
+def _signal_meta(signal):
+    meta = {"units": signal.dimensionality.string}
+    if signal.name is not None:
+        meta["name"] = signal.name
+    if hasattr(signal, "sampling_period"):
+        meta["sampling_period"] = float(signal.sampling_period.rescale("ms"))
+    for k, v in signal.annotations.items():
+        if isinstance(v, (str, bool, int, float, np.number)):
+            meta[k] = v
+    return meta
+
+
+def _shard_path(path, rank):
+    return f"{path}.rank{rank}"
+
+
+def _append(f, path, data, meta, block_rows):
+    if path in f:
+        dataset = f[path]
+        if dataset.shape[1:] != data.shape[1:]:
+            raise ValueError(
+                f"Can't append data of shape {data.shape} to {path} {dataset.shape}."
+            )
+        start = len(dataset)
+        dataset.resize(start + len(data), axis=0)
+        dataset[start:] = data
+    else:
+        dataset = f.create_dataset(
+            path,
+            data=data,
+            chunks=tuple(
+                max(1, d) for d in (min(block_rows, len(data)), *data.shape[1:])
+            ),
+            maxshape=(None, *data.shape[1:]),
+        )
+    dataset.attrs.update(meta)
+
+
+def _merge_shards(path, shards, attrs, block_rows):
+    # Append the datasets of each shard, in rank order, into the result file, a block of
+    # rows at a time, so that a shard never has to be loaded into memory at once.
+    import h5py
+
+    with h5py.File(path, "a") as f:
+        f.attrs.update(attrs)
+        for shard in shards:
+            with h5py.File(shard, "r") as s:
+                datasets = []
+                s.visititems(
+                    lambda name, obj: datasets.append(name)
+                    if isinstance(obj, h5py.Dataset)
+                    else None
+                )
+                for name in datasets:
+                    source = s[name]
+                    meta = dict(source.attrs)
+                    for start in range(0, max(len(source), 1), block_rows):
+                        block = source[start : start + block_rows]
+                        _append(f, name, block, meta, block_rows)
+            os.remove(shard)
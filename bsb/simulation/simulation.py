@@ -33,6 +33,16 @@ class Simulation:
     connection_models = config.slot(type=ConnectionModel, required=True)
     devices = config.slot(type=DeviceModel, required=True)
     post_prepare = config.list(type=cfgtypes.class_())
+    flush_interval = config.attr(type=cfgtypes.float(min=0))
+    """
+    Interval of simulated time, in ms, after which the recorders are drained into the
+    result file. By default, the recorders are only flushed at the end of the simulation.
+    """
+    tail = config.attr(type=cfgtypes.int(min=0), default=0)
+    """
+    Number of flushed segments to keep in memory when draining the recorders. Older
+    segments are only kept in the result file.
+    """
 
     @staticmethod
     def __plugins__():
@@ -2,7 +2,7 @@ from bsb.config import types
 from bsb.reporting import report, warn
 from bsb.exceptions import AdapterError
 from bsb.services import MPI
-from bsb.simulation.results import SimulationResult
+from bsb.simulation.results import SimulationResult, ResultWriter
 from bsb.simulation.adapter import SimulatorAdapter
 import numpy as np
 import itertools as it
@@ -262,53 +262,25 @@ class ArborAdapter(SimulatorAdapter):
             report(arbor.profiler_summary(), level=1)
 
     def collect_output(self, simulation):
-        import h5py, time, random, traceback
+        import time, random
 
         timestamp = str(time.time()).split(".")[0] + str(random.random()).split(".")[1]
         timestamp = self.broadcast(timestamp)
         result_path = "results_" + self.name + "_" + timestamp + ".hdf5"
-        rank = self.get_rank()
-        for node in range(self.get_size()):
-            self.barrier()
-            if node == rank:
-                report("Node", rank, "is writing", level=2, all_nodes=True)
-                with h5py.File(result_path, "a") as f:
-                    if rank == 0:
-                        spikes = simulation.spikes()
-                        spikes = np.column_stack(
-                            (
-                                np.fromiter((l[0][0] for l in spikes), dtype=int),
-                                np.fromiter((l[1] for l in spikes), dtype=int),
-                            )
-                        )
-                        f.create_dataset("all_spikes_dump", data=spikes)
-                    f.attrs["configuration_string"] = self.scaffold.configuration._raw
-                    for path, data, meta in self.result.safe_collect():
-                        try:
-                            path = "/".join(f"{p}" for p in path)
-                            if path in f:
-                                # Path exists, append by recreating concatenated data
-                                data = np.concatenate((f[path][()], data))
-                                _meta = d.attrs[k].copy()
-                                _meta.update(meta)
-                                meta = _meta
-                                del f[path]
-                            d = f.create_dataset(path, data=data)
-                            for k, v in meta.items():
-                                d.attrs[k] = v
-                        except Exception as e:
-                            if not isinstance(data, np.ndarray):
-                                warn(
-                                    f"Recorder `{path}` expected numpy.ndarray data,"
-                                    + f" got {type(data)}"
-                                )
-                            else:
-                                warn(
-                                    f"Recorder {path} processing errored out."
-                                    + f" - Data: {data.dtype} {data.shape}"
-                                    + f"\n\n{traceback.format_exc()}"
-                                )
-            self.barrier()
+        attrs = {"configuration_string": self.scaffold.configuration._raw}
+        # Each rank appends its own recorders to its shard of the result file, the shards
+        # are merged when the writer is closed.
+        with ResultWriter(result_path, attrs=attrs) as writer:
+            if self.get_rank() == 0:
+                spikes = simulation.spikes()
+                spikes = np.column_stack(
+                    (
+                        np.fromiter((l[0][0] for l in spikes), dtype=int),
+                        np.fromiter((l[1] for l in spikes), dtype=int),
+                    )
+                )
+                writer.append("all_spikes_dump", spikes)
+            writer.write(self.result)
         return result_path
 
     def get_recipe(self):
@@ -1,5 +1,5 @@
 from bsb.simulation.adapter import SimulatorAdapter
-from bsb.simulation.results import SimulationRecorder, SimulationResult
+from bsb.simulation.results import SimulationRecorder, SimulationResult, ResultWriter
 from bsb.services import MPI
 from bsb.reporting import report, warn
 from bsb.exceptions import (
@@ -16,13 +16,13 @@ from bsb.exceptions import (
     SimulationWarning,
 )
 from .connection import NestConnection
+from .cell import IdentifierMap
 import os
 import json
 import numpy as np
 from itertools import chain
 from copy import deepcopy
 import warnings
-import h5py
 import time
 
 
@@ -161,7 +161,7 @@ class NestAdapter(SimulatorAdapter):
         self.is_prepared = False
         if hasattr(self, "nest"):
             self.reset_kernel()
-        self.global_identifier_map = {}
+        self.identifier_map = IdentifierMap()
         for cell_model in self.cell_models.values():
             cell_model.reset()
         if self.has_lock:
@@ -250,36 +250,12 @@ class NestAdapter(SimulatorAdapter):
         rank = MPI.get_rank()
 
         timestamp = str(time.time()).split(".")[0] + str(_randint())
-        result_path = "results_" + self.name + "_" + timestamp + ".hdf5"
-        if rank == 0:
-            with h5py.File(result_path, "a") as f:
-                f.attrs["configuration_string"] = self.scaffold.configuration._raw
-                for path, data, meta in self.result.safe_collect():
-                    try:
-                        path = "/".join(path)
-                        if path in f:
-                            data = np.vstack((f[path][()], data))
-                            del f[path]
-                        d = f.create_dataset(path, data=data)
-                        for k, v in meta.items():
-                            d.attrs[k] = v
-                    except Exception as e:
-                        import traceback
-
-                        traceback.print_exc()
-                        if not isinstance(data, np.ndarray):
-                            warn(
-                                "Recorder {} numpy.ndarray expected, got {}".format(
-                                    path, type(data)
-                                )
-                            )
-                        else:
-                            warn(
-                                "Recorder {} processing errored out: {}".format(
-                                    path, "{} {}".format(data.dtype, data.shape)
-                                )
-                            )
-        MPI.bcast(result_path, root=0)
+        result_path = MPI.bcast("results_" + self.name + "_" + timestamp + ".hdf5")
+        attrs = {"configuration_string": self.scaffold.configuration._raw}
+        with ResultWriter(result_path, attrs=attrs) as writer:
+            # The recorders read the output files of all ranks, so only rank 0 collects.
+            if rank == 0:
+                writer.write(self.result)
         report(
             f"Output collected in '{result_path}'. "
             + f"{time.time() - tick:.2f}s elapsed.",
@@ -356,18 +332,19 @@ class NestAdapter(SimulatorAdapter):
         # Iterate over all simulation components that contain representations
         # of scaffold components with an ID to create a map of all scaffold ID's
         # to all NEST ID's this adapter manages
+        maps = []
         for mapping_type in chain(self.entities.values(), self.cell_models.values()):
             # "Freeze" the type's identifiers into a map
             mapping_type._build_identifier_map()
-            # Add the type's map to the global map
-            self.global_identifier_map.update(mapping_type.scaffold_to_nest_map)
+            maps.append(mapping_type.identifier_map)
+        # Combine the maps of all types into the global map
+        self.identifier_map = IdentifierMap.concatenate(*maps)
 
     def get_nest_ids(self, ids):
-        return [self.global_identifier_map[id] for id in ids]
+        return self.identifier_map.to_nest(ids)
 
     def get_scaffold_ids(self, ids):
-        scaffold_map = {v: k for k, v in self.global_identifier_map.items()}
-        return [scaffold_map[id] for id in ids]
+        return self.identifier_map.to_scaffold(ids)
 
     def create_neurons(self):
         """
@@ -440,17 +417,13 @@ class NestAdapter(SimulatorAdapter):
                 continue
             # Get the NEST identifiers for the connections made in the connectivity matrix
             try:
-                presynaptic_sources = np.array(
-                    self.get_nest_ids(np.array(cs.from_identifiers, dtype=int))
-                )
+                presynaptic_sources = self.get_nest_ids(cs.from_identifiers)
             except KeyError as e:
                 raise UnknownGIDError(
                     f"Unknown GID {e.args[0]} in presynaptic `{name}` data."
                 ) from None
             try:
-                postsynaptic_targets = np.array(
-                    self.get_nest_ids(np.array(cs.to_identifiers, dtype=int))
-                )
+                postsynaptic_targets = self.get_nest_ids(cs.to_identifiers)
             except KeyError as e:
                 raise UnknownGIDError(
                     f"Unknown GID {e.args[0]} in postsynaptic `{name}` data."
@@ -723,8 +696,8 @@ class SpikeRecorder(SimulationRecorder):
                 file_spikes = np.loadtxt(file)
                 # if len(file_spikes):
                 if len(file_spikes.shape) > 1:
-                    scaffold_ids = np.array(
-                        self.device_model.simulation.get_scaffold_ids(file_spikes[:, 0])
+                    scaffold_ids = self.device_model.simulation.get_scaffold_ids(
+                        file_spikes[:, 0].astype(int)
                     )
                     self.cell_types = list(
                         set(
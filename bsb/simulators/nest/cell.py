@@ -1,3 +1,4 @@
+import numpy as np
 from bsb import config
 from bsb.config import types
 from bsb.simulation.cell import CellModel
@@ -18,19 +19,114 @@ def _unmerge_params(node, key):
     return {k: v for k, v in node.model_parameters[key].items() if k not in to_remove}
 
 
+class IdentifierMap:
+    """
+    Map between scaffold and NEST identifiers. The map is stored as runs of consecutive
+    identifiers that map to consecutive identifiers, so that a population created in one
+    go is stored as a single offset, and lookups in either direction are a binary search
+    over the runs.
+    """
+
+    def __init__(self, scaffold_ids=(), nest_ids=()):
+        scaffold_ids = np.asarray(scaffold_ids, dtype=np.int64).reshape(-1)
+        nest_ids = np.asarray(nest_ids, dtype=np.int64).reshape(-1)
+        if len(scaffold_ids) != len(nest_ids):
+            raise ValueError("Scaffold and NEST identifiers must be of same length.")
+        self._to_nest = _runs(scaffold_ids, nest_ids)
+        self._to_scaffold = _runs(nest_ids, scaffold_ids)
+        self._len = len(scaffold_ids)
+
+    def __len__(self):
+        return self._len
+
+    @classmethod
+    def concatenate(cls, *maps):
+        """
+        Combine the maps of several populations into a single map. Identifiers that occur
+        in several maps are mapped as in the last of those maps.
+        """
+        id_map = cls()
+        if not maps:
+            return id_map
+        id_map._to_nest = _merge_runs([m._to_nest for m in maps])
+        id_map._to_scaffold = _merge_runs([m._to_scaffold for m in maps])
+        id_map._len = int(np.sum(id_map._to_nest[1] - id_map._to_nest[0]))
+        return id_map
+
+    def to_nest(self, ids):
+        """
+        Map scaffold identifiers to NEST identifiers.
+
+        :raises: KeyError with the first unknown identifier.
+        """
+        return _lookup_runs(self._to_nest, ids)
+
+    def to_scaffold(self, ids):
+        """
+        Map NEST identifiers to scaffold identifiers.
+
+        :raises: KeyError with the first unknown identifier.
+        """
+        return _lookup_runs(self._to_scaffold, ids)
+
+
+def _runs(keys, values):
+    # Sort the pairs by key, and split them into runs where both the keys and values
+    # increase by 1, stored as the start key, stop key and start value of each run.
+    order = np.argsort(keys, kind="stable")
+    keys, values = keys[order], values[order]
+    breaks = np.nonzero((np.diff(keys) != 1) | (np.diff(values) != 1))[0] + 1
+    starts = np.concatenate(([0], breaks)) if len(keys) else np.empty(0, dtype=int)
+    stops = np.append(breaks, len(keys)) if len(keys) else np.empty(0, dtype=int)
+    return keys[starts], keys[stops - 1] + 1, values[starts]
+
+
+def _sorted_runs(starts, stops, values):
+    order = np.argsort(starts, kind="stable")
+    return starts[order], stops[order], values[order]
+
+
+def _merge_runs(runs):
+    starts, stops, values = _sorted_runs(*(np.concatenate(r) for r in zip(*runs)))
+    if np.all(stops[:-1] <= starts[1:]):
+        return starts, stops, values
+    # Some runs overlap: expand them, and keep the value of the last map for each key.
+    keys, values = (np.concatenate(a) for a in zip(*map(_expand_runs, reversed(runs))))
+    keys, first = np.unique(keys, return_index=True)
+    return _runs(keys, values[first])
+
+
+def _expand_runs(runs):
+    starts, stops, values = runs
+    lens = stops - starts
+    steps = np.arange(np.sum(lens)) - np.repeat(np.cumsum(lens) - lens, lens)
+    return np.repeat(starts, lens) + steps, np.repeat(values, lens) + steps
+
+
+def _lookup_runs(runs, ids):
+    starts, stops, values = runs
+    ids = np.asarray(ids).astype(np.int64, copy=False).reshape(-1)
+    run = np.searchsorted(starts, ids, side="right") - 1
+    safe = np.maximum(run, 0)
+    known = (run >= 0) & (ids < stops[safe]) if len(starts) else run >= 0
+    if not np.all(known):
+        raise KeyError(int(ids[~known][0]))
+    return ids - starts[run] + values[run]
+
+
 class MapsScaffoldIdentifiers:
     def reset_identifiers(self):
         self.nest_identifiers = []
         self.scaffold_identifiers = []
-        self.scaffold_to_nest_map = {}
+        self.identifier_map = IdentifierMap()
 
     def _build_identifier_map(self):
-        self.scaffold_to_nest_map = dict(
-            zip(self.scaffold_identifiers, self.nest_identifiers)
+        self.identifier_map = IdentifierMap(
+            self.scaffold_identifiers, self.nest_identifiers
         )
 
     def get_nest_ids(self, ids):
-        return [self.scaffold_to_nest_map[id] for id in ids]
+        return self.identifier_map.to_nest(ids)
 
 
 @config.node
@@ -40,4 +40,4 @@ class NestDevice(DeviceModel):
         Return the targets of the stimulation to pass into the nest.Connect call.
         """
         targets = np.array(self.get_targets(), dtype=int)
-        return self.adapter.get_nest_ids(targets)
+        return self.adapter.get_nest_ids(targets).tolist()
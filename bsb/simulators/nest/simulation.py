@@ -1,7 +1,7 @@
 from bsb import config
 from bsb.config import types
 from bsb.simulation.simulation import Simulation
-from .cell import NestCell
+from .cell import NestCell, IdentifierMap
 from .connection import NestConnection
 from .device import NestDevice
 
@@ -28,4 +28,4 @@ class NestSimulation(Simulation):
         self.suffix = ""
         self.multi = False
         self.has_lock = False
-        self.global_identifier_map = {}
+        self.identifier_map = IdentifierMap()
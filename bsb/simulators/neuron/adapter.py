@@ -1,5 +1,6 @@
 import contextlib
 import itertools
+import json
 import os
 import time
 import numpy as np
@@ -34,14 +35,24 @@ class NeuronResult(SimulationResult):
         from quantities import ms
 
         v = p.record(obj)
+        drained = 0
 
         def flush(segment):
+            nonlocal drained
             print("Flushing clamp", len(v))
             segment.analogsignals.append(
                 AnalogSignal(
-                    list(v), units="mV", sampling_period=p.dt * ms, **annotations
+                    list(v),
+                    units="mV",
+                    sampling_period=p.dt * ms,
+                    t_start=drained * p.dt * ms,
+                    **annotations,
                 )
             )
+            if self.draining:
+                # Empty the vector, the recording continues to append to it.
+                drained += len(v)
+                v.resize(0)
 
         self.create_recorder(flush)
 
@@ -73,6 +84,7 @@ class NeuronAdapter(SimulatorAdapter):
             from patch import p as engine
 
             self.engine = engine
+        engine = self.engine
 
         self.simdata[simulation] = SimulationData()
         try:
@@ -85,6 +97,12 @@ class NeuronAdapter(SimulatorAdapter):
             report("Load balancing", level=2)
             self.load_balance(simulation)
             simdata.result = NeuronResult(simulation)
+            if simulation.flush_interval is not None:
+                simdata.result.stream(
+                    _result_path(simulation),
+                    tail=simulation.tail,
+                    attrs={"configuration_string": json.dumps(simulation.__tree__())},
+                )
             report("Load balancing", level=2)
             self.create_neurons(simulation)
             report("Creating transmitters", level=2)
@@ -117,11 +135,18 @@ class NeuronAdapter(SimulatorAdapter):
             pc = self.engine.ParallelContext()
             pc.set_maxstep(10)
             self.engine.finitialize(self.initial)
+            result = self.simdata[simulation].result
+            interval = simulation.flush_interval
+            next_flush = interval
             simulation.start_progress(simulation.duration)
             for oi, i in simulation.step_progress(simulation.duration, 1):
                 t = time.time()
                 pc.psolve(i)
                 simulation.progress(i)
+                # The last window is flushed when the output is collected.
+                if interval is not None and next_flush <= i < simulation.duration:
+                    result.flush()
+                    next_flush = i + interval
                 if os.path.exists("interrupt_neuron"):
                     report("Iterrupt requested. Stopping simulation.", level=1)
                     break
@@ -134,6 +159,7 @@ class NeuronAdapter(SimulatorAdapter):
 
     def collect(self, simulation: "Simulation", data: SimulationData):
         data.result.flush()
+        data.result.close()
         return data.result
 
     def create_neurons(self, simulation):
@@ -203,6 +229,11 @@ class NeuronAdapter(SimulatorAdapter):
                 simdata.cells[cid] = instance
 
 
+def _result_path(simulation):
+    timestamp = str(time.time()).split(".")[0] + str(np.random.randint(10**6))
+    return MPI.bcast(f"results_{simulation.name}_{timestamp}.hdf5")
+
+
 class Matrix:
     def __getitem__(self, matrix):
         return np.array(matrix)
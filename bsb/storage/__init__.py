@@ -16,7 +16,7 @@ from inspect import isclass
 from ..exceptions import UnknownStorageEngineError
 from .. import plugins
 from ..services import MPI
-from ._chunks import Chunk, chunklist
+from ._chunks import Chunk, chunklist, chunk_batches
 from ._files import FileDependency, FileDependencyNode, NrrdDependencyNode
 
 
@@ -359,9 +359,23 @@ class Storage:
 
     def clear_placement(self, scaffold=None):
         self._engine.clear_placement()
+        self.clear_cached_boxes()
         if scaffold is not None:
             self.init_placement(scaffold)
 
+    def clear_cached_boxes(self):
+        """
+        :guilabel:`collective` Remove the boxes that placement sets cached in the file
+        store, see :meth:`~.storage.interfaces.PlacementSet.load_boxes`.
+        """
+        from .interfaces import _boxes_prefix
+
+        if self.is_main_process():
+            files = self.files
+            for id in [id for id in files.all() if id.startswith(_boxes_prefix)]:
+                files.remove(id)
+        self._comm.barrier()
+
     def clear_connectivity(self):
         self._engine.clear_connectivity()
 
@@ -105,6 +105,52 @@ def chunklist(chunks: typing.Iterable[Chunklike]) -> typing.List[Chunk]:
     return sorted(set(c if isinstance(c, Chunk) else Chunk(c, None) for c in chunks))
 
 
+def morton_order(chunks: typing.Sequence[Chunk]) -> typing.List[Chunk]:
+    """
+    Sort chunks along a Z-order (Morton) curve, so that consecutive chunks are spatially
+    close to each other.
+    """
+    if not len(chunks):
+        return []
+    # Shift the signed coordinates into the unsigned range, and interleave their bits.
+    coords = (np.array(chunks, dtype=np.int64).reshape(-1, 3) + 2**15).astype(np.uint64)
+    codes = np.zeros(len(coords), dtype=np.uint64)
+    for bit in range(16):
+        for dim in range(3):
+            bits = (coords[:, dim] >> np.uint64(bit)) & np.uint64(1)
+            codes |= bits << np.uint64(3 * bit + dim)
+    return [chunks[i] for i in np.argsort(codes, kind="stable")]
+
+
+def chunk_batches(
+    chunks: typing.Sequence[Chunk], size: int
+) -> typing.List[typing.List[Chunk]]:
+    """
+    Group chunks into batches of spatially adjacent chunks, in Morton order.
+
+    :param chunks: Chunks to group.
+    :param size: Maximum number of chunks per batch.
+    """
+    ordered = morton_order(chunks)
+    return [ordered[i : i + size] for i in range(0, len(ordered), size)]
+
+
+def chunk_ids(coords: npt.ArrayLike) -> np.ndarray:
+    """
+    Vectorized :attr:`Chunk.id` of an (N, 3) array of chunk coordinates.
+    """
+    coords = np.asarray(coords).reshape(-1, 3).astype(np.int16).astype(np.uint16)
+    return np.sum(coords.astype(np.int64) << np.array([0, 16, 32]), axis=1)
+
+
+def chunk_coords(ids: npt.ArrayLike) -> np.ndarray:
+    """
+    Vectorized inverse of :func:`chunk_ids`, returns an (N, 3) array of chunk coordinates.
+    """
+    ids = np.asarray(ids, dtype=np.int64).reshape(-1, 1)
+    return ((ids >> np.array([0, 16, 32])) % 2**16).astype(np.uint16).astype(np.int16)
+
+
 def _safe_ids(self, other):
     return (
         np.array(self, copy=False).view(Chunk)._safe_id(),
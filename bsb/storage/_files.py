@@ -12,6 +12,9 @@ import typing as _tp
 import requests as _rq
 import email.utils as _eml
 import nrrd as _nrrd
+import numpy as _np
+import zlib as _zlib
+import bz2 as _bz2
 
 from .._util import obj_str_insert
 from .. import config
@@ -351,12 +354,178 @@ class NrrdDependencyNode(FilePipelineMixin, FileDependencyNode):
         with self.file.provide_locally() as (path, encoding):
             return _nrrd.read_header(path)
 
-    def get_data(self):
+    def get_data(self, cache=False):
+        """
+        Read the data of the NRRD file.
+
+        :param cache: Keep the data in a process-wide cache, until the file is modified.
+          Raw encoded files are memory mapped instead of read. The cached data is
+          read-only.
+        :type cache: bool
+        """
+        if cache and (key := self._cache_key()) is not None:
+            return _read_nrrd_cached(*key)
         with self.file.provide_locally() as (path, encoding):
             return _nrrd.read(path)[0]
 
-    def load_object(self):
-        return self.pipe(self.get_data())
+    def iter_slabs(self, size=16):
+        """
+        Iterate over the data of the NRRD file in slabs along its last axis, decoding
+        the file as it goes instead of reading it entirely into memory.
+
+        :param size: Number of planes along the last axis per slab.
+        :type size: int
+        :returns: Iterator of the start of each slab along the last axis, and its data.
+        :rtype: Iterator[Tuple[int, numpy.ndarray]]
+        """
+        with self.file.provide_locally() as (path, encoding):
+            yield from _iter_nrrd_slabs(path, size)
+
+    def load_object(self, cache=False):
+        """
+        Read the data of the NRRD file and pass it through the pipeline.
+
+        :param cache: See :meth:`~bsb.storage._files.NrrdDependencyNode.get_data`. Pipeline
+          steps may modify the data in place, so the cache is not used if the node has a
+          pipeline.
+        :type cache: bool
+        """
+        return self.pipe(self.get_data(cache=cache and not self.pipeline))
+
+    def _cache_key(self):
+        # Only local files are cached, keyed by their path and modification.
+        try:
+            path = _os.path.abspath(self.file._scheme.get_local_path(self.file))
+            stat = _os.stat(path)
+        except (TypeError, OSError):
+            return None
+        return path, stat.st_mtime_ns, stat.st_size
+
+
+_READ_BLOCK = 2**20
+_NRRD_CACHE_SIZE = 8
+# Numpy type codes of the NRRD types, see https://teem.sourceforge.net/nrrd/format.html
+_nrrd_types = {
+    **dict.fromkeys(("signed char", "int8", "int8_t"), "i1"),
+    **dict.fromkeys(("uchar", "unsigned char", "uint8", "uint8_t"), "u1"),
+    **dict.fromkeys(
+        ("short", "short int", "signed short", "signed short int", "int16", "int16_t"),
+        "i2",
+    ),
+    **dict.fromkeys(
+        ("ushort", "unsigned short", "unsigned short int", "uint16", "uint16_t"), "u2"
+    ),
+    **dict.fromkeys(("int", "signed int", "int32", "int32_t"), "i4"),
+    **dict.fromkeys(("uint", "unsigned int", "uint32", "uint32_t"), "u4"),
+    **dict.fromkeys(
+        (
+            "longlong",
+            "long long",
+            "long long int",
+            "signed long long",
+            "signed long long int",
+            "int64",
+            "int64_t",
+        ),
+        "i8",
+    ),
+    **dict.fromkeys(
+        (
+            "ulonglong",
+            "unsigned long long",
+            "unsigned long long int",
+            "uint64",
+            "uint64_t",
+        ),
+        "u8",
+    ),
+    "float": "f4",
+    "double": "f8",
+}
+_nrrd_decoders = {
+    "raw": lambda: None,
+    "gzip": lambda: _zlib.decompressobj(_zlib.MAX_WBITS | 16),
+    "gz": lambda: _zlib.decompressobj(_zlib.MAX_WBITS | 16),
+    "bzip2": _bz2.BZ2Decompressor,
+    "bz2": _bz2.BZ2Decompressor,
+}
+
+
+def _nrrd_dtype(header):
+    # Return the numpy dtype of the NRRD data, or None if it's not a plain numeric type.
+    code = _nrrd_types.get(str(header.get("type", "")).strip().lower())
+    if code is None:
+        return None
+    dtype = _np.dtype(code)
+    if dtype.itemsize > 1:
+        endian = header.get("endian")
+        if endian not in ("little", "big"):
+            return None
+        dtype = dtype.newbyteorder("<" if endian == "little" else ">")
+    return dtype
+
+
+def _is_streamable(header):
+    return (
+        _nrrd_dtype(header) is not None
+        and header.get("encoding") in _nrrd_decoders
+        and "data file" not in header
+        and "datafile" not in header
+        and not header.get("line skip", header.get("lineskip"))
+        and not header.get("byte skip", header.get("byteskip"))
+    )
+
+
+@_ft.lru_cache(maxsize=_NRRD_CACHE_SIZE)
+def _read_nrrd_cached(path, mtime, size):
+    # The modification time and size are part of the key, so that modified files are
+    # read again.
+    return _read_nrrd_readonly(path)
+
+
+def _read_nrrd_readonly(path):
+    with open(path, "rb") as f:
+        header = _nrrd.read_header(f)
+        offset = f.tell()
+    if header.get("encoding") == "raw" and _is_streamable(header):
+        # Raw data follows the header and can be mapped without reading it; the pages
+        # of the mapping are shared with other processes reading the same file.
+        dtype = _nrrd_dtype(header)
+        shape = tuple(int(s) for s in header["sizes"])
+        data = _np.memmap(
+            path, dtype=dtype, mode="r", offset=offset, shape=shape, order="F"
+        )
+    else:
+        data = _nrrd.read(path)[0]
+        data.flags.writeable = False
+    return data
+
+
+def _iter_nrrd_slabs(path, size):
+    with open(path, "rb") as f:
+        header = _nrrd.read_header(f)
+        if _is_streamable(header):
+            # Data is stored in Fortran order, so each plane along the last axis is a
+            # contiguous block of the (decompressed) data that follows the header.
+            dtype = _nrrd_dtype(header)
+            shape = tuple(int(s) for s in header["sizes"])
+            plane = int(_np.prod(shape[:-1])) * dtype.itemsize
+            decoder = _nrrd_decoders[header["encoding"]]()
+            buffer = bytearray()
+            for start in range(0, shape[-1], size):
+                n = min(size, shape[-1] - start)
+                while len(buffer) < n * plane:
+                    block = f.read(_READ_BLOCK)
+                    if not block:
+                        raise IOError(f"NRRD file '{path}' is truncated.")
+                    buffer += decoder.decompress(block) if decoder else block
+                slab = _np.frombuffer(bytes(buffer[: n * plane]), dtype=dtype)
+                del buffer[: n * plane]
+                yield start, slab.reshape(shape[:-1] + (n,), order="F")
+            return
+    data = _nrrd.read(path)[0]
+    for start in range(0, data.shape[-1], size):
+        yield start, data[..., start : start + size]
 
 
 @config.node
@@ -0,0 +1,206 @@
+"""
+Node-local cache of stored morphologies. Each morphology is written once per node as a
+single packed file, which every process on the node memory maps copy-on-write: the
+operating system shares the pages between processes for as long as they are only read,
+and gives a process its own copy of a page when it writes to it.
+
+The cache entries of a morphology are grouped per storage and name, and keyed on its
+metadata, so that writes to other data in the storage keep using the same entry. A new
+entry replaces the older entries of the morphology. Overwriting or removing a morphology
+invalidates its entries.
+"""
+
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import uuid
+
+import numpy as np
+
+from .._encoding import EncodedLabels
+from ..exceptions import MorphologyDataError
+
+
+def get_cache_dir():
+    """
+    Return the directory of the mapped morphology cache, or ``None`` if the
+    ``morphology_cache`` option is not set.
+    """
+    import bsb.options
+
+    path = bsb.options.morphology_cache
+    return pathlib.Path(path) if path else None
+
+
+def load_mapped(loader, directory=None):
+    """
+    Load a stored morphology from the mapped morphology cache, storing it in the cache
+    first if it isn't cached yet.
+
+    :param loader: Stored morphology to load.
+    :type loader: ~bsb.storage.interfaces.StoredMorphology
+    :param directory: Cache directory, defaults to the ``morphology_cache`` option.
+    :type directory: Union[str, os.PathLike]
+    :returns: A morphology whose data is memory mapped copy-on-write.
+    :rtype: ~bsb.morphologies.Morphology
+    """
+    if directory is None:
+        directory = get_cache_dir()
+        if directory is None:
+            raise ValueError("No morphology cache directory given or configured.")
+    meta = loader.get_meta()
+    source = getattr(loader, "source", None)
+    path = pathlib.Path(directory) / _entry_key(source, loader.name) / _version_key(meta)
+    if not path.exists():
+        _dump(loader.load(), path)
+        _prune(path)
+    return _load(path, meta)
+
+
+def invalidate(source, name, directory=None):
+    """
+    Remove all cached versions of a stored morphology.
+
+    :param source: Identifier of the storage the morphology is stored in.
+    :type source: str
+    :param name: Name of the stored morphology.
+    :type name: str
+    :param directory: Cache directory, defaults to the ``morphology_cache`` option.
+    :type directory: Union[str, os.PathLike]
+    """
+    if directory is None:
+        directory = get_cache_dir()
+        if directory is None:
+            return
+    shutil.rmtree(pathlib.Path(directory) / _entry_key(source, name), ignore_errors=True)
+
+
+def _entry_key(source, name):
+    return _digest([source, name])
+
+
+def _version_key(meta):
+    # The name is part of the entry key, and not always part of the metadata.
+    return _digest({k: v for k, v in meta.items() if k != "name"})
+
+
+def _digest(obj):
+    key = json.dumps(obj, sort_keys=True, default=_jsonable)
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def _jsonable(obj):
+    return obj.tolist() if hasattr(obj, "tolist") else str(obj)
+
+
+def _dump(morpho, path):
+    morpho.optimize()
+    shared = morpho._shared
+    graph = np.empty((len(morpho.branches), 2), dtype=int)
+    parents = {None: -1}
+    ptr = 0
+    for i, branch in enumerate(morpho.branches):
+        ptr += len(branch)
+        graph[i] = ptr, parents[branch.parent]
+        parents[branch] = i
+    arrays = {
+        "points": np.asarray(shared._points, dtype=float),
+        "radii": np.asarray(shared._radii, dtype=float),
+        "labels": np.asarray(shared._labels, dtype=int),
+        "graph": graph,
+        **{f"prop_{i}": np.asarray(p) for i, p in enumerate(shared._prop.values())},
+    }
+    # Pack all arrays into a single file, so that a morphology takes a single memory
+    # map. Each array is aligned to 8 bytes.
+    layout = {}
+    offset = 0
+    for name, arr in arrays.items():
+        layout[name] = [arr.dtype.str, arr.shape, offset]
+        offset += -(-arr.nbytes // 8) * 8
+    # Write into a private directory first, and then move it into place, so that other
+    # processes never map a partially written morphology.
+    tmp = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+    tmp.mkdir(parents=True)
+    with open(tmp / "data.bin", "wb") as f:
+        for name, arr in arrays.items():
+            f.seek(layout[name][2])
+            f.write(np.ascontiguousarray(arr).tobytes())
+        f.truncate(offset)
+    with open(tmp / "morphology.json", "w") as f:
+        json.dump(
+            {
+                "labels": {k: sorted(v) for k, v in shared._labels.labels.items()},
+                "properties": [*shared._prop.keys()],
+                "layout": layout,
+            },
+            f,
+        )
+    try:
+        os.rename(tmp, path)
+    except OSError:
+        # Another process cached the morphology first.
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _prune(path):
+    # Remove the older versions of the morphology, e.g. left behind when another node
+    # overwrote it. Processes that still map them keep their data until they unmap it.
+    for entry in path.parent.iterdir():
+        if entry != path and not entry.name.endswith(".tmp"):
+            shutil.rmtree(entry, ignore_errors=True)
+
+
+def _map(path, layout):
+    if os.path.getsize(path):
+        data = np.memmap(path, mode="c")
+    else:
+        # Empty files can't be memory mapped.
+        data = np.empty(0, dtype=np.uint8)
+    arrays = {}
+    for name, (dtype, shape, offset) in layout.items():
+        dtype = np.dtype(dtype)
+        size = int(np.prod(shape, dtype=int)) * dtype.itemsize
+        arr = data[offset : offset + size].view(dtype).reshape(shape)
+        arrays[name] = np.asarray(arr)
+    return arrays
+
+
+def _load(path, meta):
+    from ..morphologies import Morphology, Branch
+
+    with open(path / "morphology.json", "r") as f:
+        info = json.load(f)
+    arrays = _map(path / "data.bin", info["layout"])
+    points = arrays["points"]
+    radii = arrays["radii"]
+    labels = EncodedLabels(
+        len(points),
+        buffer=arrays["labels"],
+        labels={int(k): v for k, v in info["labels"].items()},
+    )
+    props = {name: arrays[f"prop_{i}"] for i, name in enumerate(info["properties"])}
+    parents = {-1: None}
+    roots = []
+    ptr = 0
+    for i, (nptr, p) in enumerate(arrays["graph"]):
+        branch = Branch(
+            points[ptr:nptr],
+            radii[ptr:nptr],
+            labels[ptr:nptr],
+            {k: v[ptr:nptr] for k, v in props.items()},
+        )
+        parent = parents[p]
+        parents[i] = branch
+        if parent is not None:
+            parent.attach_child(branch)
+        else:
+            roots.append(branch)
+        ptr = nptr
+    morpho = Morphology(roots, meta, shared_buffers=(points, radii, labels, props))
+    if not morpho._check_shared():
+        raise MorphologyDataError(
+            f"Mapped morphology `{path}` does not share its buffers with its branches."
+        )
+    return morpho
@@ -2,11 +2,14 @@ import abc
 import typing
 from pathlib import Path
 import functools
+import hashlib
+import json
 import numpy as np
+from scipy.spatial.transform import Rotation
 
-from ._chunks import Chunk
+from ._chunks import Chunk, chunk_ids
 from .. import config, plugins
-from ..morphologies import Morphology
+from ..morphologies import Morphology, Branch, _parse_swc_file, _swc_to_morpho
 from ..trees import BoxTree
 from .._util import obj_str_insert, immutable
 
@@ -467,6 +470,17 @@ class PlacementSet(Interface):
         """
         pass
 
+    @abc.abstractmethod
+    def get_loaded_chunks(self):
+        """
+        Get the chunks that the placement set is filtered to, or all chunks if it isn't
+        filtered.
+
+        :returns: List of loaded chunks.
+        :rtype: List[bsb.storage.Chunk]
+        """
+        pass
+
     @abc.abstractmethod
     def load_ids(self):
         pass
@@ -641,7 +655,7 @@ class PlacementSet(Interface):
         """
         pass
 
-    def load_boxes(self, morpho_cache=None):
+    def load_boxes(self, morpho_cache=None, cache=False):
         """
         Load the cells as axis aligned bounding box rhomboids matching the extension,
         orientation and position in space. This function loads morphologies, unless a
@@ -652,41 +666,73 @@ class PlacementSet(Interface):
           afterwards you need the morphology set, you best call :meth:`.load_morphologies`
           first and reuse it here.
         :type morpho_cache: ~bsb.morphologies.MorphologySet
-        :returns: An iterator with 6 coordinates per cell: 3 min and 3 max coords, the
+        :param cache: Store the boxes in the file store of the engine, and reuse them
+          until the bounds of the morphologies change, or the scaffold writes placement
+          data. Writes to the placement set outside of the placement stage and the after
+          placement hooks of the scaffold don't invalidate the cached boxes.
+        :type cache: bool
+        :returns: An (Nx6) array with 6 coordinates per cell: 3 min and 3 max coords, the
           bounding box of that cell's translated and rotated morphology.
-        :rtype: Iterator[Tuple[float, float, float, float, float, float]]
+        :rtype: numpy.ndarray
         :raises: DatasetNotFoundError if no morphologies are found.
         """
         if morpho_cache is None:
             mset = self.load_morphologies()
         else:
             mset = morpho_cache
-        expansion = [*zip([0] * 4 + [1] * 4, ([0] * 2 + [1] * 2) * 2, [0, 1] * 4)]
-
-        def _box_of(m, o, r):
-            oo = (m["ldc"], m["mdc"])
-            # Make the 8 corners of the box
-            corners = np.array([[oo[x][0], oo[y][1], oo[z][2]] for x, y, z in expansion])
-            # Rotate them
-            rotbox = r.apply(corners)
-            # Find outer box, by rotating and translating the starting box
-            return np.concatenate(
-                (np.min(rotbox, axis=0) + o, np.max(rotbox, axis=0) + o)
+        metas = list(mset.iter_meta(unique=True))
+        ldc = np.array([m["ldc"] for m in metas], dtype=float).reshape(-1, 3)
+        mdc = np.array([m["mdc"] for m in metas], dtype=float).reshape(-1, 3)
+        if cache:
+            # The placement stages of the scaffold remove the cached boxes, so only the
+            # cheap properties of the data have to be checked here.
+            version = _boxes_version(len(self), mset.names, ldc, mdc)
+            cache_id = f"{self._boxes_cache_prefix()}{self._boxes_selection()}"
+            boxes = self._load_cached_boxes(cache_id, version)
+            if boxes is not None:
+                return boxes
+        indices = mset.get_indices(copy=False)
+        if not len(indices):
+            boxes = np.empty((0, 6))
+        else:
+            positions = np.asarray(self.load_positions(), dtype=float).reshape(-1, 3)
+            rotations = np.asarray(self.load_rotations(), dtype=float).reshape(-1, 3)
+            boxes = _rotated_boxes(ldc, mdc, indices, positions, rotations)
+        if cache:
+            self._engine.files.store(
+                boxes, meta={"version": version}, id=cache_id, overwrite=True
             )
+        return boxes
 
-        iters = (mset.iter_meta(), self.load_positions(), self.load_rotations())
-        return map(_box_of, *iters)
-
-    def load_box_tree(self, morpho_cache=None):
+    def load_box_tree(self, morpho_cache=None, cache=False):
         """
         Load boxes, and form an RTree with them, for fast spatial lookup of rhomboid
         intersection.
 
         :param morpho_cache: See :meth:`~bsb.storage.interfaces.PlacementSet.load_boxes`.
+        :param cache: See :meth:`~bsb.storage.interfaces.PlacementSet.load_boxes`.
         :returns: A boxtree
         :rtype: bsb.trees.BoxTree
         """
-        return BoxTree(list(self.load_boxes(morpho_cache=morpho_cache)))
+        return BoxTree(self.load_boxes(morpho_cache=morpho_cache, cache=cache))
+
+    def _boxes_cache_prefix(self):
+        return f"{_boxes_prefix}{self.tag}_"
+
+    def _boxes_selection(self):
+        # Identify the loaded chunks, so that differently filtered views of the placement
+        # set are cached separately.
+        ids = np.sort([c.id for c in self.get_loaded_chunks()]).astype(np.uint64)
+        return hashlib.sha1(ids.tobytes()).hexdigest()
+
+    def _load_cached_boxes(self, cache_id, version):
+        stored = self._engine.files.find_id(cache_id)
+        if stored is None:
+            return None
+        boxes, meta = stored.load()
+        if meta.get("version") != version:
+            return None
+        return np.asarray(boxes, dtype=float).reshape(-1, 6)
 
     def _requires_morpho_mapping(self):
         return self._morphology_labels is not None and self.count_morphologies()
@@ -713,6 +759,31 @@ class PlacementSet(Interface):
 
 
 class MorphologyRepository(Interface, engine_key="morphologies"):
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Tag the stored morphologies with the storage they come from, and invalidate
+        # the mapped morphology cache when morphologies are overwritten or removed.
+        for name, wrapper in (
+            ("preload", _tag_source),
+            ("save", _invalidate_mapped),
+            ("remove", _invalidate_mapped),
+        ):
+            if name in vars(cls):
+                setattr(cls, name, wrapper(vars(cls)[name]))
+
+    def get_source(self):
+        """
+        Return an identifier of the storage of the repository. For file based storage,
+        this is the absolute path of the file.
+
+        :rtype: str
+        """
+        root = self._engine.root
+        try:
+            return str(Path(root).resolve())
+        except TypeError:
+            return str(root)
+
     @abc.abstractmethod
     def all(self):
         """
@@ -821,6 +892,49 @@ class MorphologyRepository(Interface, engine_key="morphologies"):
 
         return self.save(name, morpho, overwrite=overwrite)
 
+    def import_swcs(self, files, names=None, overwrite=False, processes=None):
+        """
+        Import and store the contents of many .swc files as morphologies in the
+        repository. The files are parsed in parallel worker processes, and then stored.
+
+        :param files: Paths to the files.
+        :type files: List[Union[str, os.PathLike]]
+        :param names: Keys to store the morphologies under, defaults to the file names.
+        :type names: List[str]
+        :param overwrite: Overwrite any stored morphologies that already exist under the
+          same names.
+        :type overwrite: bool
+        :param processes: Number of worker processes to parse the files with. Defaults to
+          the ``processes`` option.
+        :type processes: int
+        :returns: The stored morphologies
+        :rtype: List[~bsb.storage.interfaces.StoredMorphology]
+        """
+        files = [*files]
+        if names is None:
+            names = [Path(file).stem for file in files]
+        if len(names) != len(files):
+            raise ValueError("Amount of names must match amount of files.")
+        if processes is None:
+            import bsb.options
+
+            processes = bsb.options.processes
+        if processes > 1 and len(files) > 1:
+            import concurrent.futures
+
+            with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as pool:
+                parsed = [*pool.map(_parse_swc_file, files)]
+        else:
+            parsed = [*map(_parse_swc_file, files)]
+        return [
+            self.save(
+                name,
+                _swc_to_morpho(Morphology, Branch, None, parsed=result),
+                overwrite=overwrite,
+            )
+            for name, result in zip(names, parsed)
+        ]
+
     def import_file(self, file, name=None, overwrite=False):
         """
         Import and store file contents as a morphology in the repository.
@@ -949,6 +1063,14 @@ class ConnectivitySet(Interface):
         """
         pass
 
+    @abc.abstractmethod
+    def get_chunk_stats(self):
+        """
+        Must return a dictionary with the number of incoming and outgoing connections of
+        each chunk, keyed by chunk id: ``{"<id>": {"inc": n_inc, "out": n_out}}``.
+        """
+        pass
+
     @abc.abstractmethod
     def get_local_chunks(self, direction):
         """
@@ -1101,34 +1223,83 @@ class ConnectivityIterator:
         else:
             self._gchunks = chunks
 
-    def all(self):
-        pre_blocks = []
-        post_blocks = []
-        lens = []
-        for pre_block, post_block in self:
-            pre_blocks.append(pre_block)
-            post_blocks.append(post_block)
-            lens.append(len(pre_block))
-        pre_locs = np.empty((sum(lens), 3), dtype=int)
-        post_locs = np.empty((sum(lens), 3), dtype=int)
+    def all(self, out=None):
+        """
+        Load all the connections at once.
+
+        :param out: A pair of (N, 3) arrays to write the presynaptic and postsynaptic
+          locations into, instead of allocating new ones, e.g. memory mapped arrays. N
+          must be the number of connections.
+        :type out: Tuple[numpy.ndarray, numpy.ndarray]
+        :returns: The presynaptic and postsynaptic locations.
+        :rtype: Tuple[numpy.ndarray, numpy.ndarray]
+        """
+        total, exact = self._count()
+        allocated = out is None
+        if allocated:
+            out = (np.empty((total, 3), dtype=int), np.empty((total, 3), dtype=int))
+        elif exact and any(arr.shape != (total, 3) for arr in out):
+            raise ValueError(
+                f"Output arrays of shape {[arr.shape for arr in out]} given for"
+                + f" {total} connections."
+            )
+        if self._dir == "out":
+            local_out, global_out = out
+        else:
+            global_out, local_out = out
+        local_offsets = self._local_chunk_offsets()
+        global_offsets = self._global_chunk_offsets()
+        # Copy each block into place as it is loaded, and offset its cell ids.
         ptr = 0
-        for len_, pre_block, post_block in zip(lens, pre_blocks, post_blocks):
-            pre_locs[ptr : ptr + len_] = pre_block
-            post_locs[ptr : ptr + len_] = post_block
-            ptr += len_
-        return pre_locs, post_locs
+        for _, lchunk, gchunk, (llocs, glocs) in self._cs.flat_iter_connections(
+            self._dir, self._lchunks, self._gchunks
+        ):
+            end = ptr + len(llocs)
+            if end > len(local_out) or end > len(global_out):
+                raise ValueError(
+                    f"Output arrays of shape {[arr.shape for arr in out]} too small for"
+                    + " the connections."
+                )
+            local_out[ptr:end] = llocs
+            local_out[ptr:end, 0] += _lookup_offsets(local_offsets, [lchunk])[0]
+            global_out[ptr:end] = glocs
+            global_out[ptr:end, 0] += _lookup_offsets(global_offsets, [gchunk])[0]
+            ptr = end
+        if any(len(arr) != ptr for arr in out):
+            if not allocated:
+                raise ValueError(
+                    f"Output arrays of shape {[arr.shape for arr in out]} given for"
+                    + f" {ptr} connections."
+                )
+            # Our arrays were sized from an upper bound, trim them to the connections.
+            out = tuple(arr[:ptr] for arr in out)
+        return out
 
     def _offset_block(self, direction: str, lchunk, gchunk, data):
-        loff = self._local_chunk_offsets()
-        goff = self._global_chunk_offsets()
         llocs, glocs = data
-        llocs[:, 0] += loff[lchunk]
-        glocs[:, 0] += goff[gchunk]
+        llocs[:, 0] += _lookup_offsets(self._local_chunk_offsets(), [lchunk])[0]
+        glocs[:, 0] += _lookup_offsets(self._global_chunk_offsets(), [gchunk])[0]
         if direction == "out":
             return llocs, glocs
         else:
             return glocs, llocs
 
+    def _count(self):
+        # Count the connections from the per chunk statistics of the set: the local chunks
+        # hold the connections in our direction, the global chunks those in the other.
+        # When both are restricted, the smallest of both is only an upper bound.
+        stats = self._cs.get_chunk_stats()
+        other = "inc" if self._dir == "out" else "out"
+        counts = []
+        for chunks, direction in ((self._lchunks, self._dir), (self._gchunks, other)):
+            if chunks is None:
+                keys = stats.keys()
+            else:
+                keys = map(str, np.unique(chunk_ids(np.array(chunks, dtype=int))))
+            counts.append(sum(stats.get(k, {}).get(direction, 0) for k in keys))
+        exact = self._lchunks is None or self._gchunks is None
+        return int(min(counts)), exact
+
     @functools.cache
     def _local_chunk_offsets(self):
         source = self._cs.post_type if self._dir == "inc" else self._cs.pre_type
@@ -1140,24 +1311,35 @@ class ConnectivityIterator:
         return self._chunk_offsets(source, self._gchunks)
 
     def _chunk_offsets(self, source, chunks):
+        # Table of the sorted chunk ids of the placement set, and the offset of the cells
+        # of each chunk.
         stats = source.get_placement_set().get_chunk_stats()
+        ids = np.fromiter((int(chunk) for chunk in stats), dtype=np.int64)
+        counts = np.fromiter(stats.values(), dtype=np.int64, count=len(ids))
         if self._scoped and chunks is not None:
-            stats = {chunk: item for chunk, item in stats.items() if int(chunk) in chunks}
-        offsets = {}
-        ctr = 0
-        for chunk, len_ in sorted(
-            stats.items(), key=lambda k: Chunk.from_id(int(k[0]), None).id
-        ):
-            offsets[Chunk.from_id(int(chunk), None)] = ctr
-            ctr += len_
-        return offsets
+            keep = np.isin(ids, chunk_ids(np.array(chunks, dtype=int)))
+            ids, counts = ids[keep], counts[keep]
+        order = np.argsort(ids)
+        ids, counts = ids[order], counts[order]
+        return ids, np.cumsum(counts) - counts
+
+
+def _lookup_offsets(table, chunks):
+    ids, offsets = table
+    query = chunk_ids(np.array(chunks, dtype=int))
+    idx = np.minimum(np.searchsorted(ids, query), max(len(ids) - 1, 0))
+    missing = (ids[idx] != query) if len(ids) else np.ones(len(query), dtype=bool)
+    if np.any(missing):
+        raise KeyError(Chunk.from_id(int(query[missing][0]), None))
+    return offsets[idx]
 
 
 class StoredMorphology:
-    def __init__(self, name, loader, meta):
+    def __init__(self, name, loader, meta, source=None):
         self.name = name
         self._loader = loader
         self._meta = meta
+        self.source = source
 
     def __eq__(self, other):
         return self.name == other.name
@@ -1176,6 +1358,19 @@ class StoredMorphology:
             labels = tuple(labels)
         return self._cached_load(labels)
 
+    def mapped_load(self, directory=None):
+        """
+        Load the morphology from the node-local mapped morphology cache. The data of the
+        morphology is memory mapped copy-on-write, so that processes on the same node
+        share it in memory until they modify it.
+
+        :param directory: Cache directory, defaults to the ``morphology_cache`` option.
+        :type directory: Union[str, os.PathLike]
+        """
+        from ._mapped import load_mapped
+
+        return load_mapped(self, directory)
+
     @functools.cache
     def _cached_load(self, labels):
         return self.load().set_label_filter(labels).as_filtered()
@@ -1186,3 +1381,56 @@ class GeneratedMorphology(StoredMorphology):
         self.name = name
         self._loader = lambda: generated
         self._meta = meta
+        self.source = None
+
+
+def _tag_source(f):
+    @functools.wraps(f)
+    def wrapper(self, name, *args, **kwargs):
+        stored = f(self, name, *args, **kwargs)
+        if getattr(stored, "source", None) is None:
+            stored.source = self.get_source()
+        return stored
+
+    return wrapper
+
+
+def _invalidate_mapped(f):
+    @functools.wraps(f)
+    def wrapper(self, name, *args, **kwargs):
+        from ._mapped import invalidate
+
+        try:
+            return f(self, name, *args, **kwargs)
+        finally:
+            invalidate(self.get_source(), name)
+
+    return _tag_source(wrapper) if f.__name__ == "save" else wrapper
+
+
+_boxes_prefix = "bsb_boxes_"
+
+
+def _boxes_version(n, names, ldc, mdc):
+    digest = hashlib.sha1(json.dumps([n, list(names)]).encode())
+    for arr in (ldc, mdc):
+        digest.update(np.ascontiguousarray(arr).tobytes())
+    return digest.hexdigest()
+
+
+def _rotated_boxes(ldc, mdc, indices, positions, rotations):
+    # Make the 8 corners of the box of each morphology, ...
+    expansion = np.array(
+        [[x, y, z] for x in (0, 1) for y in (0, 1) for z in (0, 1)], dtype=bool
+    )
+    corners = np.where(expansion, mdc[:, np.newaxis], ldc[:, np.newaxis])
+    # ... rotate the corners of all cells at once, ...
+    rotation = Rotation.from_euler("xyz", rotations)
+    lbox = np.full((len(indices), 3), np.inf)
+    ubox = np.full((len(indices), 3), -np.inf)
+    for corner in range(8):
+        rotated = rotation.apply(corners[indices, corner])
+        np.minimum(lbox, rotated, out=lbox)
+        np.maximum(ubox, rotated, out=ubox)
+    # ... and translate the outer box of the rotated corners to the cell positions.
+    return np.concatenate((lbox + positions, ubox + positions), axis=1)
@@ -13,13 +13,16 @@ from ..exceptions import (
     NodeNotFoundError,
 )
 from ..storage._files import NrrdDependencyNode
-from ..storage._util import _cached_file
+from ..storage._util import _cached_file, _cache_path
 from ..voxels import VoxelSet
-from ..storage import Chunk
+from ..storage._chunks import chunk_ids, chunk_coords
 from ..reporting import report
 import numpy as np
 import collections
 import functools
+import hashlib
+import os
+import uuid
 import requests
 import nrrd
 import json
@@ -291,19 +294,49 @@ class Voxels(Partition, abc.ABC, classmap_entry=None):
         return self.get_voxelset()
 
     def to_chunks(self, chunk_size):
-        return self.voxelset.snap_to_grid(chunk_size, unique=True)
-
-    def _lookup(self, chunk):
-        if not hasattr(self, "_map"):
-            vs = self.voxelset.snap_to_grid(chunk.dimensions)
-            map = {}
-            for i, idx in enumerate(vs):
-                map.setdefault(idx.view(Chunk), []).append(i)
-            self._map = {k: self.voxelset[v] for k, v in map.items()}
-        return self._map
+        ids, offsets, order = self.get_chunk_index(chunk_size)
+        coords = chunk_coords(ids)
+        # Order the chunks like `np.unique` would, with the data of their first voxel.
+        lex = np.lexsort(coords.T[::-1])
+        data = self.voxelset.get_data(copy=False)
+        if data is not None:
+            data = data[order[offsets[:-1]][lex]]
+        return VoxelSet(coords[lex], chunk_size, data)
 
     def chunk_to_voxels(self, chunk):
-        return self._lookup(chunk).get(chunk, VoxelSet.empty())
+        ids, offsets, order = self.get_chunk_index(chunk.dimensions)
+        i = np.searchsorted(ids, chunk.id)
+        if i == len(ids) or ids[i] != chunk.id:
+            return VoxelSet.empty()
+        return self.voxelset[order[offsets[i] : offsets[i + 1]]]
+
+    def get_chunk_index(self, chunk_size):
+        """
+        Get the index of the voxels per chunk: the voxels sorted by chunk. The index is
+        built once per chunk size.
+
+        :param chunk_size: Size of the chunks
+        :type chunk_size: numpy.ndarray
+        :returns: The sorted unique chunk ids, the offsets of each chunk in the voxel
+          order, and the voxel order. The voxels of the i-th chunk are
+          ``order[offsets[i]:offsets[i + 1]]``.
+        :rtype: Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]
+        """
+        size = np.broadcast_to(np.asarray(chunk_size, dtype=float), (3,))
+        if not hasattr(self, "_chunk_indices"):
+            self._chunk_indices = {}
+        key = tuple(size)
+        if key not in self._chunk_indices:
+            self._chunk_indices[key] = self._build_chunk_index(size)
+        return self._chunk_indices[key]
+
+    def _build_chunk_index(self, size):
+        vs = self.voxelset.snap_to_grid(size)
+        voxel_ids = chunk_ids(vs.get_raw(copy=False))
+        order = np.argsort(voxel_ids, kind="stable")
+        ids, starts = np.unique(voxel_ids[order], return_index=True)
+        offsets = np.append(starts, len(order))
+        return ids, offsets, order
 
     def get_layout(self, hint):
         return Layout(RhomboidData(*self.voxelset.bounds), owner=self)
@@ -345,22 +378,16 @@ class NrrdVoxels(Voxels, classmap_entry="nrrd"):
     keys = config.attr(type=types.list(str))
     sparse = config.attr(type=bool, default=True)
     strict = config.attr(type=bool, default=True)
+    mask_cache = config.attr(type=bool, default=True)
 
     def get_mask(self):
         mask_shape = self._validate()
-        mask = np.zeros(mask_shape, dtype=bool)
         if self.sparse:
             # Use integer (sparse) indexing
-            mask = [np.empty((0,), dtype=int) for i in range(3)]
-            for mask_src in self._mask_src:
-                mask_data = mask_src.get_data()
-                new_mask = np.nonzero(self._mask_cond(mask_data))
-                for i, mask_vector in enumerate(new_mask):
-                    mask[i] = np.concatenate((mask[i], mask_vector))
-            inter = np.unique(mask, axis=1)
-            mask = tuple(inter[i, :] for i in range(3))
+            return tuple(self._get_sparse_mask())
         else:
             # Use boolean (dense) indexing
+            mask = np.zeros(mask_shape, dtype=bool)
             for mask_src in self._mask_src:
                 mask_data = mask_src.get_data()
                 mask = mask | self._mask_cond(mask_data)
@@ -372,8 +399,16 @@ class NrrdVoxels(Voxels, classmap_entry="nrrd"):
         voxel_data = None
         if not self.mask_only:
             voxel_data = np.empty((len(mask[0]), len(self._src)))
+            # Read the source data slab by slab, and fill in the voxels in each slab.
+            order = np.argsort(mask[2], kind="stable")
+            slab_coords = mask[2][order]
             for i, source in enumerate(self._src):
-                voxel_data[:, i] = source.get_data()[mask]
+                for start, slab in source.iter_slabs():
+                    bounds = np.searchsorted(slab_coords, [start, start + slab.shape[2]])
+                    sel = order[slice(*bounds)]
+                    voxel_data[sel, i] = slab[
+                        mask[0][sel], mask[1][sel], mask[2][sel] - start
+                    ]
 
         return VoxelSet(
             np.transpose(mask),
@@ -382,6 +417,35 @@ class NrrdVoxels(Voxels, classmap_entry="nrrd"):
             data_keys=self.keys,
         )
 
+    def _get_sparse_mask(self):
+        path = None
+        if self.mask_cache:
+            path = _mask_cache_path / f"{self._mask_cache_key()}.npz"
+            try:
+                with np.load(path) as cached:
+                    return cached["mask"]
+            except (OSError, KeyError, ValueError):
+                pass
+        mask = [np.empty((3, 0), dtype=int)]
+        for mask_src in self._mask_src:
+            for start, slab in mask_src.iter_slabs():
+                x, y, z = np.nonzero(self._mask_cond(slab))
+                mask.append(np.array([x, y, z + start]))
+        mask = np.unique(np.concatenate(mask, axis=1), axis=1)
+        if path is not None:
+            _store_mask(path, mask)
+        return mask
+
+    def _mask_cache_key(self):
+        digest = hashlib.sha1()
+        for mask_src in self._mask_src:
+            digest.update(_file_digest(mask_src).encode())
+        digest.update(repr(self._mask_cond_key()).encode())
+        return digest.hexdigest()
+
+    def _mask_cond_key(self):
+        return "value", self.mask_value or None
+
     def _validate(self):
         self._validate_sources()
         shape = self._validate_source_compat()
@@ -467,6 +531,10 @@ class AllenStructure(NrrdVoxels, classmap_entry="allen"):
     @config.property
     @functools.cache
     def mask_source(self):
+        return self._dl_mask()
+
+    @classmethod
+    def _dl_mask(cls):
         node = NrrdDependencyNode()
         node._file = _cached_file(
             "http://download.alleninstitute.org/informatics-archive/current-release/mouse_ccf/annotation/ccf_2017/annotation_25.nrrd",
@@ -502,8 +570,21 @@ class AllenStructure(NrrdVoxels, classmap_entry="allen"):
 
     @classmethod
     def get_structure_mask(cls, find):
-        mask_data, _ = nrrd.read(cls._dl_mask())
-        return cls.get_structure_mask_condition(find)(mask_data)
+        """
+        Return a boolean mask of the Allen annotation volume that delineates the Allen
+        structure.
+
+        :param find: Acronym or ID of the Allen structure.
+        :type find: Union[str, int]
+        :returns: Boolean mask
+        :rtype: numpy.ndarray
+        """
+        source = cls._dl_mask()
+        mask = np.zeros(source.get_header()["sizes"], dtype=bool)
+        cond = cls.get_structure_mask_condition(find)
+        for start, slab in source.iter_slabs():
+            mask[..., start : start + slab.shape[-1]] = cond(slab)
+        return mask
 
     @classmethod
     def get_structure_idset(cls, find):
@@ -516,13 +597,8 @@ class AllenStructure(NrrdVoxels, classmap_entry="allen"):
         :rtype: numpy.ndarray
         """
         struct = cls.find_structure(find)
-        values = set()
-
-        def flatmask(item):
-            values.add(item["id"])
-
-        cls._visit_structure([struct], flatmask)
-        return np.array([*values], dtype=int)
+        _, _, descendants = cls._structure_index()
+        return np.array(descendants[struct["id"]], dtype=int)
 
     @classmethod
     def find_structure(cls, id):
@@ -535,20 +611,45 @@ class AllenStructure(NrrdVoxels, classmap_entry="allen"):
         :rtype: dict
         :raises: NodeNotFoundError
         """
+        nodes, names, _ = cls._structure_index()
         if isinstance(id, str):
-            treat = lambda s: s.strip().lower()
-            name = treat(id)
-            find = lambda x: treat(x["name"]) == name or treat(x["acronym"]) == name
+            found = names.get(_normalize_structure_name(id))
         elif isinstance(id, int) or isinstance(id, float):
-            id = int(id)
-            find = lambda x: x["id"] == id
+            found = int(id)
         else:
             raise TypeError(f"Argument must be a string or a number. {type(id)} given.")
         try:
-            return cls._find_structure(find)
-        except NodeNotFoundError:
+            return nodes[found]
+        except KeyError:
             raise NodeNotFoundError(f"Could not find structure '{id}'") from None
 
+    @classmethod
+    @functools.cache
+    def _structure_index(cls):
+        """
+        Flat index of the Allen ontology: the nodes by ID, the ID of each normalized name
+        and acronym, and the descendant IDs of each structure, including itself.
+        """
+        tree = cls._dl_structure_ontology()
+        nodes = {}
+        names = {}
+        order = []
+
+        def visitor(item):
+            nodes[item["id"]] = item
+            # Visiting breadth first, the first structure with a name wins.
+            names.setdefault(_normalize_structure_name(item["name"]), item["id"])
+            names.setdefault(_normalize_structure_name(item["acronym"]), item["id"])
+            order.append(item)
+
+        cls._visit_structure(tree, visitor)
+        descendants = {}
+        for item in reversed(order):
+            descendants[item["id"]] = [item["id"]] + [
+                d for child in item["children"] for d in descendants[child["id"]]
+            ]
+        return nodes, names, descendants
+
     @classmethod
     def _find_structure(cls, find):
         result = None
@@ -584,6 +685,34 @@ class AllenStructure(NrrdVoxels, classmap_entry="allen"):
         id = self.struct_id if self.struct_id is not None else self.struct_name
         self._mask_cond = self.get_structure_mask_condition(id)
 
+    def _mask_cond_key(self):
+        id = self.struct_id if self.struct_id is not None else self.struct_name
+        return "structures", sorted(self.get_structure_idset(id).tolist())
+
+
+_mask_cache_path = _cache_path / "nrrd_masks"
+
+
+def _file_digest(node):
+    digest = hashlib.sha1()
+    with node.file.provide_locally() as (path, encoding):
+        with open(path, "rb") as f:
+            while block := f.read(2**20):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def _normalize_structure_name(name):
+    return name.strip().lower()
+
+
+def _store_mask(path, mask):
+    # Write to a private file first, so that concurrent readers never see a partial file.
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{uuid.uuid4().hex}.tmp.npz")
+    np.savez_compressed(tmp, mask=mask)
+    os.replace(tmp, path)
+
 
 def _safe_hread(s):
     try:
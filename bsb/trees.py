@@ -4,6 +4,8 @@ problems.
 """
 
 from rtree import index as rtree
+import numpy as np
+import pathlib
 import abc
 
 
@@ -25,6 +27,23 @@ class BoxTreeInterface(abc.ABC):
     def __len__(self):
         pass
 
+    def query_csr(self, boxes):
+        """
+        Find the intersecting IDs of all query boxes at once, in compressed sparse row
+        format: the IDs intersecting with query box ``i`` are
+        ``indices[offsets[i]:offsets[i + 1]]``.
+
+        :param boxes: (Nx6) array of query boxes.
+        :type boxes: numpy.ndarray
+        :returns: Offsets and indices
+        :rtype: Tuple[numpy.ndarray, numpy.ndarray]
+        """
+        results = [np.array(r, dtype=int) for r in self.query(boxes)]
+        offsets = np.zeros(len(results) + 1, dtype=int)
+        np.cumsum([len(r) for r in results], out=offsets[1:])
+        indices = np.concatenate(results) if results else np.empty(0, dtype=int)
+        return offsets, indices.astype(int)
+
 
 class BoxRTree(BoxTreeInterface):
     """
@@ -63,6 +82,180 @@ class BoxRTree(BoxTreeInterface):
             yield from all_
 
 
+class ArrayBoxTree(BoxTreeInterface):
+    """
+    Static tree for fast lookup of queries of axis aligned rhomboids, stored entirely in
+    NumPy arrays. The tree is bulk loaded with Sort-Tile-Recursive packing, and queried
+    for many boxes at once, level by level. The tree can be pickled, or dumped to a
+    directory and memory mapped with :meth:`.load`.
+    """
+
+    def __init__(self, boxes, node_size=16):
+        boxes = np.array(boxes, dtype=float).reshape(-1, 6)
+        self._node_size = node_size
+        # Sort the boxes into tiles of spatially close boxes.
+        self._ids = _str_order(boxes, node_size)
+        levels = [boxes[self._ids]]
+        # Bound each group of `node_size` nodes by a parent node, until 1 root is left.
+        while len(levels[0]) > 1:
+            levels.insert(0, _group_bounds(levels[0], node_size))
+        self._levels = np.cumsum([0] + [len(level) for level in levels])
+        self._nodes = np.concatenate(levels) if levels else np.empty((0, 6))
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __getstate__(self):
+        return {
+            "node_size": self._node_size,
+            "ids": np.asarray(self._ids),
+            "levels": np.asarray(self._levels),
+            "nodes": np.asarray(self._nodes),
+        }
+
+    def __setstate__(self, state):
+        self._node_size = int(state["node_size"])
+        self._ids = state["ids"]
+        self._levels = state["levels"]
+        self._nodes = state["nodes"]
+
+    def dump(self, path):
+        """
+        Store the tree in a directory, to be memory mapped by :meth:`.load`.
+
+        :param path: Directory to store the tree in.
+        :type path: Union[str, os.PathLike]
+        """
+        path = pathlib.Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        for key, value in self.__getstate__().items():
+            np.save(path / f"{key}.npy", value)
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        """
+        Load a tree from a directory created by :meth:`.dump`.
+
+        :param path: Directory the tree was dumped in.
+        :type path: Union[str, os.PathLike]
+        :param mmap_mode: See :func:`numpy.load`.
+        :type mmap_mode: str
+        """
+        path = pathlib.Path(path)
+        tree = cls.__new__(cls)
+        tree.__setstate__(
+            {
+                key: np.load(path / f"{key}.npy", mmap_mode=mmap_mode)
+                for key in ("node_size", "ids", "levels", "nodes")
+            }
+        )
+        return tree
+
+    def query(self, boxes, unique=False):
+        """
+        Given an iterable of ``(min_x, min_y, min_z, max_x, max_y, max_z)`` box tuples,
+        find all the boxes that intersect with them.
+
+        :param boxes: Boxes to look for intersections with.
+        :type boxes: Iterable[Tuple[float, float, float, float, float, float]]
+        :param unique: If ``True``, return a flat generator of unique results. If ``False``
+            (default), per box in ``boxes``, return a list of intersecting boxes.
+        :returns: See ``unique``.
+        :rtype: Union[Iterator[List[int]], Iterator[int]]
+        """
+        offsets, indices = self.query_csr(boxes)
+        if unique:
+            # Keep the first occurrence of each ID, in order of the query boxes.
+            _, first = np.unique(indices, return_index=True)
+            yield from indices[np.sort(first)].tolist()
+        else:
+            yield from (
+                indices[start:stop].tolist()
+                for start, stop in zip(offsets[:-1], offsets[1:])
+            )
+
+    def query_csr(self, boxes, batch_size=4096):
+        """
+        Find the intersecting IDs of all query boxes at once, in compressed sparse row
+        format: the IDs intersecting with query box ``i`` are
+        ``indices[offsets[i]:offsets[i + 1]]``, sorted.
+
+        :param boxes: (Nx6) array of query boxes.
+        :type boxes: numpy.ndarray
+        :param batch_size: Amount of query boxes to traverse the tree with at once.
+        :type batch_size: int
+        :returns: Offsets and indices
+        :rtype: Tuple[numpy.ndarray, numpy.ndarray]
+        """
+        boxes = np.array(boxes, dtype=float).reshape(-1, 6)
+        counts = np.zeros(len(boxes), dtype=int)
+        results = []
+        for start in range(0, len(boxes), batch_size):
+            queries, ids = self._query_batch(boxes[start : start + batch_size])
+            counts[start : start + batch_size] = np.bincount(
+                queries, minlength=len(boxes[start : start + batch_size])
+            )
+            results.append(ids)
+        offsets = np.zeros(len(boxes) + 1, dtype=int)
+        np.cumsum(counts, out=offsets[1:])
+        indices = np.concatenate(results) if results else np.empty(0, dtype=int)
+        return offsets, indices
+
+    def _query_batch(self, boxes):
+        if not len(self._ids):
+            return np.empty(0, dtype=int), np.empty(0, dtype=int)
+        levels, nodes, size = self._levels, self._nodes, self._node_size
+        # Pairs of query boxes and candidate nodes, starting at the root.
+        queries = np.arange(len(boxes))
+        candidates = np.zeros(len(boxes), dtype=int)
+        for level in range(len(levels) - 1):
+            if level:
+                # Expand each surviving candidate into its children.
+                first = candidates * size
+                n_children = np.minimum(size, levels[level + 1] - levels[level] - first)
+                queries = np.repeat(queries, n_children)
+                candidates = np.repeat(
+                    first - np.cumsum(n_children) + n_children, n_children
+                )
+                candidates += np.arange(len(candidates))
+            bounds = nodes[levels[level] + candidates]
+            hit = np.all(
+                (bounds[:, :3] <= boxes[queries, 3:])
+                & (bounds[:, 3:] >= boxes[queries, :3]),
+                axis=1,
+            )
+            queries, candidates = queries[hit], candidates[hit]
+        ids = np.asarray(self._ids)[candidates]
+        order = np.lexsort((ids, queries))
+        return queries[order], ids[order]
+
+
+def _str_order(boxes, node_size):
+    # Sort-Tile-Recursive: sort on the center along x into slabs, each slab along y into
+    # columns, and each column along z, so that consecutive boxes are close together.
+    centers = (boxes[:, :3] + boxes[:, 3:]) / 2
+    order = np.arange(len(boxes))
+    n_leaves = -(-len(boxes) // node_size)
+    n_slices = max(1, int(np.ceil(n_leaves ** (1 / 3))))
+    for dim in range(3):
+        # Sort within each group of the previous dimension, by this dimension.
+        group_size = -(-len(boxes) // n_slices**dim) if dim else len(boxes)
+        groups = np.arange(len(boxes)) // max(1, group_size)
+        order = order[np.lexsort((centers[order, dim], groups))]
+    return order
+
+
+def _group_bounds(nodes, node_size):
+    starts = np.arange(0, len(nodes), node_size)
+    return np.concatenate(
+        (
+            np.minimum.reduceat(nodes[:, :3], starts),
+            np.maximum.reduceat(nodes[:, 3:], starts),
+        ),
+        axis=1,
+    )
+
+
 # Cheapo provider. Needs to be a class definition so that the doc reference can be found.
-class BoxTree(BoxRTree):
+class BoxTree(ArrayBoxTree):
     pass
@@ -100,6 +100,7 @@ class VoxelSet:
             memory and time. You may accidentally change a voxelset if you later change
             the same array.
         """
+        self._members = None
         voxels = np.array(voxels, copy=False)
         voxel_size = np.array(size, copy=False)
         if voxels.dtype.name == "object":
@@ -163,6 +164,16 @@ class VoxelSet:
         return len(self.get_raw(copy=False))
 
     def __getitem__(self, index):
+        if self._members is not None:
+            offsets, members = self.get_members(index)
+            voxels = self.get_raw(copy=False)[index].reshape(-1, 3)
+            if self._single_size:
+                voxel_size = self._size.copy()
+            else:
+                voxel_size = self._sizes[index]
+            vs = VoxelSet(voxels, voxel_size, irregular=not self.regular)
+            vs._members = (offsets, members)
+            return vs
         if self.has_data:
             data = self._data[index]
             index, _, _ = self._data._split_index(index)
@@ -180,7 +191,9 @@ class VoxelSet:
         return VoxelSet(voxels, voxel_size, data)
 
     def __getattr__(self, key):
-        if key in self._data._keys:
+        if key.startswith("_"):
+            return super().__getattribute__(key)
+        if self._data is not None and key in self._data._keys:
             return self.get_data(key)
         else:
             return super().__getattribute__(key)
@@ -197,7 +210,9 @@ class VoxelSet:
                 insert += f"same size {self.size}, "
             else:
                 insert += "individual sizes, "
-            if self.has_data:
+            if self._members is not None:
+                insert += "with voxel members "
+            elif self.has_data:
                 if self._data.keys:
                     insert += f"with keyed data ({', '.join(self._data.keys)}) "
                 else:
@@ -227,7 +242,7 @@ class VoxelSet:
 
         :rtype: bool
         """
-        return self._data is not None
+        return self._data is not None or self._members is not None
 
     @property
     def regular(self):
@@ -281,7 +296,7 @@ class VoxelSet:
 
     @property
     def data_keys(self):
-        return self._data.keys
+        return self._data.keys if self._data is not None else []
 
     @property
     def raw(self):
@@ -394,6 +409,10 @@ class VoxelSet:
     def copy(self):
         if self.is_empty:
             return VoxelSet.empty()
+        elif self._members is not None:
+            vs = VoxelSet(self.raw, self.get_size(copy=True), irregular=not self.regular)
+            vs._members = tuple(arr.copy() for arr in self._members)
+            return vs
         else:
             return VoxelSet(
                 self.raw,
@@ -409,7 +428,9 @@ class VoxelSet:
         return coords
 
     def get_data(self, index=None, /, copy=True):
-        if self.has_data:
+        if self._members is not None:
+            return self._members_as_data(index)
+        elif self.has_data:
             if index is not None:
                 return self._data[index]
             else:
@@ -417,6 +438,30 @@ class VoxelSet:
         else:
             return None
 
+    def get_members(self, index=None):
+        """
+        Get the members of (a selection of) the voxels, in compressed sparse row format:
+        the members of voxel ``i`` of the selection are
+        ``members[offsets[i]:offsets[i + 1]]``. Voxel sets of morphologies have the
+        ``(branch, point)`` locations of the points inside of each voxel as members.
+
+        :param index: Index of the voxels to select, all voxels if omitted.
+        :returns: Offsets and members, or ``None`` if the set has no members.
+        :rtype: Tuple[numpy.ndarray, numpy.ndarray]
+        """
+        if self._members is None:
+            return None
+        offsets, members = self._members
+        if index is None:
+            return offsets, members
+        starts = np.atleast_1d(offsets[:-1][index])
+        counts = np.atleast_1d(np.diff(offsets)[index])
+        new_offsets = np.zeros(len(counts) + 1, dtype=int)
+        np.cumsum(counts, out=new_offsets[1:])
+        # Gather the members of each selected voxel, in order.
+        gather = np.repeat(starts - new_offsets[:-1], counts) + np.arange(new_offsets[-1])
+        return new_offsets, members[gather]
+
     def get_size(self, copy=True):
         if self._single_size:
             return np.array(self._size, copy=copy)
@@ -459,7 +504,7 @@ class VoxelSet:
             grid = self._indices // _squash_zero(voxel_size / _squash_zero(self._size))
         else:
             grid = self._coords // _squash_zero(voxel_size)
-        data = self._data
+        data = self.get_data(copy=False)
         if unique:
             if self.has_data:
                 grid, id = np.unique(grid, return_index=True, axis=0)
@@ -548,6 +593,17 @@ class VoxelSet:
     def _boxes(self):
         return np.column_stack(self._box_bounds())
 
+    def _members_as_data(self, index=None):
+        # Expand the members into the object array form of voxel data.
+        offsets, members = self.get_members(index)
+        data = np.empty((len(offsets) - 1, 1), dtype=object)
+        for i, voxel_members in enumerate(np.split(members, offsets[1:-1])):
+            data[i, 0] = voxel_members
+        data = VoxelData(data)
+        if isinstance(index, (int, np.integer)):
+            return data[0]
+        return data
+
     @classmethod
     def from_morphology(cls, morphology, estimate_n, with_data=True):
         meta = morphology.meta
@@ -560,23 +616,27 @@ class VoxelSet:
         per_side = _eq_sides(size, estimate_n)
         voxel_size = size / per_side
         _squash_temp = _squash_zero(voxel_size)
-        branch_vcs = [b.points // _squash_temp for b in morphology.branches]
+        branches = morphology.branches
+        lens = [len(b.points) for b in branches]
+        if sum(lens):
+            points = np.concatenate([b.points for b in branches if len(b.points)])
+        else:
+            points = np.empty((0, 3))
+        point_vcs = points // _squash_temp
         if with_data:
-            voxel_reduce = {}
-            for branch, point_vcs in enumerate(branch_vcs):
-                for point, point_vc in enumerate(point_vcs):
-                    voxel_reduce.setdefault(tuple(point_vc), []).append((branch, point))
-            voxels = np.array(tuple(voxel_reduce.keys()))
-            # Transfer the voxel data into an object array
-            voxel_data_data = tuple(voxel_reduce.values())
-            # We need a bit of a workaround so that numpy doesn't make a regular from the
-            # `voxel_data_data` list of lists, when it has a matrix shape.
-            voxel_data = np.empty(len(voxel_data_data), dtype=object)
-            for i in range(len(voxel_data_data)):
-                voxel_data[i] = voxel_data_data[i]
-            return cls(voxels, voxel_size, data=voxel_data)
+            voxels, inverse = np.unique(point_vcs, axis=0, return_inverse=True)
+            inverse = inverse.reshape(-1)
+            # Store the (branch, point) location of each point, grouped per voxel.
+            branch_ids = np.repeat(np.arange(len(lens)), lens)
+            point_ids = np.arange(len(points)) - np.repeat(np.cumsum(lens) - lens, lens)
+            order = np.argsort(inverse, kind="stable")
+            offsets = np.zeros(len(voxels) + 1, dtype=int)
+            np.cumsum(np.bincount(inverse, minlength=len(voxels)), out=offsets[1:])
+            vs = cls(voxels, voxel_size)
+            vs._members = (offsets, np.column_stack((branch_ids, point_ids))[order])
+            return vs
         else:
-            voxels = np.unique(np.concatenate(branch_vcs), axis=0)
+            voxels = np.unique(point_vcs, axis=0)
             return cls(voxels, voxel_size)
 
 
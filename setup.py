@@ -87,6 +87,9 @@ setuptools.setup(
             "version = bsb._options:version",
             "config = bsb._options:config",
             "profiling = bsb._options:profiling",
+            "scheduler = bsb._options:scheduler",
+            "processes = bsb._options:processes",
+            "morphology_cache = bsb._options:morphology_cache",
         ],
     },
     python_requires="~=3.8",
@@ -4,7 +4,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
 from bsb.core import Scaffold
 from bsb.config import from_json
-from bsb.storage import Chunk
+from bsb.storage import Chunk, chunk_batches
 from bsb.exceptions import *
 from bsb.unittest import get_config_path, skip_parallel, timeout, NumpyTestCase
 
@@ -107,3 +107,18 @@ class TestChunks(unittest.TestCase, NumpyTestCase):
                     Chunk.from_id(Chunk(coords, None).id, None),
                     "Chunks not bijective.",
                 )
+
+    def test_batches(self):
+        chunks = [Chunk(c, None) for c in np.ndindex(4, 4, 1)]
+        batches = chunk_batches(chunks, 4)
+        self.assertEqual([4, 4, 4, 4], [len(b) for b in batches], "batch sizes")
+        self.assertEqual(
+            sorted(chunks), sorted(c for b in batches for c in b), "chunks lost"
+        )
+        # Morton order groups the 2x2 blocks of the grid together
+        for batch in batches:
+            with self.subTest(batch=batch):
+                self.assertClose(1, np.ptp(np.array(batch), axis=0)[:2])
+        batches = chunk_batches(chunks + [Chunk([-1, -1, 0], None)], 5)
+        self.assertEqual([5, 5, 5, 2], [len(b) for b in batches], "batch sizes")
+        self.assertEqual(Chunk([-1, -1, 0], None), batches[0][0], "negative chunk")
@@ -2,6 +2,9 @@ from bsb.core import Scaffold
 from bsb.services import MPI
 from bsb.config import Configuration
 from bsb.morphologies import Morphology, Branch
+from bsb.storage import Chunk
+from bsb.connectivity import AllToAll
+from bsb.services.pool import JobPool
 from bsb.unittest import (
     NumpyTestCase,
     FixedPosConfigFixture,
@@ -11,7 +14,10 @@ from bsb.unittest import (
     skip_parallel,
 )
 import unittest
+from unittest import mock
 import numpy as np
+import os
+import tempfile
 from collections import defaultdict
 
 
@@ -54,6 +60,21 @@ class TestAllToAll(
                 self.assertClose(25, c)
         self.assertEqual(100 * 100, len(self.network.get_connectivity_set("all_to_all")))
 
+    def test_chunk_batches(self):
+        # Test that each chunk of a batch is only connected to its own region of interest.
+        strat = self.network.connectivity.all_to_all
+        strat.chunks_per_job = 4
+        with mock.patch.object(AllToAll, "get_region_of_interest", lambda s, c: [c]):
+            pool = JobPool(self.network)
+            strat.queue(pool)
+            self.assertEqual(1, len(pool._queue), "expected a single batch")
+            self.network.compile(clear=True)
+        cs = self.network.get_connectivity_set("all_to_all")
+        for lchunk, g_itr in cs.nested_iter_connections(direction="out"):
+            for gchunk, conns in g_itr:
+                self.assertEqual(lchunk.id, gchunk.id, "expected only own chunk targets")
+        self.assertEqual(4 * 25 * 25, len(cs), "expected all pairs within each chunk")
+
     def test_per_local(self):
         cs = self.network.get_connectivity_set("all_to_all")
         for lchunk in cs.get_local_chunks(direction="out"):
@@ -72,6 +93,32 @@ class TestAllToAll(
             self.assertClose(100, c, "expected 25 local sources per global cell")
         self.assertEqual(100 * 100, len(self.network.get_connectivity_set("all_to_all")))
 
+    def test_streamed_blocks(self):
+        self.network.connectivity.all_to_all.block_size = 333
+        self.network.compile(clear=True)
+        cs = self.network.get_connectivity_set("all_to_all")
+        self.assertEqual(100 * 100, len(cs), "blocks should add up to all pairs")
+        for lchunk in cs.get_local_chunks(direction="out"):
+            local_locs, gchunk_ids, global_locs = cs.load_local_connections("out", lchunk)
+            pairs = np.unique(
+                np.column_stack((gchunk_ids, local_locs[:, 0], global_locs[:, 0])), axis=0
+            )
+            self.assertEqual(2500, len(pairs), "expected each pair exactly once")
+
+    def test_blocks(self):
+        from bsb.connectivity.general import _all_to_all_blocks
+
+        blocks = list(_all_to_all_blocks(3, 4, 5))
+        self.assertEqual([5, 5, 2], [len(src) for src, _ in blocks])
+        self.assertEqual(np.int32, blocks[0][0].dtype, "expected int32 locations")
+        src = np.concatenate([src for src, _ in blocks])
+        dest = np.concatenate([dest for _, dest in blocks])
+        self.assertClose(np.repeat(np.arange(3), 4), src[:, 0])
+        self.assertClose(np.tile(np.arange(4), 3), dest[:, 0])
+        self.assertClose(-1, src[:, 1:])
+        self.assertClose(-1, dest[:, 1:])
+        self.assertEqual([], list(_all_to_all_blocks(0, 4, 5)))
+
 
 class TestConnectivitySet(
     FixedPosConfigFixture,
@@ -104,6 +151,49 @@ class TestConnectivitySet(
         self.assertEqual(10000, len(pre), "expected full 10k pre locs")
         self.assertEqual(10000, len(post), "expected full 10k post locs")
 
+    def test_load_all_offsets(self):
+        cs = self.network.get_connectivity_set("all_to_all")
+        pre, post = cs.load_connections().all()
+        blocks = list(cs.load_connections())
+        self.assertClose(np.concatenate([b[0] for b in blocks]), pre)
+        self.assertClose(np.concatenate([b[1] for b in blocks]), post)
+        pairs = np.unique(np.column_stack((pre[:, 0], post[:, 0])), axis=0)
+        self.assertEqual(10000, len(pairs), "expected all pairs of 100 cells")
+        self.assertClose([0, 99], [np.min(pre[:, 0]), np.max(pre[:, 0])])
+
+    def test_load_all_out(self):
+        cs = self.network.get_connectivity_set("all_to_all")
+        pre, post = cs.load_connections().all()
+        with tempfile.TemporaryDirectory() as d:
+            out = tuple(
+                np.lib.format.open_memmap(
+                    os.path.join(d, f"{n}.npy"), mode="w+", dtype=int, shape=(10000, 3)
+                )
+                for n in ("pre", "post")
+            )
+            result = cs.load_connections().incoming().all(out=out)
+            self.assertIs(out, result, "expected the output buffers to be returned")
+            self.assertClose(
+                np.unique(np.column_stack((pre, post)), axis=0),
+                np.unique(np.column_stack(out), axis=0),
+            )
+            del out, result
+        with self.assertRaises(ValueError):
+            cs.load_connections().all(out=(np.empty((5, 3)), np.empty((5, 3))))
+
+    def test_load_all_filtered(self):
+        cs = self.network.get_connectivity_set("all_to_all")
+        chunks = cs.get_local_chunks("out")
+        for itr in (
+            cs.load_connections().from_(chunks[0]),
+            cs.load_connections().to(chunks[0]),
+            cs.load_connections().from_(chunks[0]).to(chunks[-1]),
+        ):
+            pre, post = itr.all()
+            blocks = list(itr)
+            self.assertClose(np.concatenate([b[0] for b in blocks]), pre)
+            self.assertClose(np.concatenate([b[1] for b in blocks]), post)
+
     def test_load_local(self):
         cs = self.network.get_connectivity_set("all_to_all")
         chunks = cs.get_local_chunks("inc")
@@ -437,6 +527,59 @@ class TestConnWithSubCellLabels(
             )
 
 
+class TestBoxes(
+    MorphologiesFixture,
+    NetworkFixture,
+    FixedPosConfigFixture,
+    RandomStorageFixture,
+    NumpyTestCase,
+    unittest.TestCase,
+    engine_name="hdf5",
+    morpho_filters=["PurkinjeCell", "StellateCell"],
+):
+    def setUp(self):
+        super().setUp()
+        self.network.cell_types.test_cell.spatial.morphologies = [
+            {"names": self.network.morphologies.list()}
+        ]
+        self.network.placement.ch4_c25.distribute.rotations = dict(strategy="random")
+        self.network.compile(skip_connectivity=True)
+
+    def test_load_boxes(self):
+        ps = self.network.get_placement_set("test_cell")
+        boxes = ps.load_boxes()
+        self.assertEqual((100, 6), boxes.shape, "expected 1 box per cell")
+        mset = ps.load_morphologies()
+        for box, m, pos, rot in zip(
+            boxes, mset.iter_meta(), ps.load_positions(), ps.load_rotations()
+        ):
+            corners = np.array(
+                [
+                    [m[x][0], m[y][1], m[z][2]]
+                    for x in ("ldc", "mdc")
+                    for y in ("ldc", "mdc")
+                    for z in ("ldc", "mdc")
+                ]
+            )
+            rotated = rot.apply(corners)
+            self.assertClose(np.min(rotated, axis=0) + pos, box[:3], "wrong ldc")
+            self.assertClose(np.max(rotated, axis=0) + pos, box[3:], "wrong mdc")
+        self.assertClose(boxes, ps.load_boxes(cache=True), "cache miss differs")
+        self.assertClose(boxes, ps.load_boxes(cache=True), "cache hit differs")
+        chunk_ps = self.network.get_placement_set("test_cell", chunks=self.chunks[:1])
+        self.assertEqual(25, len(chunk_ps.load_boxes(cache=True)), "cached wrong chunks")
+        files = self.network.files
+        cached = [id for id in files.all() if id.startswith("bsb_boxes_test_cell_")]
+        self.assertEqual(2, len(cached), "expected 1 cache entry per chunk selection")
+        # Appending data doesn't touch the file store, placing cells does.
+        chunk_ps.append_data(self.chunks[0], np.zeros((1, 3)))
+        cached = [id for id in files.all() if id.startswith("bsb_boxes_test_cell_")]
+        self.assertEqual(2, len(cached), "writes should not touch the cached boxes")
+        self.network.run_placement()
+        cached = [id for id in files.all() if id.startswith("bsb_boxes_test_cell_")]
+        self.assertEqual([], cached, "cached boxes not invalidated")
+
+
 class TestVoxelIntersection(
     NetworkFixture,
     RandomStorageFixture,
@@ -558,6 +701,18 @@ class TestVoxelIntersection(
         ):
             self.fail("expected specific overlap")
 
+    def test_transform_voxels(self):
+        # Tests whether transforming the candidate voxels finds the same overlap.
+        self.network.connectivity.intersect.transform_voxels = True
+        self.network.compile()
+        cs = self.network.get_connectivity_set("intersect")
+        pre_chunks, pre_locs, post_chunks, post_locs = next(
+            cs.load_connections().chunk_iter()
+        )
+        self.assertEqual(2, len(pre_locs), "expected 2 connections")
+        self.assertClose([0, 1], pre_locs[:, 0], "expected cells 0 and 1 to connect")
+        self.assertClose(0, post_locs[:, 0], "expected cell 0 to be connected")
+
     def test_single_voxel_labelled(self):
         # Tests whether a morpho with labels is mapped back to the original points
         self.network.connectivity.intersect.presynaptic.morphology_labels = ["tip"]
@@ -634,3 +789,240 @@ class TestVoxelIntersection(
         self.network.compile(clear=True)
         conns = len(self.network.get_connectivity_set("intersect"))
         self.assertEqual(0, conns, "expected no contacts")
+
+    def test_seed(self):
+        # Tests whether seeded contact picking is reproducible.
+        self.network.connectivity.intersect.contacts = 10
+        self.network.connectivity.intersect.seed = 42
+
+        def load():
+            cs = self.network.get_connectivity_set("intersect")
+            return next(cs.load_connections().chunk_iter())
+
+        self.network.compile()
+        _, pre_locs, _, post_locs = load()
+        self.assertEqual(20, len(pre_locs), "expected 10 contacts per pair")
+        self.network.compile(clear=True)
+        _, new_pre_locs, _, new_post_locs = load()
+        self.assertClose(pre_locs, new_pre_locs, "seeded contacts should be repeatable")
+        self.assertClose(post_locs, new_post_locs, "seeded contacts should be repeatable")
+
+    def test_seed_distribution(self):
+        # Tests whether seeded contact numbers drawn from a distribution are reproducible.
+        self.network.connectivity.intersect.contacts = dict(
+            distribution="randint", low=1, high=100
+        )
+        self.network.connectivity.intersect.seed = 42
+
+        def load():
+            cs = self.network.get_connectivity_set("intersect")
+            return next(cs.load_connections().chunk_iter())
+
+        self.network.compile()
+        _, pre_locs, _, post_locs = load()
+        for _ in range(2):
+            self.network.compile(clear=True)
+            _, new_pre_locs, _, new_post_locs = load()
+            self.assertEqual(len(pre_locs), len(new_pre_locs), "contacts not repeatable")
+            self.assertClose(pre_locs, new_pre_locs, "contacts should be repeatable")
+            self.assertClose(post_locs, new_post_locs, "contacts should be repeatable")
+
+
+class TestTouchDetector(
+    NetworkFixture,
+    RandomStorageFixture,
+    NumpyTestCase,
+    unittest.TestCase,
+    engine_name="hdf5",
+):
+    def setUp(self):
+        self.cfg = Configuration.default(
+            cell_types=dict(
+                test_cell_A=dict(
+                    spatial=dict(radius=1, density=1, morphologies=[dict(names=["A"])])
+                ),
+                test_cell_B=dict(
+                    spatial=dict(radius=1, density=1, morphologies=[dict(names=["B"])])
+                ),
+            ),
+            placement=dict(
+                fixed_pos_A=dict(
+                    strategy="bsb.placement.FixedPositions",
+                    cell_types=["test_cell_A"],
+                    partitions=[],
+                    positions=[[0, 0, 0], [0, 0, 100], [50, 0, 0], [0, -100, 0]],
+                ),
+                fixed_pos_B=dict(
+                    strategy="bsb.placement.FixedPositions",
+                    cell_types=["test_cell_B"],
+                    partitions=[],
+                    positions=[[95, 0, 0]],
+                ),
+            ),
+        )
+        super().setUp()
+        self.network.connectivity.add(
+            "touch",
+            dict(
+                strategy="bsb.connectivity.TouchDetector",
+                presynaptic=dict(cell_types=["test_cell_A"]),
+                postsynaptic=dict(cell_types=["test_cell_B"]),
+                compartment_intersection_radius=6,
+            ),
+        )
+        if MPI.get_rank():
+            MPI.barrier()
+        else:
+            points = [[0, 0, 0], [0, 25, 25], [25, 0, 0], [50, 0, 0]]
+            self.network.morphologies.save("A", Morphology([Branch(points, [1] * 4)]))
+            points = [[0, 0, 0], [0, 25, 25], [-25, 0, 0], [-50, 0, 0]]
+            self.network.morphologies.save("B", Morphology([Branch(points, [1] * 4)]))
+            MPI.barrier()
+
+    def _load(self):
+        cs = self.network.get_connectivity_set("touch")
+        _, pre_locs, _, post_locs = next(cs.load_connections().chunk_iter())
+        order = np.lexsort(pre_locs.T[::-1])
+        return pre_locs[order], post_locs[order]
+
+    def test_touch(self):
+        self.network.compile()
+        pre_locs, post_locs = self._load()
+        self.assertEqual(2, len(pre_locs), "expected 1 contact per touching pair")
+        self.assertClose([[0, 0, 3], [0, 0, 3]], [pre_locs[0], post_locs[0]])
+        self.assertEqual(1, pre_locs[1, 0], "expected cell 1 to touch")
+
+    def test_contacts(self):
+        self.network.connectivity.touch.contacts = 10
+        self.network.compile()
+        pre_locs, post_locs = self._load()
+        self.assertEqual(4, len(pre_locs), "expected all 4 touching points")
+        self.assertClose([[0, 0, 3], [1, 0, 0], [1, 0, 2], [1, 0, 3]], pre_locs)
+        self.assertClose([[0, 0, 3], [0, 0, 3], [0, 0, 2], [0, 0, 0]], post_locs)
+
+    def test_seed(self):
+        # Tests whether seeded contacts are picked the same way on every compilation.
+        self.network.connectivity.touch.contacts = dict(
+            distribution="randint", low=1, high=4
+        )
+        self.network.connectivity.touch.seed = 42
+        self.network.compile()
+        pre_locs, post_locs = self._load()
+        for _ in range(3):
+            self.network.compile(clear=True)
+            new_pre_locs, new_post_locs = self._load()
+            self.assertClose(
+                pre_locs, new_pre_locs, "seeded contacts should be repeatable"
+            )
+            self.assertClose(
+                post_locs, new_post_locs, "seeded contacts should be repeatable"
+            )
+
+    def test_region_of_interest(self):
+        self.network.compile(skip_connectivity=True)
+        strat = self.network.connectivity.touch
+        size = self.network.network.chunk_size
+        roi = strat.get_region_of_interest(Chunk([0, 0, 0], size))
+        self.assertClose([[0, 0, 0]], roi, "expected the chunk of cell B")
+        self.assertEqual([], strat.get_region_of_interest(Chunk([0, -1, 0], size)))
+        self.assertEqual([], strat.get_region_of_interest(Chunk([0, 0, 1], size)))
+        self.assertEqual([], strat.get_region_of_interest(Chunk([-2, 0, 0], size)))
+
+
+class TestFiberIntersection(
+    NetworkFixture,
+    RandomStorageFixture,
+    NumpyTestCase,
+    unittest.TestCase,
+    engine_name="hdf5",
+):
+    def setUp(self):
+        self.cfg = Configuration.default(
+            cell_types=dict(
+                test_cell_A=dict(
+                    spatial=dict(radius=1, density=1, morphologies=[dict(names=["A"])])
+                ),
+                test_cell_B=dict(
+                    spatial=dict(radius=1, density=1, morphologies=[dict(names=["B"])])
+                ),
+            ),
+            placement=dict(
+                fixed_pos_A=dict(
+                    strategy="bsb.placement.FixedPositions",
+                    cell_types=["test_cell_A"],
+                    partitions=[],
+                    positions=[[0, 0, 0], [0, 0, 100]],
+                ),
+                fixed_pos_B=dict(
+                    strategy="bsb.placement.FixedPositions",
+                    cell_types=["test_cell_B"],
+                    partitions=[],
+                    positions=[[70, 0, 0]],
+                ),
+            ),
+        )
+        super().setUp()
+        self.network.connectivity.add(
+            "fiber",
+            dict(
+                strategy="bsb.connectivity.FiberIntersection",
+                presynaptic=dict(cell_types=["test_cell_A"]),
+                postsynaptic=dict(cell_types=["test_cell_B"]),
+                resolution=10,
+                voxels_post=8,
+            ),
+        )
+        if MPI.get_rank():
+            MPI.barrier()
+        else:
+            # A straight fiber along the X axis, with a single long compartment.
+            points = [[0, 0, 0], [100, 0, 0]]
+            self.network.morphologies.save("A", Morphology([Branch(points, [1] * 2)]))
+            points = [[-5, -5, -5], [0, 0, 0], [5, 5, 5]]
+            self.network.morphologies.save("B", Morphology([Branch(points, [1] * 3)]))
+            MPI.barrier()
+
+    def _load(self):
+        cs = self.network.get_connectivity_set("fiber")
+        _, pre_locs, _, post_locs = next(cs.load_connections().chunk_iter())
+        return pre_locs, post_locs
+
+    def test_intersection(self):
+        self.network.compile()
+        pre_locs, post_locs = self._load()
+        self.assertEqual(1, len(pre_locs), "expected 1 contact")
+        self.assertClose([0, 0, 0], pre_locs[0], "expected first fiber compartment")
+        self.assertEqual(0, post_locs[0, 0])
+        self.assertEqual(0, post_locs[0, 1])
+
+    def test_contacts(self):
+        self.network.connectivity.fiber.contacts = 5
+        self.network.compile()
+        pre_locs, post_locs = self._load()
+        self.assertEqual(5, len(pre_locs), "expected 5 contacts")
+        self.assertTrue(np.all(pre_locs[:, 0] == 0), "only fiber 0 crosses cell B")
+
+    def test_seed(self):
+        # Tests whether seeded contacts are picked the same way on every compilation.
+        self.network.connectivity.fiber.contacts = dict(
+            distribution="randint", low=1, high=20
+        )
+        self.network.connectivity.fiber.seed = 42
+        self.network.compile()
+        pre_locs, post_locs = self._load()
+        for _ in range(3):
+            self.network.compile(clear=True)
+            new_pre_locs, new_post_locs = self._load()
+            self.assertEqual(len(pre_locs), len(new_pre_locs), "contacts not repeatable")
+            self.assertClose(
+                pre_locs, new_pre_locs, "seeded contacts should be repeatable"
+            )
+            self.assertClose(
+                post_locs, new_post_locs, "seeded contacts should be repeatable"
+            )
+
+    def test_affinity(self):
+        self.network.connectivity.fiber.affinity = 0
+        self.network.compile()
+        names = [cs.tag for cs in self.network.get_connectivity_sets()]
+        self.assertNotIn("fiber", names, "expected no connections at 0 affinity")
@@ -1,4 +1,8 @@
 import unittest, os, sys, numpy as np, h5py
+import io
+import pathlib
+import tempfile
+from unittest import mock
 import json
 import itertools
 
@@ -8,7 +12,12 @@ from bsb._encoding import EncodedLabels
 from bsb.storage import Storage
 from bsb.storage.interfaces import StoredMorphology
 from bsb.exceptions import *
-from bsb.unittest import get_morphology_path, NumpyTestCase
+from bsb.unittest import (
+    get_morphology_path,
+    NumpyTestCase,
+    RandomStorageFixture,
+    skip_parallel,
+)
 from scipy.spatial.transform import Rotation
 
 
@@ -35,6 +44,26 @@ class TestIO(NumpyTestCase, unittest.TestCase):
         self.assertEqual(3, len(m.branches), "Expected 3 branches on the morphology")
         self.assertEqual(1, len(m.roots), "Expected 1 root on the morphology")
 
+    def test_swc_unordered(self):
+        # Irregular sample IDs, listed before their parents.
+        swc = "# comment\n8 3 2 0 0 1 4\n4 1 0 0 0 1 -1\n6 3 1 0 0 1 4\n7 2 3 0 0 1 4\n"
+        m = Morphology.from_swc(io.StringIO(swc))
+        self.assertEqual(4, len(m.branches), "Expected 4 branches on the morphology")
+        self.assertEqual(1, len(m.roots), "Expected 1 root on the morphology")
+        children = m.roots[0].children
+        self.assertEqual(3, len(children), "Expected 3 child branches")
+        self.assertClose([[0, 0, 0], [2, 0, 0]], children[0].points, "sample order")
+        self.assertClose([[0, 0, 0], [1, 0, 0]], children[1].points, "sample order")
+        self.assertClose([1, 3, 3, 3, 3, 2, 2], m.tags, "parent tags should be copied")
+
+    def test_swc_errors(self):
+        with self.assertRaises(ValueError, msg="missing column should error"):
+            Morphology.from_swc(io.StringIO("1 1 0 0 0 1\n"))
+        with self.assertRaises(ValueError, msg="unknown parent should error"):
+            Morphology.from_swc(io.StringIO("1 1 0 0 0 1 -1\n2 1 0 0 0 1 5\n"))
+        with self.assertRaises(ValueError, msg="cycle should error"):
+            Morphology.from_swc(io.StringIO("1 1 0 0 0 1 2\n2 1 0 0 0 1 1\n"))
+
     def test_known(self):
         # TODO: Check the morphos visually with glover
         m = Morphology.from_swc(get_morphology_path("PurkinjeCell.swc"))
@@ -94,6 +123,92 @@ class TestIO(NumpyTestCase, unittest.TestCase):
             m.to_graph_array()
 
 
+class TestMorphologyRepository(
+    RandomStorageFixture, NumpyTestCase, unittest.TestCase, engine_name="hdf5"
+):
+    @skip_parallel
+    def test_import_swcs(self):
+        names = ["PurkinjeCell", "StellateCell", "2root"]
+        files = [get_morphology_path(f"{name}.swc") for name in names]
+        for processes in (1, 2):
+            with self.subTest(processes=processes):
+                stored = self.storage.morphologies.import_swcs(
+                    files, overwrite=True, processes=processes
+                )
+                self.assertEqual(names, [loader.name for loader in stored])
+                for name, file in zip(names, files):
+                    m = self.storage.morphologies.load(name)
+                    self.assertClose(Morphology.from_swc(file).points, m.points)
+
+    @skip_parallel
+    def test_mapped_load(self):
+        branches = [
+            Branch(
+                np.random.random((n, 3)),
+                np.ones(n),
+                EncodedLabels.none(n),
+                {"extra": np.arange(n)},
+            )
+            for n in (5, 4, 2)
+        ]
+        branches[0].attach_child(branches[1])
+        branches[0].attach_child(branches[2])
+        m = Morphology(branches[:1])
+        m.label(["dendrites"], [0, 1])
+        stored = self.storage.morphologies.save("mapped", m, overwrite=True)
+        with tempfile.TemporaryDirectory() as dir:
+            mapped = stored.mapped_load(dir)
+            self.assertTrue(mapped._check_shared(), "mapped buffers should be shared")
+            self.assertIsInstance(mapped._shared._points.base, np.memmap)
+            self.assertClose(m.points, mapped.points)
+            self.assertClose(m.radii, mapped.radii)
+            self.assertClose(m.extra, mapped.extra)
+            self.assertEqual(m.labels.labels, mapped.labels.labels)
+            self.assertEqual(
+                [len(b) for b in m.branches], [len(b) for b in mapped.branches]
+            )
+            self.assertEqual(1, len(os.listdir(dir)), "expected 1 cached morphology")
+            # Changes are copy-on-write and private to the instance.
+            mapped.translate([1, 0, 0])
+            self.assertClose(m.points, stored.mapped_load(dir).points)
+
+    @skip_parallel
+    def test_mapped_invalidation(self):
+        m = Morphology([Branch(np.random.random((5, 3)), np.ones(5))])
+        repo = self.storage.morphologies
+        repo.save("inval", m, overwrite=True)
+        with tempfile.TemporaryDirectory() as dir, mock.patch(
+            "bsb.storage._mapped.get_cache_dir", return_value=pathlib.Path(dir)
+        ):
+            self.assertClose(1, repo.preload("inval").mapped_load().radii)
+            # Same points, so same bounds, but different radii.
+            m.radii[:] = 2
+            repo.save("inval", m, overwrite=True)
+            self.assertClose(2, repo.preload("inval").mapped_load().radii)
+            repo.remove("inval")
+            self.assertEqual([], os.listdir(dir), "cache entry not invalidated")
+
+    @skip_parallel
+    def test_mapped_version(self):
+        m = Morphology([Branch(np.random.random((5, 3)), np.ones(5))])
+        stored = self.storage.morphologies.save("version", m, overwrite=True)
+        with tempfile.TemporaryDirectory() as dir:
+            stored.mapped_load(dir)
+            (entry,) = os.listdir(dir)
+            versions = os.listdir(os.path.join(dir, entry))
+            # Unrelated writes to the storage should keep using the same cache entry.
+            self.storage.files.store("unrelated")
+            os.utime(stored.source, ns=(0, 0))
+            self.storage.morphologies.preload("version").mapped_load(dir)
+            self.assertEqual(versions, os.listdir(os.path.join(dir, entry)))
+            # A morphology with other metadata replaces the old entry.
+            meta = {**stored.get_meta(), "changed": True}
+            StoredMorphology("version", stored.load, meta, stored.source).mapped_load(dir)
+            new_versions = os.listdir(os.path.join(dir, entry))
+            self.assertEqual(1, len(new_versions), "older version not removed")
+            self.assertNotEqual(versions, new_versions, "expected a new version")
+
+
 def _branch(len=3):
     return Branch(np.ones((len, 3)), np.ones(len), EncodedLabels.none(len), {})
 
@@ -307,6 +422,21 @@ class TestMorphologyLabels(NumpyTestCase, unittest.TestCase):
         a.label(["goodbye"], [*range(10)])
         self.assertClose([2] * 10, a)
 
+    def test_label_transitions(self):
+        labels = {0: set(), 1: {"b"}, 2: {"a"}}
+        a = EncodedLabels(6, buffer=np.array([2, 0, 2, 1, 0, 1]), labels=labels)
+        # New labelsets are numbered in order of appearance of the values they come from.
+        a.label(["c"], np.array([True, True, True, False, False, False]))
+        self.assertEqual({"a", "c"}, a.labels[3])
+        self.assertEqual({"c"}, a.labels[4])
+        self.assertClose([3, 4, 3, 1, 0, 1], a)
+        a.label(["b"], [4, 4, 5, 4])
+        self.assertClose([3, 4, 3, 1, 1, 1], a, "existing labelset should be reused")
+        self.assertEqual(5, len(a.labels))
+        self.assertEqual(1, a.index_of(["b"]))
+        with self.assertRaises(IndexError):
+            a.index_of(["d"])
+
     def test_branch_labels(self):
         b = Branch([[0] * 3] * 10, [1] * 10)
         a = b._labels
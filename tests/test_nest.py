@@ -469,3 +469,52 @@ class TestDeviceProtocol(unittest.TestCase):
         self.assertEqual(1, len(adapter.result.recorders))
         adapter.simulate(simulator)
         adapter.collect_output()
+
+
+class TestIdentifierMap(unittest.TestCase):
+    def test_contiguous(self):
+        from bsb.simulators.nest.cell import IdentifierMap
+
+        id_map = IdentifierMap(range(10, 20), range(1, 11))
+        self.assertEqual(1, len(id_map._to_nest[0]), "expected a single run")
+        self.assertEqual([1, 5, 10], id_map.to_nest([10, 14, 19]).tolist())
+        self.assertEqual([19, 10], id_map.to_scaffold([10, 1]).tolist())
+        with self.assertRaises(KeyError):
+            id_map.to_nest([20])
+        with self.assertRaises(KeyError):
+            id_map.to_scaffold([0])
+
+    def test_concatenate(self):
+        from bsb.simulators.nest.cell import IdentifierMap
+
+        a = IdentifierMap([5, 3, 4, 9], [11, 12, 13, 14])
+        b = IdentifierMap(range(0, 3), range(1, 4))
+        id_map = IdentifierMap.concatenate(a, b)
+        self.assertEqual(7, len(id_map))
+        scaffold_ids = [0, 1, 2, 3, 4, 5, 9]
+        nest_ids = [1, 2, 3, 12, 13, 11, 14]
+        self.assertEqual(nest_ids, id_map.to_nest(scaffold_ids).tolist())
+        self.assertEqual(scaffold_ids, id_map.to_scaffold(nest_ids).tolist())
+        with self.assertRaises(KeyError):
+            id_map.to_nest([6])
+        self.assertEqual(0, len(IdentifierMap().to_nest([])))
+
+    def test_concatenate_none(self):
+        from bsb.simulators.nest.cell import IdentifierMap
+
+        id_map = IdentifierMap.concatenate()
+        self.assertEqual(0, len(id_map))
+        with self.assertRaises(KeyError):
+            id_map.to_nest([0])
+
+    def test_concatenate_overlap(self):
+        from bsb.simulators.nest.cell import IdentifierMap
+
+        a = IdentifierMap([1, 2, 3], [10, 11, 12])
+        b = IdentifierMap([2], [50])
+        id_map = IdentifierMap.concatenate(a, b)
+        self.assertEqual(3, len(id_map))
+        self.assertEqual([10, 50, 12], id_map.to_nest([1, 2, 3]).tolist())
+        self.assertEqual([1, 2, 2, 3], id_map.to_scaffold([10, 11, 50, 12]).tolist())
+        id_map = IdentifierMap.concatenate(b, a)
+        self.assertEqual([10, 11, 12], id_map.to_nest([1, 2, 3]).tolist())
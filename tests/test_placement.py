@@ -1,6 +1,6 @@
-import unittest, os, sys, numpy as np, h5py
+import unittest, os, sys, tempfile, numpy as np, h5py
 
-from bsb import config
+from bsb import config, options
 from bsb.connectivity import ConnectionStrategy
 from bsb.mixins import NotParallel
 
@@ -15,7 +15,8 @@ from bsb.voxels import VoxelSet, VoxelData
 from bsb.exceptions import *
 from bsb.storage import Chunk
 from bsb.placement import PlacementStrategy, RandomPlacement
-from bsb.services.pool import JobPool, FakeFuture, create_job_pool
+from bsb.placement.particle import ParticleSystem
+from bsb.services.pool import JobPool, JobCostModel, FakeFuture, create_job_pool
 from bsb.unittest import get_config_path, timeout, RandomStorageFixture, NumpyTestCase
 from time import sleep
 
@@ -29,6 +30,12 @@ def test_chunk(scaffold, chunk):
     return chunk
 
 
+def _log_job(scaffold, path, i, y):
+    sleep(y)
+    with open(path, "a") as f:
+        f.write(f"{i}\n")
+
+
 class PlacementDud(PlacementStrategy):
     name = "dud"
 
@@ -157,6 +164,46 @@ class SchedulerBaseTest:
         job = pool.queue_chunk(test_chunk, _chunk(0, 0, 0))
         pool.execute()
 
+    def test_dependency_order(self):
+        # The jobs may run on other processes, so they record their order in a file.
+        path = self._log_path()
+        pool = JobPool(_net)
+        dep = pool.queue(_log_job, (path, 1, 0.1))
+        pool.queue(_log_job, (path, 2, 0), deps=[dep])
+        pool.execute()
+        self.assertEqual([1, 2], self._read_log(path))
+
+    def test_cost_scheduler(self):
+        path = self._log_path()
+        pool = JobPool(_net, scheduler="cost")
+        jobs = [pool.queue(_log_job, (path, i, 0)) for i in range(3)]
+        for i, job in enumerate(jobs):
+            job.estimate_cost = lambda i=i: i
+        pool.execute()
+        order = self._read_log(path)
+        if MPI.get_size() > 2:
+            # Several workers run the jobs concurrently, so they may finish in any order.
+            order = sorted(order, reverse=True)
+        self.assertEqual([2, 1, 0], order, "expensive jobs should run first")
+        stored = _net.files.find_id(JobCostModel.file_id)
+        self.assertIsNotNone(stored, "cost model not stored")
+
+    def _log_path(self):
+        path = None
+        if not MPI.get_rank():
+            fd, path = tempfile.mkstemp()
+            os.close(fd)
+        return MPI.bcast(path)
+
+    def _read_log(self, path):
+        MPI.barrier()
+        with open(path, "r") as f:
+            order = [int(line) for line in f]
+        MPI.barrier()
+        if not MPI.get_rank():
+            os.remove(path)
+        return order
+
     def test_notparallel_ps_job(test):
         spy = 0
 
@@ -279,6 +326,42 @@ class TestPlacementStrategies(
         ps = network.get_placement_set("test_cell")
         self.assertEqual(40, len(ps), "fixed count random placement broken")
 
+    @unittest.skipIf(MPI.get_size() > 1, "Process pools are only used without MPI.")
+    def test_process_pool(self):
+        cfg = from_json(get_config_path("test_single.json"))
+        network = Scaffold(cfg, self.storage)
+        cfg.placement["test_placement"] = dict(
+            strategy="bsb.placement.RandomPlacement",
+            cell_types=["test_cell"],
+            partitions=["test_layer"],
+        )
+        options.processes = 2
+        try:
+            network.compile(clear=True)
+        finally:
+            del options.processes
+        ps = network.get_placement_set("test_cell")
+        self.assertEqual(40, len(ps), "process pool placement broken")
+
+    def test_chunk_batches(self):
+        cfg = from_json(get_config_path("test_single.json"))
+        network = Scaffold(cfg, self.storage)
+        cfg.placement["test_placement"] = dict(
+            strategy="bsb.placement.RandomPlacement",
+            cell_types=["test_cell"],
+            partitions=["test_layer"],
+            chunks_per_job=3,
+        )
+        cfg.network.chunk_size = 50
+        n_chunks = len(cfg.partitions.test_layer.to_chunks(cfg.network.chunk_size))
+        pool = JobPool(network)
+        network.placement.test_placement.queue(pool, network.network.chunk_size)
+        self.assertEqual(np.ceil(n_chunks / 3), len(pool._queue), "expected batches")
+        network.compile(clear=True)
+        ps = network.get_placement_set("test_cell")
+        # Smaller chunks round the cell count per chunk, so allow some slack
+        self.assertAlmostEqual(40, len(ps), delta=10, msg="batched placement broken")
+
     def test_fixed_pos(self):
         cfg = Configuration.default(
             cell_types=dict(test_cell=dict(spatial=dict(radius=2, count=100))),
@@ -355,6 +438,33 @@ class TestVoxelDensities(unittest.TestCase):
         self.assertLess(len(ps), 130)
 
 
+class TestParticleSystem(unittest.TestCase):
+    def test_solve_collisions(self):
+        vs = VoxelSet([[0, 0, 0], [0, 0, 1], [1, 0, 0]], 50)
+        system = ParticleSystem(track_displaced=True)
+        system.fill(
+            vs,
+            [
+                dict(name="a", radius=2, count=np.array(300)),
+                dict(name="b", radius=4, count=np.array([20, 10, 0])),
+            ],
+        )
+        self.assertEqual(330, len(system), "particles missing")
+        self.assertEqual(30, np.sum(system.types == 1), "particles of wrong type")
+        self.assertGreater(len(system.find_colliding_particles()), 0, "no collisions")
+        system.solve_collisions()
+        self.assertEqual(0, len(system.find_colliding_particles()), "collisions left")
+        dist = np.linalg.norm(
+            system.positions[:, np.newaxis] - system.positions[np.newaxis], axis=2
+        )
+        overlap = dist < system.radii[:, np.newaxis] + system.radii[np.newaxis] - 1e-6
+        self.assertEqual(len(system), np.count_nonzero(overlap), "only self overlap")
+        pruned, per_type = system.prune(at_risk_particles=system.displaced_particles)
+        self.assertEqual(pruned, sum(per_type.values()), "pruned count mismatch")
+        self.assertEqual(330 - pruned, len(system), "pruned wrong number")
+        self.assertTrue(np.all(system.inside(system.positions)), "particles outside")
+
+
 class VoxelParticleTest(Partition, classmap_entry="test"):
     vs = VoxelSet(
         [
@@ -6,6 +6,9 @@ from bsb.exceptions import (
     MissingMorphologyError,
 )
 from bsb.postprocessing import SpoofDetails
+from bsb.config import Configuration
+from bsb.services.pool import create_job_pool
+from bsb.unittest import NetworkFixture, RandomStorageFixture
 
 
 def relative_to_tests_folder(path):
@@ -81,3 +84,53 @@ class TestPostProcessing(unittest.TestCase):
             MorphologyError, msg="Did not catch double relay spoofing!"
         ):
             sd.after_connectivity()
+
+
+class TestAfterPlacementHooks(
+    NetworkFixture, RandomStorageFixture, unittest.TestCase, engine_name="hdf5"
+):
+    def setUp(self):
+        self.cfg = Configuration.default(
+            cell_types=dict(dcn_cell=dict(spatial=dict(radius=1, density=1))),
+            placement=dict(
+                fixed_pos=dict(
+                    strategy="bsb.placement.FixedPositions",
+                    cell_types=["dcn_cell"],
+                    partitions=[],
+                    positions=[[0, 0, 0], [150, 0, 10], [0, 150, 20], [10, 20, 30]],
+                )
+            ),
+            after_placement=dict(
+                dcn_rotations=dict(strategy="bsb.postprocessing.DCNRotations"),
+                microzones=dict(
+                    strategy="bsb.postprocessing.LabelMicrozones", targets=["dcn_cell"]
+                ),
+            ),
+        )
+        super().setUp()
+
+    def test_chunked_hook(self):
+        self.network.compile(skip_connectivity=True)
+        ps = self.network.get_placement_set("dcn_cell")
+        coeff = ps.load_additional("dcn_orientations")
+        self.assertEqual((4, 4), coeff.shape, "expected planar coefficients per cell")
+        # Each cell lies in its plane: ax + by + cz + d = 0
+        plane = np.sum(coeff[:, :3] * ps.load_positions(), axis=1) + coeff[:, 3]
+        self.assertTrue(np.allclose(plane, 0), "expected cells in their plane")
+
+    def test_whole_network_hook(self):
+        self.network.compile(skip_connectivity=True)
+        ps = self.network.get_placement_set("dcn_cell")
+        pos = len(ps.get_labelled(["microzone-positive"]))
+        neg = len(ps.get_labelled(["microzone-negative"]))
+        self.assertEqual(4, pos + neg, "expected every cell in a microzone")
+        self.assertEqual(2, neg, "expected half of the cells below the median")
+
+    def test_queue(self):
+        hooks = self.network.after_placement
+        self.network.compile(skip_connectivity=True, skip_after_placement=True)
+        pool = create_job_pool(self.network)
+        chunked = hooks.dcn_rotations.queue(pool, "after_placement")
+        self.assertEqual(3, len(chunked), "expected 1 job per occupied chunk")
+        whole = hooks.microzones.queue(pool, "after_placement", deps=chunked)
+        self.assertEqual(1, len(whole), "expected 1 job for the whole network")
@@ -1,6 +1,12 @@
 from bsb.core import Scaffold
 from bsb.services import MPI
 from bsb.config import Configuration
+from bsb.simulation.results import (
+    SimulationResult,
+    ResultWriter,
+    _merge_shards,
+    _shard_path,
+)
 from bsb.morphologies import Morphology, Branch
 from bsb.unittest import (
     NumpyTestCase,
@@ -12,6 +18,10 @@ from bsb.unittest import (
 )
 import unittest
 import numpy as np
+import h5py
+import quantities as pq
+import os
+import tempfile
 from collections import defaultdict
 
 
@@ -46,3 +56,164 @@ class TestSimulate(
             devices=dict(),
         )
         self.network.run_simulation("test")
+
+    def _run_flushed(self, **kwargs):
+        from bsb.simulation import get_simulation_adapter
+
+        self.network.simulations.add(
+            "test",
+            simulator="neuron",
+            duration=10,
+            temperature=32,
+            flush_interval=4,
+            cell_models=dict(),
+            connection_models=dict(),
+            devices=dict(),
+            **kwargs,
+        )
+        simulation = self.network.simulations.test
+        adapter = get_simulation_adapter("neuron")
+        data = adapter.prepare(simulation)
+        section = adapter.engine.Section()
+        data.result.record(section(0.5)._ref_v, name="soma")
+        adapter.run(simulation)
+        result = adapter.collect(simulation, data)
+        self.addCleanup(os.remove, result.path)
+        with h5py.File(result.path, "r") as f:
+            d = f["rank_0/analogsignals/0"]
+            self.assertEqual((11, 1), d.shape, "not drained")
+            self.assertClose(-65, d[()], "wrong data drained")
+            self.assertEqual("soma", d.attrs["name"])
+        return result
+
+    @skip_parallel
+    def test_flush_interval(self):
+        result = self._run_flushed()
+        self.assertEqual(0, len(result.block.segments), "drained segments kept in RAM")
+
+    @skip_parallel
+    def test_flush_interval_tail(self):
+        result = self._run_flushed(tail=1)
+        self.assertEqual(1, len(result.block.segments), "tail not kept")
+        signal = result.block.segments[0].analogsignals[0]
+        self.assertEqual(2, len(signal), "last window not flushed")
+        self.assertEqual(9, float(signal.t_start), "window start not tracked")
+
+
+class _Recorder:
+    def __init__(self, path, data, meta=None):
+        self._path, self._data, self._meta = path, data, meta or {}
+
+    def get_path(self):
+        return self._path
+
+    def get_data(self):
+        return self._data
+
+    def get_meta(self):
+        return self._meta
+
+
+class _FlushRecorder:
+    def __init__(self, value, fail=0):
+        self._value, self._fail = value, fail
+
+    def flush(self, segment):
+        from neo import AnalogSignal
+
+        if self._fail:
+            self._fail -= 1
+            raise RuntimeError("Recorder failure")
+        segment.analogsignals.append(
+            AnalogSignal(np.full(2, self._value), units="mV", sampling_period=1 * pq.ms)
+        )
+
+
+class _Simulation:
+    name = "test"
+
+    def __tree__(self):
+        return {}
+
+
+class _Result:
+    def __init__(self, *recorders):
+        self.recorders = list(recorders)
+
+    def safe_collect(self):
+        for r in self.recorders:
+            yield r.get_path(), r.get_data(), r.get_meta()
+
+
+@skip_parallel
+class TestResultWriter(NumpyTestCase, unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "results.hdf5")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_append(self):
+        with ResultWriter(self.path, attrs={"config": "{}"}, block_rows=4) as writer:
+            writer.append("a/b", np.ones((3, 2)), {"unit": "mV"})
+            writer.append("a/b", np.zeros((5, 2)))
+        with h5py.File(self.path, "r") as f:
+            self.assertEqual("{}", f.attrs["config"], "file attrs not written")
+            d = f["a/b"]
+            self.assertEqual((8, 2), d.shape, "appended data not resized")
+            self.assertEqual((None, 2), d.maxshape, "dataset not resizable")
+            self.assertEqual((3, 2), d.chunks, "dataset not chunked")
+            self.assertEqual("mV", d.attrs["unit"], "meta not written")
+            self.assertClose(np.concatenate((np.ones((3, 2)), np.zeros((5, 2)))), d[()])
+
+    def test_append_mismatch(self):
+        with ResultWriter(self.path) as writer:
+            writer.append("a", np.ones((3, 2)))
+            with self.assertRaises(ValueError):
+                writer.append("a", np.ones((3, 3)))
+
+    def test_write(self):
+        result = _Result(
+            _Recorder(("cells", 0), np.arange(4), {"cell": 0}),
+            _Recorder(("cells", 1), [1, 2]),
+        )
+        with ResultWriter(self.path) as writer:
+            writer.write(result)
+            with self.assertWarns(Warning):
+                writer.write(_Result(_Recorder(("cells", 1), [1, 2])))
+            writer.write(result)
+        with h5py.File(self.path, "r") as f:
+            self.assertEqual(["0"], list(f["cells"].keys()), "bad data written")
+            self.assertClose(np.tile(np.arange(4), 2), f["cells/0"][()])
+            self.assertEqual(0, f["cells/0"].attrs["cell"])
+
+    def test_drain_owners(self):
+        # The signals of a recorder should be drained into its own dataset, even when an
+        # earlier recorder errors out.
+        result = SimulationResult(_Simulation())
+        result.add(_FlushRecorder(1, fail=1))
+        result.add(_FlushRecorder(2))
+        result.stream(self.path)
+        with self.assertWarns(Warning):
+            result.flush()
+        result.flush()
+        result.close()
+        with h5py.File(self.path, "r") as f:
+            self.assertClose([1, 1], f["rank_0/analogsignals/0"][()])
+            self.assertClose([2, 2, 2, 2], f["rank_0/analogsignals/1"][()])
+
+    def test_merge_shards(self):
+        shards = [_shard_path(self.path, r) for r in range(3)]
+        for r, shard in enumerate(shards):
+            with h5py.File(shard, "w") as f:
+                f.create_dataset("spikes", data=np.full((r + 1, 2), r))
+                f.create_dataset(f"rank{r}", data=[r])
+        _merge_shards(self.path, shards, {"config": "{}"}, block_rows=2)
+        for shard in shards:
+            self.assertFalse(os.path.exists(shard), "shard not removed")
+        with h5py.File(self.path, "r") as f:
+            self.assertEqual("{}", f.attrs["config"])
+            self.assertClose([0, 1, 1, 2, 2, 2], f["spikes"][:, 0], "bad rank order")
+            for r in range(3):
+                self.assertClose([r], f[f"rank{r}"][()])
@@ -1,5 +1,62 @@
+import os
+import tempfile
 import unittest
+import unittest.mock
+
+import nrrd
+import numpy as np
+
+from bsb.storage import NrrdDependencyNode
 
 
 class TestUtil(unittest.TestCase):
     pass
+
+
+class TestNrrdDependency(unittest.TestCase):
+    def test_cached_data(self):
+        data = np.random.default_rng(0).random((3, 4, 5, 6)).astype(np.float32)
+        with tempfile.TemporaryDirectory() as dir:
+            for encoding in ("raw", "gzip"):
+                with self.subTest(encoding=encoding):
+                    path = os.path.join(dir, f"{encoding}.nrrd")
+                    nrrd.write(path, data, {"encoding": encoding})
+                    node = NrrdDependencyNode(path)
+                    cached = node.get_data(cache=True)
+                    self.assertTrue(np.array_equal(data, cached))
+                    self.assertFalse(cached.flags.writeable, "cache must be read-only")
+                    self.assertIs(cached, node.get_data(cache=True))
+                    self.assertIsNot(cached, node.get_data())
+                    self.assertEqual(encoding == "raw", isinstance(cached, np.memmap))
+
+    def test_streamed_types(self):
+        from bsb.storage._files import _iter_nrrd_slabs
+
+        rng = np.random.default_rng(0)
+        with tempfile.TemporaryDirectory() as dir:
+            for dtype in ("<i2", ">u4", ">f8", "u1", "<i8"):
+                with self.subTest(dtype=dtype):
+                    data = (rng.random((3, 4, 5)) * 100).astype(dtype)
+                    path = os.path.join(dir, "data.nrrd")
+                    nrrd.write(path, data, {"encoding": "raw"})
+                    slabs = [slab for _, slab in _iter_nrrd_slabs(path, 2)]
+                    self.assertTrue(np.array_equal(data, np.concatenate(slabs, axis=2)))
+                    cached = NrrdDependencyNode(path).get_data(cache=True)
+                    self.assertEqual(np.dtype(dtype), cached.dtype)
+                    self.assertTrue(np.array_equal(data, cached))
+
+    def test_pipeline_uncached(self):
+        data = np.ones((2, 2, 2))
+        with tempfile.TemporaryDirectory() as dir:
+            path = os.path.join(dir, "data.nrrd")
+            nrrd.write(path, data, {"encoding": "raw"})
+            node = NrrdDependencyNode(file=path)
+            self.assertIs(node.get_data(cache=True), node.load_object(cache=True))
+            # Pipeline steps may modify the data in place, so they don't get cached data.
+            node.pipeline = ["numpy.copy"]
+            with unittest.mock.patch.object(
+                NrrdDependencyNode, "pipe", lambda self, data: data
+            ):
+                loaded = node.load_object(cache=True)
+            self.assertIsNot(node.get_data(cache=True), loaded)
+            self.assertTrue(loaded.flags.writeable)
@@ -1,7 +1,10 @@
 from bsb import topology
 from bsb.config import Configuration
 from bsb.exceptions import *
-import unittest, numpy as np
+from bsb.storage import Chunk
+from bsb.unittest import get_data_path, NumpyTestCase
+import bsb.topology.partition
+import unittest, unittest.mock, numpy as np, os, pathlib, tempfile
 
 
 def single_layer():
@@ -86,3 +89,107 @@ class TestAllenVoxels(unittest.TestCase):
                 transform = getattr(part, t)
                 with self.assertRaises(LayoutError, msg=not_impl):
                     transform(0)
+
+
+def _structure(id, name, acronym, children=()):
+    return dict(id=id, name=name, acronym=acronym, children=list(children))
+
+
+class TestAllenOntology(unittest.TestCase):
+    def setUp(self):
+        tree = [
+            _structure(
+                1,
+                "Root",
+                "root",
+                [
+                    _structure(2, "Cerebellum", "CB", [_structure(4, "Lingula", "LING")]),
+                    _structure(3, "Lingula", "CB2", [_structure(5, "Leaf", "L")]),
+                ],
+            )
+        ]
+        patch = unittest.mock.patch.object(
+            topology.AllenStructure, "_dl_structure_ontology", lambda: tree
+        )
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.addCleanup(topology.AllenStructure._structure_index.cache_clear)
+        topology.AllenStructure._structure_index.cache_clear()
+
+    def test_index(self):
+        for _ in range(2):
+            find = topology.AllenStructure.find_structure
+            self.assertEqual(2, find("cerebellum")["id"])
+            self.assertEqual(2, find(" cb ")["id"])
+            self.assertEqual(5, find(5.0)["id"])
+            self.assertEqual(3, find("lingula")["id"], "breadth first match expected")
+            with self.assertRaises(NodeNotFoundError):
+                find("unknown")
+            with self.assertRaises(NodeNotFoundError):
+                find(6)
+            idset = topology.AllenStructure.get_structure_idset
+            self.assertEqual([1, 2, 3, 4, 5], sorted(idset("root")))
+            self.assertEqual([3, 5], sorted(idset(3)))
+            topology.AllenStructure._structure_index.cache_clear()
+
+
+class TestNrrdVoxels(NumpyTestCase, unittest.TestCase):
+    def test_chunk_index(self):
+        cfg = Configuration.default(
+            region=dict(br=dict(children=["a"])),
+            partitions=dict(
+                a=dict(
+                    type="nrrd",
+                    source=get_data_path("orientations", "toy_annotations.nrrd"),
+                    voxel_size=25,
+                )
+            ),
+        )
+        part = cfg.partitions.a
+        vs = part.voxelset
+        chunk_size = np.array([40, 60, 50])
+        chunks = part.to_chunks(chunk_size)
+        grid = vs.snap_to_grid(chunk_size)
+        expected, first = np.unique(grid.get_raw(), return_index=True, axis=0)
+        self.assertClose(expected, chunks.get_raw())
+        self.assertEqual(vs.get_data()[first].tolist(), chunks.get_data().tolist())
+        total = 0
+        for coords in chunks:
+            chunk = Chunk(coords, chunk_size)
+            voxels = part.chunk_to_voxels(chunk)
+            inside = np.all(grid.get_raw() == coords, axis=1)
+            self.assertClose(vs.get_raw()[inside], voxels.get_raw())
+            self.assertEqual(voxels.volume, part.volume(chunk))
+            total += len(voxels)
+        self.assertEqual(len(vs), total, "all voxels should be in a chunk")
+        self.assertEqual(0, len(part.chunk_to_voxels(Chunk([-5, 0, 0], chunk_size))))
+
+    def test_sparse_mask(self):
+        def partition(**kwargs):
+            cfg = Configuration.default(
+                region=dict(br=dict(children=["a"])),
+                partitions=dict(
+                    a=dict(
+                        type="nrrd",
+                        source=get_data_path("orientations", "toy_annotations.nrrd"),
+                        voxel_size=25,
+                        **kwargs,
+                    )
+                ),
+            )
+            return cfg.partitions.a
+
+        dense = partition(sparse=False).voxelset
+        with tempfile.TemporaryDirectory() as dir:
+            with unittest.mock.patch.object(
+                bsb.topology.partition, "_mask_cache_path", pathlib.Path(dir)
+            ):
+                for _ in range(2):
+                    vs = partition().voxelset
+                    self.assertEqual(1, len(os.listdir(dir)), "expected 1 cached mask")
+                    self.assertClose(dense.get_raw(), vs.get_raw())
+                    self.assertEqual(dense.get_data().tolist(), vs.get_data().tolist())
+                masked = partition(mask_value=10690).get_mask()
+                self.assertEqual(2, len(os.listdir(dir)), "expected 2 cached masks")
+                self.assertGreater(len(masked[0]), 0)
+                self.assertLess(len(masked[0]), len(vs))
@@ -3,7 +3,10 @@ import sys
 import unittest
 import numpy as np
 import inspect
+import pickle
+import tempfile
 from bsb.voxels import VoxelSet
+from bsb.trees import ArrayBoxTree
 from bsb.exceptions import *
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
@@ -38,3 +41,44 @@ class TestVoxelSet(bsb.unittest.NumpyTestCase, unittest.TestCase):
         )
         res = list(gen)
         self.assertEqual([0, 1, 2], res, "incorrect results")
+
+
+class TestArrayBoxTree(bsb.unittest.NumpyTestCase, unittest.TestCase):
+    def setUp(self):
+        ldc = np.random.default_rng(0).random((1000, 3)) * 100
+        self.boxes = np.hstack((ldc, ldc + 5))
+        self.queries = np.array([[0, 0, 0, 100, 100, 100], [20, 20, 20, 30, 30, 30]])
+        self.tree = ArrayBoxTree(self.boxes)
+
+    def test_query_csr(self):
+        offsets, indices = self.tree.query_csr(self.queries)
+        self.assertEqual(1000, offsets[1], "first query should hit all boxes")
+        self.assertClose(np.arange(1000), indices[:1000], "should be sorted")
+        expected = [
+            i
+            for i, b in enumerate(self.boxes)
+            if np.all(b[:3] <= self.queries[1, 3:])
+            and np.all(b[3:] >= self.queries[1, :3])
+        ]
+        self.assertEqual(expected, indices[1000:].tolist(), "incorrect results")
+        self.assertEqual(len(indices), offsets[-1], "offsets should end at nnz")
+
+    def test_empty(self):
+        offsets, indices = ArrayBoxTree(np.empty((0, 6))).query_csr(self.queries)
+        self.assertClose([0, 0, 0], offsets)
+        self.assertEqual(0, len(indices))
+
+    def test_pickle(self):
+        tree = pickle.loads(pickle.dumps(self.tree))
+        self.assertClose(
+            self.tree.query_csr(self.queries)[1], tree.query_csr(self.queries)[1]
+        )
+
+    def test_mmap(self):
+        with tempfile.TemporaryDirectory() as dir:
+            self.tree.dump(dir)
+            tree = ArrayBoxTree.load(dir)
+            self.assertIsInstance(tree._nodes, np.memmap, "should be memory mapped")
+            self.assertClose(
+                self.tree.query_csr(self.queries)[1], tree.query_csr(self.queries)[1]
+            )
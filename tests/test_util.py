@@ -6,7 +6,7 @@ import inspect
 
 from scipy.spatial.transform import Rotation
 
-from bsb._util import rotation_matrix_from_vectors
+from bsb._util import rotation_matrix_from_vectors, rotation_matrices_from_vectors
 from bsb.core import Scaffold
 from bsb.voxels import VoxelSet
 from bsb.exceptions import *
@@ -71,3 +71,16 @@ class TestRotationUtils(unittest.TestCase):
             rotation_matrix_from_vectors(err1, vec2)
         with self.assertRaises(ValueError, msg="This should raise a ValueError") as _:
             rotation_matrix_from_vectors(vec1, err2)
+
+    def test_rotation_matrices_from_vectors(self):
+        vec1 = np.array([0, -1.0, 0])
+        vecs = np.random.default_rng(0).normal(size=(50, 3))
+        vecs[:2] = [[0, -2, 0], [0, 0, 1]]
+        self.assertTrue(
+            np.allclose(
+                [rotation_matrix_from_vectors(vec1, v) for v in vecs],
+                rotation_matrices_from_vectors(vec1, vecs),
+            )
+        )
+        with self.assertRaises(ValueError, msg="This should raise a ValueError") as _:
+            rotation_matrices_from_vectors(vec1, [[0, 0, 1], [0, 0, 0]])
@@ -320,6 +320,37 @@ class TestVoxelSet(bsb.unittest.NumpyTestCase, unittest.TestCase):
         self.assertEqual(1, len(vs), "Point morpho")
         self.assertClose(0, vs.get_raw(copy=False))
 
+    def test_morphology_members(self):
+        branches = [
+            Branch(np.array(([i] * 5, [0, 1, 2, 3, 4], [i] * 5)).T, [1] * 5)
+            for i in range(5)
+        ]
+        morpho = Morphology(branches)
+        vs = morpho.voxelize(16)
+        offsets, members = vs.get_members()
+        self.assertEqual(len(vs) + 1, len(offsets), "expected 1 offset per voxel")
+        self.assertEqual(25, len(members), "expected each point in 1 voxel")
+        self.assertEqual(25, len(np.unique(members, axis=0)), "duplicate members")
+        ldc, mdc = vs._box_bounds()
+        for i in range(len(vs)):
+            for b, p in members[offsets[i] : offsets[i + 1]]:
+                point = morpho.branches[b].points[p]
+                self.assertAll(ldc[i] <= point, "member outside of voxel")
+                self.assertAll(point <= mdc[i], "member outside of voxel")
+        sub = vs[[2, 0]]
+        sub_offsets, sub_members = sub.get_members()
+        self.assertClose(members[offsets[2] : offsets[3]], sub_members[: sub_offsets[1]])
+        self.assertClose(members[offsets[0] : offsets[1]], sub_members[sub_offsets[1] :])
+        self.assertClose(members[offsets[1] : offsets[2]], vs.get_data(1)[0])
+        self.assertEqual((len(vs), 1), vs.get_data().shape, "expected data column")
+
+    def test_morphology_members_str(self):
+        morpho = Morphology([Branch(np.random.rand(20, 3) * 10, np.ones(20))])
+        vs = VoxelSet.from_morphology(morpho, 5)
+        self.assertEqual(str(vs), repr(vs))
+        self.assertIn("with voxel members", str(vs))
+        self.assertEqual([], vs.data_keys, "member based sets have no data keys")
+
     def test_select(self):
         for label, set in self.all.items():
             with self.subTest(label=label):